@@ -0,0 +1,86 @@
+import os
+
+from fastapi import HTTPException, Request, Response, status
+from fastapi.responses import FileResponse
+from fastapi.staticfiles import StaticFiles
+from starlette.types import Scope
+
+from app.core.config import settings
+from app.core.executor import run_io
+from app.core.storage import BaseStorage
+
+def cache_headers(etag: str | None = None, immutable: bool = True) -> dict[str, str]:
+  # Uploads are named by content hash and can be kept as they are. Crops
+  # are named by frame and driver slot and are rewritten when a frame is
+  # predicted again, so clients revalidate them against the ETag.
+  cache_control = f'public, max-age={settings.IMAGE_CACHE_MAX_AGE}, immutable' if immutable else 'public, no-cache'
+  headers = {'cache-control': cache_control}
+  if etag is not None:
+    headers['etag'] = etag
+  return headers
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+  # If-None-Match uses weak comparison, so W/ prefixes are ignored
+  if not if_none_match:
+    return False
+  if if_none_match.strip() == '*':
+    return True
+  return etag in [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+
+def parse_range(http_range: str | None, size: int) -> tuple[int, int] | None:
+  # Single byte range as (start, end inclusive); anything else is served whole
+  if not http_range or not http_range.startswith('bytes=') or ',' in http_range:
+    return None
+  start, _, end = http_range[len('bytes='):].strip().partition('-')
+  try:
+    if not start:
+      length = int(end)
+      if length <= 0:
+        raise ValueError
+      return max(0, size - length), size - 1
+    first = int(start)
+    last = min(int(end), size - 1) if end else size - 1
+  except ValueError:
+    return None
+  if first >= size or first > last:
+    raise HTTPException(
+      status_code=status.HTTP_416_RANGE_NOT_SATISFIABLE,
+      headers={'content-range': f'bytes */{size}'}
+    )
+  return first, last
+
+async def serve_object(request: Request, storage: BaseStorage, key: str, media_type: str, immutable: bool = True) -> Response | None:
+  # Returns None when the object does not exist
+  etag = await run_io(storage.etag, key)
+  if etag is None:
+    return None
+  headers = cache_headers(etag, immutable)
+  if etag_matches(request.headers.get('if-none-match'), etag):
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+  # FileResponse handles Range and If-Range itself
+  file_path = storage.local_path(key)
+  if file_path is not None:
+    return FileResponse(file_path, media_type=media_type, headers=headers)
+
+  data = await run_io(storage.read, key)
+  headers['accept-ranges'] = 'bytes'
+  if_range = request.headers.get('if-range')
+  byte_range = parse_range(request.headers.get('range'), len(data)) if if_range in (None, etag) else None
+  if byte_range is None:
+    return Response(data, media_type=media_type, headers=headers)
+  start, end = byte_range
+  headers['content-range'] = f'bytes {start}-{end}/{len(data)}'
+  return Response(data[start:end + 1], status_code=status.HTTP_206_PARTIAL_CONTENT, media_type=media_type, headers=headers)
+
+class CachedStaticFiles(StaticFiles):
+  # Static files with the same cache policy as the API routes; StaticFiles
+  # already answers If-None-Match from its own ETag
+  def __init__(self, *args, immutable: bool = True, **kwargs):
+    super().__init__(*args, **kwargs)
+    self.immutable = immutable
+
+  def file_response(self, full_path: str | os.PathLike, stat_result: os.stat_result, scope: Scope, status_code: int = 200) -> Response:
+    response = super().file_response(full_path, stat_result, scope, status_code)
+    response.headers.update(cache_headers(immutable=self.immutable))
+    return response
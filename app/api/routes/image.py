@@ -1,16 +1,22 @@
-from fastapi import APIRouter, UploadFile, File, Query, HTTPException, status
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, UploadFile, File, Query, HTTPException, Request, status
+from fastapi.responses import FileResponse, Response
 from uuid import UUID
 from typing import Annotated
+import mimetypes
 import os
 
 from app.services.image_service import ImageService
 from app.services.prediction_service import PredictionService
-from app.core.exceptions import ImageNotFoundException
-from app.core.config import settings
+from app.services.derivative_service import get_derivative_service
+from app.core.exceptions import ImageNotFoundException, UnknownImageVariantException
+from app.core.storage import get_crop_storage
+from app.core.pagination import encode_cursor
+from app.api.files import serve_object
 from app.api.schemas.responses import (
   UploadResponse,
+  BatchUploadResponse,
   PredictionResponse,
+  ImageStatusResponse,
   ImageResponse,
   ListImagesResponse,
 )
@@ -22,7 +28,7 @@ prediction_service = PredictionService()
 @router.post(
   '/upload',
   response_model=UploadResponse,
-  status_code=status.HTTP_201_CREATED
+  status_code=status.HTTP_202_ACCEPTED
 )
 async def upload_image(
   file: Annotated[UploadFile, File(description="The image file to upload")]
@@ -30,6 +36,17 @@ async def upload_image(
   result = await image_service.upload(file)
   return UploadResponse(**result)
 
+@router.post(
+  '/upload/batch',
+  response_model=BatchUploadResponse,
+  status_code=status.HTTP_202_ACCEPTED
+)
+async def upload_images(
+  files: Annotated[list[UploadFile], File(description="Image files, or tar/zip archives of images")]
+) -> BatchUploadResponse:
+  result = await image_service.upload_batch(files)
+  return BatchUploadResponse(**result)
+
 @router.post(
   '/predict/{image_id}',
   response_model=PredictionResponse
@@ -54,23 +71,30 @@ async def predict_image(
 )
 async def list_images(
   page: Annotated[int, Query(ge=1, description="Page number")] = 1,
-  size: Annotated[int, Query(ge=1, le=100, description="Items per page")] = 10
+  size: Annotated[int, Query(ge=1, le=100, description="Items per page")] = 10,
+  cursor: Annotated[str | None, Query(description="Cursor from a previous page; takes precedence over page")] = None
 ) -> ListImagesResponse:
   try:
     skip = (page - 1) * size
-    images = await image_service.list_images(skip=skip, limit=size)
+    images = await image_service.list_images(skip=skip, limit=size, cursor=cursor)
     total = await image_service.count_images()
     pages = (total + size - 1) // size
     
     image_responses = [ImageResponse.model_validate(image) for image in images]
+    next_cursor = None
+    if len(images) == size:
+      next_cursor = encode_cursor(images[-1].created_at, images[-1].id)
     
     return ListImagesResponse(
       total=total,
       items=image_responses,
       page=page,
       size=size,
-      pages=pages
+      pages=pages,
+      next_cursor=next_cursor
     )
+  except HTTPException as e:
+    raise e
   except Exception as e:
     raise HTTPException(
       status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -95,21 +119,61 @@ async def get_image(
       detail=str(e)
     )
 
+@router.get(
+  '/{image_id}/status',
+  response_model=ImageStatusResponse
+)
+async def get_image_status(
+  image_id: UUID
+) -> ImageStatusResponse:
+  try:
+    image = await image_service.get_image(image_id)
+    return ImageStatusResponse(
+      image_id=image.id,
+      job_id=image.job_id,
+      status=image.job_status,
+      attempts=image.job_attempts,
+      error=image.job_error
+    )
+  except ImageNotFoundException as e:
+    raise e
+  except Exception as e:
+    raise HTTPException(
+      status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+      detail=str(e)
+    )
+
 @router.get(
   '/cropped/{filename}',
   response_class=FileResponse
 )
 async def get_cropped_image(
-  filename: str
-) -> FileResponse:
+  request: Request,
+  filename: str,
+  size: Annotated[str | None, Query(description="Resized variant, e.g. thumb or preview")] = None
+) -> Response:
   try:
-    file_path = os.path.join(settings.CROPPED_IMAGES_DIR, filename)
-    if not os.path.exists(file_path):
+    crops = get_crop_storage()
+    key = crops.key_for(os.path.basename(filename))
+    if size is None:
+      media_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+      response = await serve_object(request, crops, key, media_type, immutable=False)
+    else:
+      derivatives = get_derivative_service()
+      if size not in derivatives.sizes:
+        raise UnknownImageVariantException(list(derivatives.sizes))
+      derivative_key = await derivatives.get(key, size)
+      response = None
+      if derivative_key is not None:
+        response = await serve_object(request, derivatives.derivatives, derivative_key, derivatives.media_type, immutable=False)
+    if response is None:
       raise HTTPException(
         status_code=status.HTTP_404_NOT_FOUND,
         detail="Cropped image not found"
       )
-    return FileResponse(file_path)
+    return response
+  except HTTPException as e:
+    raise e
   except Exception as e:
     raise HTTPException(
       status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
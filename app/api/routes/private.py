@@ -1,7 +1,39 @@
 from fastapi import APIRouter
 
+from app.core.http import get_http_client
+from app.services.batch_scheduler import get_batch_scheduler
+from app.services.derivative_service import get_derivative_service
+from app.services.detector import get_detector
+from app.services.prediction_cache import get_prediction_cache
+from app.services.prediction_writer import get_prediction_writer
+from app.services.violation_broker import get_violation_broker
+
 router = APIRouter(tags=['private'], prefix='/private')
 
 @router.get('/')
 def get_root():
-  return 'Hello World!'
\ No newline at end of file
+  return 'Hello World!'
+
+@router.get('/batching')
+def get_batching_metrics():
+  return get_batch_scheduler(get_detector()).metrics.snapshot()
+
+@router.get('/prediction-cache')
+def get_prediction_cache_metrics():
+  return get_prediction_cache().snapshot()
+
+@router.get('/commits')
+def get_commit_metrics():
+  return get_prediction_writer().snapshot()
+
+@router.get('/http')
+def get_http_metrics():
+  return get_http_client().snapshot()
+
+@router.get('/derivatives')
+def get_derivative_metrics():
+  return get_derivative_service().snapshot()
+
+@router.get('/violation-stream')
+def get_violation_stream_metrics():
+  return get_violation_broker().snapshot()
\ No newline at end of file
@@ -1,15 +1,45 @@
-from fastapi import APIRouter, Query, HTTPException, status
-from typing import Annotated
+from fastapi import APIRouter, Header, Query, HTTPException, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import StreamingResponse
+from datetime import datetime
+from typing import Annotated, AsyncIterator, Literal
 
-from app.services.violation_service import ViolationService
+from app.core.pagination import encode_cursor
+from app.services.derivative_service import derivative_url
+from app.services.violation_search import ViolationFilters
+from app.services.violation_service import REVIEW_OUTCOMES, ViolationService
+from app.models.violation import Violation, ViolationChange
+from app.api.schemas.requests import ViolationReviewRequest
 from app.api.schemas.responses import (
+  ViolationChangeResponse,
   ViolationListResponse,
   ViolationResponse,
+  ViolationReviewResponse,
+  ViolationReviewResult,
+  ViolationSearchResponse,
+  ViolationStatsBucket,
+  ViolationStatsResponse,
 )
 
 router = APIRouter(prefix='/violation', tags=['violation'])
 violation_service = ViolationService()
 
+# Browsers wait this long before reconnecting a dropped event stream
+STREAM_RETRY_MS = 2000
+
+def to_violation_response(violation: Violation) -> ViolationResponse:
+  return ViolationResponse(
+    id=violation.id,
+    status=violation.status,
+    type=violation.type,
+    plate_number=violation.plate_number,
+    timestamp=violation.timestamp,
+    location=violation.location,
+    image_url=violation.image_url,
+    thumbnail_url=derivative_url(violation.image_url),
+    drone=violation.drone,
+    version=violation.version
+  )
+
 @router.get(
   '/list',
   response_model=ViolationListResponse,
@@ -17,38 +47,231 @@ violation_service = ViolationService()
 )
 async def get_violations(
   page: Annotated[int, Query(ge=1, description="Page number")] = 1,
-  size: Annotated[int, Query(ge=1, le=100, description="Items per page")] = 10
+  size: Annotated[int, Query(ge=1, le=100, description="Items per page")] = 10,
+  cursor: Annotated[str | None, Query(description="Cursor from a previous page; takes precedence over page")] = None
 ) -> ViolationListResponse:
   try:
     skip = (page - 1) * size
     
-    violations = await violation_service.list_violations(skip=skip, limit=size)
+    violations = await violation_service.list_violations(skip=skip, limit=size, cursor=cursor)
     total = await violation_service.count_violations()
     pages = (total + size - 1) // size if total else 0
     
-    items = [
-      ViolationResponse(
-        id=violation.id,
-        status=violation.status,
-        type=violation.type,
-        plate_number=violation.plate_number,
-        timestamp=violation.timestamp,
-        location=violation.location,
-        image_url=violation.image_url,
-        drone=violation.drone
-      ) for violation in violations
-    ]
+    items = [to_violation_response(violation) for violation in violations]
+    
+    next_cursor = None
+    if len(violations) == size:
+      next_cursor = encode_cursor(violations[-1].timestamp, violations[-1].id)
     
     return ViolationListResponse(
       total=total,
       items=items,
       page=page,
       size=size,
-      pages=pages
+      pages=pages,
+      next_cursor=next_cursor
     )
   
+  except HTTPException as e:
+    raise e
+  except Exception as e:
+    raise HTTPException(
+      status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+      detail=str(e)
+    )
+
+@router.get(
+  '/search',
+  response_model=ViolationSearchResponse,
+  description="Search violations by time range, status, type, drone, location text and plate number, newest first"
+)
+async def search_violations(
+  start: Annotated[datetime | None, Query(description="Inclusive (UTC)")] = None,
+  end: Annotated[datetime | None, Query(description="Exclusive (UTC)")] = None,
+  violation_status: Annotated[int | None, Query(alias='status')] = None,
+  type: Annotated[int | None, Query()] = None,
+  drone: Annotated[str | None, Query()] = None,
+  location: Annotated[str | None, Query(max_length=200, description="Words in the location; the last may be a prefix")] = None,
+  plate_prefix: Annotated[str | None, Query(max_length=20, description="Start of the plate number, case-insensitive")] = None,
+  plate: Annotated[str | None, Query(max_length=20, description="Part of the plate number, case-insensitive")] = None,
+  size: Annotated[int, Query(ge=1, le=100, description="Items per page")] = 10,
+  cursor: Annotated[str | None, Query(description="Cursor from a previous page")] = None
+) -> ViolationSearchResponse:
+  try:
+    filters = ViolationFilters(
+      start=start,
+      end=end,
+      status=violation_status,
+      type=type,
+      drone=drone,
+      location=location,
+      plate_prefix=plate_prefix,
+      plate=plate
+    )
+    violations = await violation_service.search(filters, limit=size, cursor=cursor)
+
+    next_cursor = None
+    if len(violations) == size:
+      next_cursor = encode_cursor(violations[-1].timestamp, violations[-1].id)
+
+    return ViolationSearchResponse(
+      items=[to_violation_response(violation) for violation in violations],
+      size=size,
+      next_cursor=next_cursor
+    )
+  except HTTPException as e:
+    raise e
+  except Exception as e:
+    raise HTTPException(
+      status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+      detail=str(e)
+    )
+
+@router.post(
+  '/review',
+  response_model=ViolationReviewResponse,
+  description="Set the status of many violations at once, by id (optionally at a known version) or by filter"
+)
+async def review_violations(request: ViolationReviewRequest) -> ViolationReviewResponse:
+  try:
+    versions = None
+    filters = None
+    if request.items is not None:
+      versions = {item.id: item.version for item in request.items}
+    else:
+      filters = ViolationFilters(**request.filter.model_dump())
+    results, has_more = await violation_service.review(request.status, versions=versions, filters=filters)
+
+    counts = {outcome: 0 for outcome in REVIEW_OUTCOMES}
+    for _, outcome, _ in results:
+      counts[outcome] += 1
+    return ViolationReviewResponse(
+      status=request.status,
+      updated=counts['updated'],
+      unchanged=counts['unchanged'],
+      conflicts=counts['conflict'],
+      not_found=counts['not_found'],
+      has_more=has_more,
+      results=[ViolationReviewResult(id=id, outcome=outcome, version=version) for id, outcome, version in results]
+    )
+  except HTTPException as e:
+    raise e
   except Exception as e:
     raise HTTPException(
       status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
       detail=str(e)
-    )
\ No newline at end of file
+    )
+
+@router.get(
+  '/changes',
+  response_model=list[ViolationChangeResponse],
+  description="Status changes in commit order; pass the last id seen to resume"
+)
+async def get_violation_changes(
+  after_id: Annotated[int, Query(ge=0)] = 0,
+  size: Annotated[int, Query(ge=1, le=1000, description="Items per page")] = 100
+) -> list[ViolationChangeResponse]:
+  try:
+    changes = await violation_service.list_changes(after_id, size)
+    return [ViolationChangeResponse.model_validate(change) for change in changes]
+  except HTTPException as e:
+    raise e
+  except Exception as e:
+    raise HTTPException(
+      status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+      detail=str(e)
+    )
+
+@router.get(
+  '/stats',
+  response_model=ViolationStatsResponse,
+  description="Violation counts per hour or day, optionally split by type, status, location or drone"
+)
+async def get_violation_stats(
+  interval: Annotated[Literal['hour', 'day'], Query(description="Bucket size")] = 'hour',
+  start: Annotated[datetime | None, Query(description="Inclusive, rounded down to the bucket (UTC)")] = None,
+  end: Annotated[datetime | None, Query(description="Exclusive (UTC)")] = None,
+  group_by: Annotated[list[Literal['type', 'status', 'location', 'drone']], Query(description="Dimensions to split counts by")] = [],
+  type: Annotated[int | None, Query()] = None,
+  violation_status: Annotated[int | None, Query(alias='status')] = None,
+  location: Annotated[str | None, Query()] = None,
+  drone: Annotated[str | None, Query()] = None
+) -> ViolationStatsResponse:
+  try:
+    group_by = list(dict.fromkeys(group_by))
+    buckets = await violation_service.stats(
+      period=interval,
+      start=start,
+      end=end,
+      group_by=group_by,
+      filters={'type': type, 'status': violation_status, 'location': location, 'drone': drone}
+    )
+    return ViolationStatsResponse(
+      interval=interval,
+      start=start,
+      end=end,
+      group_by=group_by,
+      total=sum(bucket['count'] for bucket in buckets),
+      buckets=[ViolationStatsBucket(**bucket) for bucket in buckets]
+    )
+  except HTTPException as e:
+    raise e
+  except Exception as e:
+    raise HTTPException(
+      status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+      detail=str(e)
+    )
+
+@router.get(
+  '/stream',
+  response_class=StreamingResponse,
+  description="Server-Sent Events feed of new violations and status changes; reconnects resume from Last-Event-ID"
+)
+async def stream_violations(
+  after_id: Annotated[int | None, Query(description="Replay violations with a larger id before streaming")] = None,
+  last_event_id: Annotated[int | None, Header(description="Set by EventSource when it reconnects")] = None
+) -> StreamingResponse:
+  resume_from = after_id if after_id is not None else last_event_id
+
+  async def events() -> AsyncIterator[str]:
+    yield f'retry: {STREAM_RETRY_MS}\n\n'
+    async for violation in violation_service.stream(resume_from):
+      if violation is None:
+        # Comment line; keeps proxies from closing an idle connection
+        yield ': keepalive\n\n'
+        continue
+      if isinstance(violation, ViolationChange):
+        # No id line, so Last-Event-ID keeps tracking violations
+        data = ViolationChangeResponse.model_validate(violation).model_dump_json()
+        yield f'event: status\ndata: {data}\n\n'
+        continue
+      data = to_violation_response(violation).model_dump_json()
+      yield f'id: {violation.id}\nevent: violation\ndata: {data}\n\n'
+
+  return StreamingResponse(
+    events(),
+    media_type='text/event-stream',
+    headers={'cache-control': 'no-cache', 'x-accel-buffering': 'no'}
+  )
+
+@router.websocket('/stream/ws')
+async def stream_violations_ws(
+  websocket: WebSocket,
+  after_id: int | None = None
+) -> None:
+  await websocket.accept()
+  try:
+    async for violation in violation_service.stream(after_id):
+      if violation is None:
+        await websocket.send_json({'type': 'keepalive'})
+        continue
+      if isinstance(violation, ViolationChange):
+        data = ViolationChangeResponse.model_validate(violation).model_dump(mode='json')
+        await websocket.send_json({'type': 'status', 'data': data})
+        continue
+      data = to_violation_response(violation).model_dump(mode='json')
+      await websocket.send_json({'type': 'violation', 'data': data})
+    # The client fell behind; it should reconnect with its last id
+    await websocket.close(code=1013)
+  except WebSocketDisconnect:
+    pass
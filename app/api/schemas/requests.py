@@ -0,0 +1,31 @@
+from typing import List, Optional
+from pydantic import BaseModel, Field, model_validator
+from datetime import datetime
+
+from app.core.config import settings
+
+class ViolationReviewItem(BaseModel):
+  id: int
+  # The version the reviewer saw; omit to skip the concurrency check
+  version: Optional[int] = None
+
+class ViolationReviewFilter(BaseModel):
+  start: Optional[datetime] = None
+  end: Optional[datetime] = None
+  status: Optional[int] = None
+  type: Optional[int] = None
+  drone: Optional[str] = None
+  location: Optional[str] = Field(default=None, max_length=200)
+  plate_prefix: Optional[str] = Field(default=None, max_length=20)
+  plate: Optional[str] = Field(default=None, max_length=20)
+
+class ViolationReviewRequest(BaseModel):
+  status: int = Field(ge=0)
+  items: Optional[List[ViolationReviewItem]] = Field(default=None, max_length=settings.VIOLATION_REVIEW_MAX_ITEMS)
+  filter: Optional[ViolationReviewFilter] = None
+
+  @model_validator(mode='after')
+  def check_target(self) -> 'ViolationReviewRequest':
+    if (self.items is None) == (self.filter is None):
+      raise ValueError('Provide either items or filter')
+    return self
@@ -11,6 +11,7 @@ class ImageResponse(BaseModel):
   size: int
   created_at: datetime
   predictions: Optional[str] = None
+  job_status: Optional[str] = None
   
   model_config = ConfigDict(from_attributes=True)
 
@@ -19,8 +20,31 @@ class UploadResponse(BaseModel):
   id: str
   filename: str
   filepath: str
+  job_id: Optional[str] = None
   message: str
 
+class BatchUploadItem(BaseModel):
+  filename: Optional[str] = None
+  status: str
+  id: Optional[str] = None
+  filepath: Optional[str] = None
+  job_id: Optional[str] = None
+  error: Optional[str] = None
+
+class BatchUploadResponse(BaseModel):
+  status: str
+  total: int
+  accepted: int
+  failed: int
+  items: List[BatchUploadItem]
+
+class ImageStatusResponse(BaseModel):
+  image_id: UUID
+  job_id: Optional[UUID] = None
+  status: Optional[str] = None
+  attempts: int
+  error: Optional[str] = None
+
 class PredictionResponse(BaseModel):
   status: str
   image_id: str
@@ -34,6 +58,7 @@ class ListImagesResponse(BaseModel):
   page: int
   size: int
   pages: int
+  next_cursor: Optional[str] = None
 
 class ViolationDetection(BaseModel):
   id: UUID
@@ -53,13 +78,61 @@ class ViolationResponse(BaseModel):
   timestamp: datetime
   location: str | None
   image_url: str
+  thumbnail_url: str | None = None
   drone: str | None
+  version: int
   
   model_config = ConfigDict(from_attributes=True)
 
+class ViolationReviewResult(BaseModel):
+  id: int
+  outcome: str  # updated, unchanged, conflict or not_found
+  version: Optional[int] = None
+
+class ViolationReviewResponse(BaseModel):
+  status: int
+  updated: int
+  unchanged: int
+  conflicts: int
+  not_found: int
+  has_more: bool
+  results: List[ViolationReviewResult]
+
+class ViolationChangeResponse(BaseModel):
+  id: int
+  violation_id: int
+  previous_status: int
+  status: int
+  version: int
+  changed_at: datetime
+
+  model_config = ConfigDict(from_attributes=True)
+
+class ViolationSearchResponse(BaseModel):
+  items: List[ViolationResponse]
+  size: int
+  next_cursor: Optional[str] = None
+
+class ViolationStatsBucket(BaseModel):
+  bucket: datetime
+  count: int
+  type: Optional[int] = None
+  status: Optional[int] = None
+  location: Optional[str] = None
+  drone: Optional[str] = None
+
+class ViolationStatsResponse(BaseModel):
+  interval: str
+  start: Optional[datetime] = None
+  end: Optional[datetime] = None
+  group_by: List[str]
+  total: int
+  buckets: List[ViolationStatsBucket]
+
 class ViolationListResponse(BaseModel):
   total: int
   items: List[ViolationResponse]
   page: int
   size: int
-  pages: int
\ No newline at end of file
+  pages: int
+  next_cursor: Optional[str] = None
\ No newline at end of file
@@ -21,15 +21,139 @@ class Settings(BaseSettings):
   POSTGRES_HOST: str = 'localhost'
   POSTGRES_PORT: str = '5432'
   POSTGRES_DB: str = 'etle_app'
+  # Engine settings
+  DB_ECHO: bool = False
+  DB_POOL_SIZE: int = 10
+  DB_MAX_OVERFLOW: int = 20
+  DB_POOL_RECYCLE: int = 1800
+  DB_POOL_PRE_PING: bool = True
+  DB_POOL_TIMEOUT: float = 30.0
+  # SQLite connection PRAGMAs
+  SQLITE_WAL: bool = True
+  SQLITE_SYNCHRONOUS: Literal['OFF', 'NORMAL', 'FULL', 'EXTRA'] = 'NORMAL'
+  SQLITE_BUSY_TIMEOUT_MS: int = 5000
+  SQLITE_MMAP_SIZE: int = 256 * 1024 * 1024
   API_STR: str = '/api'
   FRONTEND_HOST: str = 'http://localhost:3000'
   ENVIRONMENT: Literal['local', 'staging', 'production'] = 'local'
   BACKEND_CORS_ORIGINS: list[AnyUrl] | str = []
+  # Per-image pipeline events are logged at DEBUG
+  LOG_LEVEL: Literal['DEBUG', 'INFO', 'WARNING', 'ERROR'] = 'INFO'
+  LOG_FORMAT: Literal['text', 'json'] = 'text'
+  METRICS_ENABLED: bool = True
   ROBOFLOW_API_KEY: str = 'your_api_key_here'
   ROBOFLOW_MODEL_URL: str = 'https://detect.roboflow.com/helm-motor-siter/2'
+  DETECTOR_BACKEND: Literal['roboflow', 'local'] = 'roboflow'
+  # Shared HTTP client for the remote detector
+  HTTP_MAX_CONNECTIONS: int = 64
+  HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 32
+  HTTP_MAX_CONCURRENCY: int = 32
+  HTTP_TIMEOUT_SECONDS: float = 30.0
+  HTTP_MAX_RETRIES: int = 3
+  HTTP_RETRY_BACKOFF_SECONDS: float = 0.5
+  # Upper bound on any single wait, including one asked for by Retry-After
+  HTTP_RETRY_BACKOFF_MAX_SECONDS: float = 10.0
+  HTTP_BREAKER_FAILURE_THRESHOLD: int = 5
+  HTTP_BREAKER_RESET_SECONDS: float = 30.0
+  # Local YOLO settings
+  YOLO_WEIGHTS_PATH: str = 'weights/best.pt'
+  YOLO_CONFIDENCE: float = 0.4
+  YOLO_IMAGE_SIZE: int = 640
+  YOLO_DEVICE: str = 'cpu'
+  # Micro-batching in front of the detector (batch size 1 disables it)
+  DETECTOR_MAX_BATCH_SIZE: int = 8
+  DETECTOR_MAX_WAIT_MS: float = 20.0
+  PREDICTION_CACHE_SIZE: int = 1024
+  # Driver/helmet matching; distance is a fraction of the image diagonal
+  HELMET_MATCH_MAX_DISTANCE: float = 0.15
+  HELMET_MATCH_MIN_IOU: float = 0.0
+  HELMET_MATCH_ONE_TO_ONE: bool = True
+  # Image pipeline: JPEGs are draft-decoded at the smallest scale whose
+  # longest side is still at least this many pixels (0 decodes full size)
+  IMAGE_DECODE_TARGET_SIZE: int = 2048
+  IMAGE_THREAD_POOL_SIZE: int = 8
+  CROP_FORMAT: Literal['JPEG', 'WEBP'] = 'JPEG'
+  CROP_QUALITY: int = 85
+  CROP_OPTIMIZE: bool = True
+  CROP_PROGRESSIVE: bool = True
+  CROP_WEBP_METHOD: int = 4
   UPLOAD_DIR: str = 'images'
+  UPLOAD_MAX_SIZE_BYTES: int = 50 * 1024 * 1024
+  UPLOAD_CHUNK_SIZE: int = 1024 * 1024
+  UPLOAD_BATCH_MAX_FILES: int = 500
+  UPLOAD_BATCH_CONCURRENCY: int = 16
   CROPPED_IMAGES_DIR: str = 'cropped_images'
   BASE_URL: str = 'http://localhost:8000'
+  # Where uploads and crops are stored; keys are nested under
+  # STORAGE_SHARD_DEPTH prefix directories of STORAGE_SHARD_WIDTH characters
+  STORAGE_BACKEND: Literal['local', 's3'] = 'local'
+  STORAGE_SHARD_DEPTH: int = 2
+  STORAGE_SHARD_WIDTH: int = 2
+  # S3-compatible storage; set S3_ENDPOINT_URL for MinIO and similar
+  S3_BUCKET: str = 'etle'
+  S3_ENDPOINT_URL: str | None = None
+  S3_REGION: str = 'us-east-1'
+  S3_ACCESS_KEY_ID: str | None = None
+  S3_SECRET_ACCESS_KEY: str | None = None
+  S3_IMAGES_PREFIX: str = 'images'
+  S3_CROPS_PREFIX: str = 'cropped_images'
+  S3_DERIVATIVES_PREFIX: str = 'derivatives'
+  # Served directly from here when set, otherwise through the API
+  S3_PUBLIC_URL: str | None = None
+  # Resized variants of crops (longest side in pixels), generated on first
+  # request or at crop time when DERIVATIVE_EAGER is set
+  DERIVATIVE_SIZES: dict[str, int] = {'thumb': 128, 'preview': 512}
+  DERIVATIVE_FORMAT: Literal['WEBP', 'JPEG'] = 'WEBP'
+  DERIVATIVE_QUALITY: int = 80
+  DERIVATIVE_EAGER: bool = False
+  DERIVATIVES_DIR: str = 'derivatives'
+  # Uploads are named after the frame's content hash, so clients may keep
+  # them without revalidating; crops are always revalidated
+  IMAGE_CACHE_MAX_AGE: int = 365 * 24 * 60 * 60
+  # List totals are cached per worker for this long
+  COUNT_CACHE_TTL_SECONDS: float = 30.0
+  # Postgres tables above this many rows report the planner estimate
+  COUNT_EXACT_THRESHOLD: int = 100_000
+  # Execution pools for blocking work
+  IO_THREAD_POOL_SIZE: int = 32
+  # Background prediction jobs
+  JOB_QUEUE_BACKEND: Literal['database', 'memory'] = 'database'
+  JOB_WORKER_CONCURRENCY: int = 4
+  JOB_MAX_ATTEMPTS: int = 3
+  JOB_RETRY_BACKOFF_SECONDS: float = 2.0
+  JOB_RETRY_BACKOFF_MAX_SECONDS: float = 60.0
+  JOB_STALE_AFTER_SECONDS: int = 600
+  # Live violation stream. "database" tails the violation table so every
+  # worker sees violations committed by the others; "memory" only fans out
+  # within one process
+  VIOLATION_BROKER_BACKEND: Literal['database', 'memory'] = 'database'
+  VIOLATION_STREAM_POLL_MS: float = 250.0
+  # How long an id skipped by the stream is re-checked in case its
+  # transaction commits after a higher id
+  VIOLATION_STREAM_GAP_SECONDS: float = 30.0
+  VIOLATION_STREAM_QUEUE_SIZE: int = 1000
+  VIOLATION_STREAM_HEARTBEAT_SECONDS: float = 15.0
+  VIOLATION_STREAM_BACKFILL_LIMIT: int = 1000
+  # Most violations one bulk review request may change
+  VIOLATION_REVIEW_MAX_ITEMS: int = 10000
+  # Retention. Images older than RETENTION_MAX_AGE_DAYS, then the oldest
+  # ones while stored frames exceed RETENTION_MAX_BYTES, are deleted with
+  # their crops and violations; leave a limit unset to disable that policy.
+  # Each run also removes files no row refers to and rows whose file is gone.
+  RETENTION_ENABLED: bool = False
+  RETENTION_INTERVAL_SECONDS: float = 3600.0
+  RETENTION_MAX_AGE_DAYS: float | None = None
+  RETENTION_MAX_BYTES: int | None = None
+  RETENTION_BATCH_SIZE: int = 100
+  # Storage operations (deletes, existence checks, listing pages) per second
+  RETENTION_MAX_FILE_OPS_PER_SECOND: float = 100.0
+  # Files younger than this may belong to an upload still in progress
+  RETENTION_ORPHAN_GRACE_SECONDS: float = 3600.0
+  RETENTION_LEASE_SECONDS: float = 600.0
+  # Job workers commit finished predictions together; grouping is bounded
+  # by JOB_WORKER_CONCURRENCY (batch size 1 commits each image on its own)
+  PREDICTION_COMMIT_MAX_BATCH_SIZE: int = 8
+  PREDICTION_COMMIT_MAX_WAIT_MS: float = 25.0
 
   @property
   def DATABASE_URL(self) -> str:
@@ -37,4 +161,10 @@ class Settings(BaseSettings):
       return f'postgresql://{self.POSTGRES_USER}:{self.POSTGRES_PASSWORD}@{self.POSTGRES_HOST}:{self.POSTGRES_PORT}/{self.POSTGRES_DB}'
     return f'sqlite:///./{self.SQLITE_DB_FILE}'
 
+  @property
+  def ASYNC_DATABASE_URL(self) -> str:
+    if self.DB_TYPE == 'postgres':
+      return f'postgresql+asyncpg://{self.POSTGRES_USER}:{self.POSTGRES_PASSWORD}@{self.POSTGRES_HOST}:{self.POSTGRES_PORT}/{self.POSTGRES_DB}'
+    return f'sqlite+aiosqlite:///./{self.SQLITE_DB_FILE}'
+
 settings = Settings()
\ No newline at end of file
@@ -1,4 +1,8 @@
+from typing import AsyncIterator
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
 from sqlmodel import SQLModel, create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
 from app.core.config import settings
 import logging
 
@@ -6,19 +10,72 @@ logger = logging.getLogger(__name__)
 
 def get_engine_args():
   if settings.DB_TYPE == 'sqlite':
-    return {'check_same_thread': False}
+    return {'check_same_thread': False, 'timeout': settings.SQLITE_BUSY_TIMEOUT_MS / 1000}
   return {}
 
+def get_pool_args():
+  return {
+    'pool_size': settings.DB_POOL_SIZE,
+    'max_overflow': settings.DB_MAX_OVERFLOW,
+    'pool_recycle': settings.DB_POOL_RECYCLE,
+    'pool_pre_ping': settings.DB_POOL_PRE_PING,
+    'pool_timeout': settings.DB_POOL_TIMEOUT,
+  }
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+  cursor = dbapi_connection.cursor()
+  try:
+    if settings.SQLITE_WAL:
+      # WAL lets readers proceed while a writer commits
+      cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute(f'PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}')
+    cursor.execute(f'PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)}')
+    cursor.execute(f'PRAGMA mmap_size={int(settings.SQLITE_MMAP_SIZE)}')
+  finally:
+    cursor.close()
+
 def get_engine():
   engine_args = get_engine_args()
   engine = create_engine(
     settings.DATABASE_URL,
-    echo=True,
-    connect_args=engine_args
+    echo=settings.DB_ECHO,
+    connect_args=engine_args,
+    **get_pool_args()
   )
+  if settings.DB_TYPE == 'sqlite':
+    event.listen(engine, 'connect', set_sqlite_pragmas)
   return engine
 
+def get_async_pool_args():
+  if settings.DB_TYPE == 'sqlite':
+    # SQLite has a single writer. A second aiosqlite connection would busy-wait
+    # on its worker thread holding the connection mutex, which can stall the
+    # event loop (and so the lock holder) until the busy timeout expires
+    return {**get_pool_args(), 'pool_size': 1, 'max_overflow': 0}
+  return get_pool_args()
+
+def get_async_engine() -> AsyncEngine:
+  async_engine = create_async_engine(
+    settings.ASYNC_DATABASE_URL,
+    echo=settings.DB_ECHO,
+    connect_args=get_engine_args(),
+    **get_async_pool_args()
+  )
+  if settings.DB_TYPE == 'sqlite':
+    event.listen(async_engine.sync_engine, 'connect', set_sqlite_pragmas)
+  return async_engine
+
+# The sync engine is kept for init_db and the scripts; services use the async one
 engine = get_engine()
+async_engine = get_async_engine()
+
+def new_async_session() -> AsyncSession:
+  # Objects stay usable after commit without an implicit refresh round trip
+  return AsyncSession(async_engine, expire_on_commit=False)
+
+async def get_async_session() -> AsyncIterator[AsyncSession]:
+  async with new_async_session() as session:
+    yield session
 
 def init_db():
   try:
@@ -6,4 +6,20 @@ class ImageNotFoundException(HTTPException):
 
 class InvalidImageFormatException(HTTPException):
   def __init__(self):
-    super().__init__(status_code=status.HTTP_400_BAD_REQUEST, detail='File must be an image')
\ No newline at end of file
+    super().__init__(status_code=status.HTTP_400_BAD_REQUEST, detail='File must be an image')
+
+class FileTooLargeException(HTTPException):
+  def __init__(self, max_size: int):
+    super().__init__(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=f'File exceeds the maximum upload size of {max_size} bytes')
+
+class UpstreamUnavailableException(HTTPException):
+  def __init__(self, detail: str = 'Upstream service unavailable'):
+    super().__init__(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=detail)
+
+class UnknownImageVariantException(HTTPException):
+  def __init__(self, variants: list[str]):
+    super().__init__(status_code=status.HTTP_400_BAD_REQUEST, detail=f'Unknown image size; expected one of: {", ".join(variants)}')
+
+class InvalidCursorException(HTTPException):
+  def __init__(self):
+    super().__init__(status_code=status.HTTP_400_BAD_REQUEST, detail='Invalid pagination cursor')
\ No newline at end of file
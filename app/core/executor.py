@@ -0,0 +1,44 @@
+import asyncio
+from concurrent.futures import Executor, ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, TypeVar
+
+from app.core.config import settings
+
+T = TypeVar('T')
+
+_io_pool: ThreadPoolExecutor | None = None
+_image_pool: ThreadPoolExecutor | None = None
+
+def get_io_pool() -> ThreadPoolExecutor:
+  global _io_pool
+  if _io_pool is None:
+    _io_pool = ThreadPoolExecutor(max_workers=settings.IO_THREAD_POOL_SIZE, thread_name_prefix='io')
+  return _io_pool
+
+def get_image_pool() -> ThreadPoolExecutor:
+  global _image_pool
+  if _image_pool is None:
+    # Pillow releases the GIL while decoding and encoding, so threads can
+    # share one decoded image without pickling it into another process
+    _image_pool = ThreadPoolExecutor(max_workers=settings.IMAGE_THREAD_POOL_SIZE, thread_name_prefix='image')
+  return _image_pool
+
+async def _run(pool: Executor, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+  loop = asyncio.get_running_loop()
+  if kwargs:
+    fn = partial(fn, **kwargs)
+  return await loop.run_in_executor(pool, fn, *args)
+
+async def run_io(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+  return await _run(get_io_pool(), fn, *args, **kwargs)
+
+async def run_image(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+  return await _run(get_image_pool(), fn, *args, **kwargs)
+
+def shutdown_executors() -> None:
+  global _io_pool, _image_pool
+  for pool in (_io_pool, _image_pool):
+    if pool is not None:
+      pool.shutdown(wait=True)
+  _io_pool = _image_pool = None
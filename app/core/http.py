@@ -0,0 +1,176 @@
+import asyncio
+import random
+import time
+from typing import Any
+
+import httpx
+
+from app.core.config import settings
+from app.core.exceptions import UpstreamUnavailableException
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+class CircuitBreaker:
+  CLOSED = 'closed'
+  OPEN = 'open'
+  HALF_OPEN = 'half_open'
+
+  def __init__(self, failure_threshold: int, reset_timeout: float):
+    self.failure_threshold = failure_threshold
+    self.reset_timeout = reset_timeout
+    self.state = self.CLOSED
+    self.failures = 0
+    self.opened_at = 0.0
+    self.times_opened = 0
+    self._probe_in_flight = False
+
+  def allow(self) -> bool:
+    if self.state == self.CLOSED:
+      return True
+    if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+      self.state = self.HALF_OPEN
+    if self.state == self.HALF_OPEN and not self._probe_in_flight:
+      # Let a single probe through; everything else keeps failing fast
+      self._probe_in_flight = True
+      return True
+    return False
+
+  # Only the probe's own outcome frees the probe slot; a request that was
+  # already in flight when the breaker opened must not let a second probe in
+  def record_success(self, probe: bool = False) -> None:
+    self.state = self.CLOSED
+    self.failures = 0
+    if probe:
+      self._probe_in_flight = False
+
+  def release_probe(self) -> None:
+    # A probe that ended without an outcome (cancelled, or an unexpected
+    # error) must not keep the breaker half-open forever
+    self._probe_in_flight = False
+
+  def record_failure(self, probe: bool = False) -> None:
+    self.failures += 1
+    if probe:
+      self._probe_in_flight = False
+    if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+      if self.state != self.OPEN:
+        self.times_opened += 1
+      self.state = self.OPEN
+      self.opened_at = time.monotonic()
+
+class ResilientClient:
+  # Shared httpx client with keep-alive pooling, timeouts, retries with
+  # jittered backoff, a concurrency cap and a circuit breaker
+  def __init__(
+    self,
+    max_connections: int | None = None,
+    max_keepalive: int | None = None,
+    timeout: float | None = None,
+    max_retries: int | None = None,
+    backoff: float | None = None,
+    max_backoff: float | None = None,
+    max_concurrency: int | None = None,
+    breaker: CircuitBreaker | None = None,
+    transport: httpx.AsyncBaseTransport | None = None,
+  ):
+    self.max_connections = max_connections or settings.HTTP_MAX_CONNECTIONS
+    self.max_keepalive = max_keepalive or settings.HTTP_MAX_KEEPALIVE_CONNECTIONS
+    self.timeout = timeout or settings.HTTP_TIMEOUT_SECONDS
+    self.max_retries = max_retries if max_retries is not None else settings.HTTP_MAX_RETRIES
+    self.backoff = backoff if backoff is not None else settings.HTTP_RETRY_BACKOFF_SECONDS
+    self.max_backoff = max_backoff if max_backoff is not None else settings.HTTP_RETRY_BACKOFF_MAX_SECONDS
+    self.max_concurrency = max_concurrency or settings.HTTP_MAX_CONCURRENCY
+    self.breaker = breaker or CircuitBreaker(settings.HTTP_BREAKER_FAILURE_THRESHOLD, settings.HTTP_BREAKER_RESET_SECONDS)
+    self.client = httpx.AsyncClient(
+      limits=httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_keepalive),
+      timeout=httpx.Timeout(self.timeout),
+      transport=transport,
+    )
+    self._semaphore = asyncio.Semaphore(self.max_concurrency)
+    self.in_flight = 0
+    self.requests = 0
+    self.retries = 0
+    self.failures = 0
+    self.rejected = 0
+
+  async def request(self, method: str, url: str, **kwargs: Any) -> httpx.Response:
+    attempt = 0
+    while True:
+      response = None
+      if not self.breaker.allow():
+        self.rejected += 1
+        raise UpstreamUnavailableException(f'Circuit open for {httpx.URL(url).host}')
+      probing = self.breaker.state == CircuitBreaker.HALF_OPEN
+      try:
+        async with self._semaphore:
+          self.in_flight += 1
+          self.requests += 1
+          try:
+            response = await self.client.request(method, url, **kwargs)
+          finally:
+            self.in_flight -= 1
+      except httpx.TransportError as e:
+        self.breaker.record_failure(probing)
+        if attempt >= self.max_retries:
+          self.failures += 1
+          raise UpstreamUnavailableException(f'Upstream request failed: {str(e)}')
+      else:
+        if response.status_code not in RETRY_STATUS_CODES:
+          self.breaker.record_success(probing)
+          return response
+        # 429 means the upstream is alive, just busy
+        if response.status_code == 429:
+          self.breaker.record_success(probing)
+        else:
+          self.breaker.record_failure(probing)
+        if attempt >= self.max_retries:
+          self.failures += 1
+          return response
+      finally:
+        if probing:
+          self.breaker.release_probe()
+      attempt += 1
+      self.retries += 1
+      await asyncio.sleep(self._backoff(attempt, response))
+
+  async def post(self, url: str, **kwargs: Any) -> httpx.Response:
+    return await self.request('POST', url, **kwargs)
+
+  async def aclose(self) -> None:
+    await self.client.aclose()
+
+  def _backoff(self, attempt: int, response: httpx.Response | None) -> float:
+    retry_after = response.headers.get('Retry-After') if response is not None else None
+    if retry_after and retry_after.isdigit():
+      return min(float(retry_after), self.max_backoff)
+    # Full jitter so retries from many workers don't line up
+    return random.uniform(0, min(self.backoff * 2 ** (attempt - 1), self.max_backoff))
+
+  def snapshot(self) -> dict:
+    return {
+      'max_connections': self.max_connections,
+      'max_keepalive_connections': self.max_keepalive,
+      'max_concurrency': self.max_concurrency,
+      'in_flight': self.in_flight,
+      'requests': self.requests,
+      'retries': self.retries,
+      'failures': self.failures,
+      'rejected': self.rejected,
+      'breaker_state': self.breaker.state,
+      'breaker_failures': self.breaker.failures,
+      'breaker_times_opened': self.breaker.times_opened,
+    }
+
+_http_client: ResilientClient | None = None
+
+def get_http_client() -> ResilientClient:
+  global _http_client
+  if _http_client is None:
+    _http_client = ResilientClient()
+  return _http_client
+
+async def close_http_client() -> None:
+  global _http_client
+  if _http_client is not None:
+    await _http_client.aclose()
+    _http_client = None
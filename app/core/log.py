@@ -0,0 +1,35 @@
+import json
+import logging
+import sys
+
+from app.core.config import settings
+
+# Attributes every LogRecord has; anything else came in through `extra`
+_RECORD_FIELDS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'taskName'}
+
+class JsonFormatter(logging.Formatter):
+  # One JSON object per line, with `extra` fields as top-level keys
+  def format(self, record: logging.LogRecord) -> str:
+    payload = {
+      'time': self.formatTime(record),
+      'level': record.levelname,
+      'logger': record.name,
+      'message': record.getMessage(),
+    }
+    payload.update({key: value for key, value in vars(record).items() if key not in _RECORD_FIELDS})
+    if record.exc_info:
+      payload['exc_info'] = self.formatException(record.exc_info)
+    return json.dumps(payload, default=str)
+
+def configure_logging() -> None:
+  # Per-image pipeline events log at DEBUG, so the default level keeps
+  # them off the hot path
+  handler = logging.StreamHandler(sys.stdout)
+  if settings.LOG_FORMAT == 'json':
+    handler.setFormatter(JsonFormatter())
+  else:
+    handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+  logger = logging.getLogger('app')
+  logger.handlers = [handler]
+  logger.setLevel(settings.LOG_LEVEL)
+  logger.propagate = False
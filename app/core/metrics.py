@@ -0,0 +1,92 @@
+import time
+from contextlib import contextmanager
+from functools import wraps
+from typing import Any, Awaitable, Callable, Iterator, TypeVar
+
+from prometheus_client import Counter, Gauge, Histogram
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.registry import REGISTRY, Collector
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+T = TypeVar('T')
+
+# Stages run from sub-millisecond DB writes to multi-second detector calls
+STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+STAGE_SECONDS = Histogram('etle_stage_seconds', 'Time spent in each upload/predict pipeline stage', ['stage'], buckets=STAGE_BUCKETS)
+REQUEST_SECONDS = Histogram('etle_http_request_seconds', 'HTTP request latency', ['method', 'route', 'status'], buckets=STAGE_BUCKETS)
+REQUESTS_IN_FLIGHT = Gauge('etle_http_requests_in_flight', 'HTTP requests being served')
+PREDICTIONS_IN_FLIGHT = Gauge('etle_predictions_in_flight', 'Predictions currently running')
+PREDICTIONS = Counter('etle_predictions_total', 'Finished predictions by outcome', ['outcome'])
+DETECTIONS = Counter('etle_detections_total', 'Objects returned by the detector', ['class_name'])
+VIOLATIONS = Counter('etle_violations_total', 'Violations recorded')
+UPLOADS = Counter('etle_uploads_total', 'Uploaded files by outcome', ['outcome'])
+UPLOAD_BYTES = Counter('etle_upload_bytes_total', 'Bytes accepted from uploads')
+JOBS = Counter('etle_jobs_total', 'Prediction job attempts by outcome', ['outcome'])
+
+@contextmanager
+def stage_timer(stage: str) -> Iterator[None]:
+  started = time.perf_counter()
+  try:
+    yield
+  finally:
+    STAGE_SECONDS.labels(stage).observe(time.perf_counter() - started)
+
+def timed(stage: str) -> Callable[[Callable[..., Awaitable[T]]], Callable[..., Awaitable[T]]]:
+  # Records an async function's duration, including failures, under `stage`
+  def decorator(fn: Callable[..., Awaitable[T]]) -> Callable[..., Awaitable[T]]:
+    @wraps(fn)
+    async def wrapper(*args: Any, **kwargs: Any) -> T:
+      with stage_timer(stage):
+        return await fn(*args, **kwargs)
+    return wrapper
+  return decorator
+
+class SnapshotCollector(Collector):
+  # Publishes the numeric fields of the /private snapshots as gauges, so the
+  # services keep their own counters and only get read at scrape time
+  def __init__(self):
+    self.sources: dict[str, Callable[[], dict]] = {}
+
+  def add(self, name: str, snapshot: Callable[[], dict]) -> None:
+    self.sources[name] = snapshot
+
+  def collect(self) -> Iterator[GaugeMetricFamily]:
+    for name, snapshot in self.sources.items():
+      try:
+        values = snapshot()
+      except Exception:
+        continue
+      for key, value in values.items():
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+          yield GaugeMetricFamily(f'etle_{name}_{key}', f'{name} {key}', value=value)
+
+snapshot_collector = SnapshotCollector()
+REGISTRY.register(snapshot_collector)
+
+class MetricsMiddleware:
+  # Plain ASGI so streamed responses are timed to their last byte
+  def __init__(self, app: ASGIApp):
+    self.app = app
+
+  async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+    if scope['type'] != 'http':
+      await self.app(scope, receive, send)
+      return
+    status_code = 500
+    async def send_wrapper(message: Message) -> None:
+      nonlocal status_code
+      if message['type'] == 'http.response.start':
+        status_code = message['status']
+      await send(message)
+
+    started = time.perf_counter()
+    REQUESTS_IN_FLIGHT.inc()
+    try:
+      await self.app(scope, receive, send_wrapper)
+    finally:
+      REQUESTS_IN_FLIGHT.dec()
+      # Route templates keep label cardinality bounded
+      route = scope.get('route')
+      path = getattr(route, 'path', None) or 'unmatched'
+      REQUEST_SECONDS.labels(scope['method'], path, str(status_code)).observe(time.perf_counter() - started)
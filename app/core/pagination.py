@@ -0,0 +1,20 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, Callable
+
+from app.core.exceptions import InvalidCursorException
+
+# Opaque keyset cursors over (timestamp, id) pairs
+
+def encode_cursor(timestamp: datetime, id: Any) -> str:
+  raw = json.dumps([timestamp.isoformat(), str(id)])
+  return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor: str, id_type: Callable[[str], Any]) -> tuple[datetime, Any]:
+  try:
+    padded = cursor + '=' * (-len(cursor) % 4)
+    timestamp, id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    return datetime.fromisoformat(timestamp), id_type(id)
+  except Exception:
+    raise InvalidCursorException()
@@ -0,0 +1,240 @@
+import hashlib
+import os
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Any, Iterator, NamedTuple
+
+from app.core.config import settings
+
+class StoredObject(NamedTuple):
+  key: str
+  size: int
+  modified: datetime  # naive UTC, like the database timestamps
+
+class BaseStorage:
+  # Blocking object store API; callers run it on the I/O pool. Keys are
+  # "/"-separated and sharded by the leading characters of the file name,
+  # which is a content hash for everything the app writes.
+  name: str = 'base'
+
+  def key_for(self, filename: str) -> str:
+    width = settings.STORAGE_SHARD_WIDTH
+    shards = [filename[i * width:(i + 1) * width] for i in range(settings.STORAGE_SHARD_DEPTH)]
+    return '/'.join([shard for shard in shards if shard] + [filename])
+
+  def local_path(self, key: str) -> str | None:
+    # Filesystem path for backends that have one, so readers can skip a copy
+    return None
+
+  def url(self, key: str) -> str | None:
+    # Public URL when the backend serves objects itself
+    return None
+
+  def save(self, key: str, source_path: str) -> None:
+    # Moves a finished local file into the store
+    raise NotImplementedError
+
+  def write(self, key: str, data: bytes) -> None:
+    raise NotImplementedError
+
+  def read(self, key: str) -> bytes:
+    raise NotImplementedError
+
+  def exists(self, key: str) -> bool:
+    raise NotImplementedError
+
+  def etag(self, key: str) -> str | None:
+    # Strong, quoted validator for the stored bytes; None when missing
+    raise NotImplementedError
+
+  def delete(self, key: str) -> None:
+    raise NotImplementedError
+
+  def delete_many(self, keys: list[str]) -> None:
+    for key in keys:
+      self.delete(key)
+
+  def list_keys(self, start_after: str | None = None) -> Iterator[StoredObject]:
+    # Every object in key order, resuming after start_after
+    raise NotImplementedError
+
+class LocalStorage(BaseStorage):
+  name = 'local'
+
+  def __init__(self, root: str, url_prefix: str | None = None):
+    self.root = root
+    self.url_prefix = url_prefix
+    os.makedirs(root, exist_ok=True)
+
+  def local_path(self, key: str) -> str:
+    return os.path.join(self.root, *key.split('/'))
+
+  def url(self, key: str) -> str | None:
+    if self.url_prefix is None:
+      return None
+    return f'{settings.BASE_URL}/{self.url_prefix}/{key}'
+
+  def save(self, key: str, source_path: str) -> None:
+    path = self.local_path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    os.replace(source_path, path)
+
+  def write(self, key: str, data: bytes) -> None:
+    path = self.local_path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Readers never see a half-written file
+    partial_path = f'{path}.part'
+    with open(partial_path, 'wb') as out_file:
+      out_file.write(data)
+    os.replace(partial_path, path)
+
+  def read(self, key: str) -> bytes:
+    with open(self.local_path(key), 'rb') as in_file:
+      return in_file.read()
+
+  def exists(self, key: str) -> bool:
+    return os.path.exists(self.local_path(key))
+
+  def etag(self, key: str) -> str | None:
+    try:
+      stat = os.stat(self.local_path(key))
+    except FileNotFoundError:
+      return None
+    return _file_etag(self.local_path(key), stat.st_mtime_ns, stat.st_size)
+
+  def delete(self, key: str) -> None:
+    path = self.local_path(key)
+    if os.path.exists(path):
+      os.remove(path)
+
+  def list_keys(self, start_after: str | None = None) -> Iterator[StoredObject]:
+    yield from self._walk('', start_after)
+
+  def _walk(self, prefix: str, start_after: str | None) -> Iterator[StoredObject]:
+    try:
+      entries = list(os.scandir(os.path.join(self.root, *prefix.split('/'))))
+    except FileNotFoundError:
+      return
+    # Directories sort as "name/" so the walk follows plain string order
+    entries.sort(key=lambda entry: entry.name + ('/' if entry.is_dir() else ''))
+    for entry in entries:
+      key = prefix + entry.name
+      if entry.is_dir():
+        if start_after and key + '/' < start_after and not start_after.startswith(key + '/'):
+          continue
+        yield from self._walk(key + '/', start_after)
+      elif not start_after or key > start_after:
+        stat = entry.stat()
+        yield StoredObject(key, stat.st_size, datetime.utcfromtimestamp(stat.st_mtime))
+
+@lru_cache(maxsize=4096)
+def _file_etag(path: str, mtime_ns: int, size: int) -> str:
+  # Hashed once per file version; mtime and size are part of the cache key
+  digest = hashlib.md5(usedforsecurity=False)
+  with open(path, 'rb') as in_file:
+    while chunk := in_file.read(1024 * 1024):
+      digest.update(chunk)
+  return f'"{digest.hexdigest()}"'
+
+@lru_cache(maxsize=None)
+def get_s3_client() -> Any:
+  # Imported lazily so local deployments do not need boto3
+  import boto3
+  from botocore.config import Config
+  return boto3.client(
+    's3',
+    endpoint_url=settings.S3_ENDPOINT_URL,
+    region_name=settings.S3_REGION,
+    aws_access_key_id=settings.S3_ACCESS_KEY_ID,
+    aws_secret_access_key=settings.S3_SECRET_ACCESS_KEY,
+    config=Config(
+      max_pool_connections=settings.IO_THREAD_POOL_SIZE,
+      # MinIO and most stand-ins only route path-style requests
+      s3={'addressing_style': 'path' if settings.S3_ENDPOINT_URL else 'auto'},
+    ),
+  )
+
+class S3Storage(BaseStorage):
+  # Any S3-compatible service; point S3_ENDPOINT_URL at MinIO for local runs
+  name = 's3'
+
+  def __init__(self, bucket: str, prefix: str, client: Any | None = None):
+    self.bucket = bucket
+    self.prefix = prefix.strip('/')
+    self._client = client
+
+  @property
+  def client(self) -> Any:
+    if self._client is None:
+      self._client = get_s3_client()
+    return self._client
+
+  def object_key(self, key: str) -> str:
+    return f'{self.prefix}/{key}' if self.prefix else key
+
+  def url(self, key: str) -> str | None:
+    if not settings.S3_PUBLIC_URL:
+      return None
+    return f'{settings.S3_PUBLIC_URL.rstrip("/")}/{self.object_key(key)}'
+
+  def save(self, key: str, source_path: str) -> None:
+    self.client.upload_file(source_path, self.bucket, self.object_key(key))
+    os.remove(source_path)
+
+  def write(self, key: str, data: bytes) -> None:
+    self.client.put_object(Bucket=self.bucket, Key=self.object_key(key), Body=data)
+
+  def read(self, key: str) -> bytes:
+    response = self.client.get_object(Bucket=self.bucket, Key=self.object_key(key))
+    return response['Body'].read()
+
+  def exists(self, key: str) -> bool:
+    return self.etag(key) is not None
+
+  def etag(self, key: str) -> str | None:
+    from botocore.exceptions import ClientError
+    try:
+      response = self.client.head_object(Bucket=self.bucket, Key=self.object_key(key))
+    except ClientError as e:
+      if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+        return None
+      raise
+    # Single-part uploads report the MD5 of the object, already quoted
+    return response['ETag']
+
+  def delete(self, key: str) -> None:
+    self.client.delete_object(Bucket=self.bucket, Key=self.object_key(key))
+
+  def list_keys(self, start_after: str | None = None) -> Iterator[StoredObject]:
+    prefix = f'{self.prefix}/' if self.prefix else ''
+    arguments = {'Bucket': self.bucket, 'Prefix': prefix}
+    if start_after:
+      arguments['StartAfter'] = self.object_key(start_after)
+    for page in self.client.get_paginator('list_objects_v2').paginate(**arguments):
+      for item in page.get('Contents', []):
+        modified = item['LastModified'].astimezone(timezone.utc).replace(tzinfo=None)
+        yield StoredObject(item['Key'][len(prefix):], item['Size'], modified)
+
+  def delete_many(self, keys: list[str]) -> None:
+    # DeleteObjects takes at most 1000 keys per request
+    for start in range(0, len(keys), 1000):
+      objects = [{'Key': self.object_key(key)} for key in keys[start:start + 1000]]
+      self.client.delete_objects(Bucket=self.bucket, Delete={'Objects': objects, 'Quiet': True})
+
+@lru_cache(maxsize=None)
+def get_image_storage() -> BaseStorage:
+  if settings.STORAGE_BACKEND == 's3':
+    return S3Storage(settings.S3_BUCKET, settings.S3_IMAGES_PREFIX)
+  return LocalStorage(settings.UPLOAD_DIR, url_prefix='images')
+
+@lru_cache(maxsize=None)
+def get_crop_storage() -> BaseStorage:
+  if settings.STORAGE_BACKEND == 's3':
+    return S3Storage(settings.S3_BUCKET, settings.S3_CROPS_PREFIX)
+  return LocalStorage(settings.CROPPED_IMAGES_DIR, url_prefix='cropped_images')
+
+@lru_cache(maxsize=None)
+def get_derivative_storage() -> BaseStorage:
+  if settings.STORAGE_BACKEND == 's3':
+    return S3Storage(settings.S3_BUCKET, settings.S3_DERIVATIVES_PREFIX)
+  return LocalStorage(settings.DERIVATIVES_DIR)
@@ -1,12 +1,27 @@
-from fastapi import FastAPI
-from fastapi.staticfiles import StaticFiles
+from fastapi import FastAPI, Response
 import os
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 from starlette.middleware.cors import CORSMiddleware
 
+from app.api.files import CachedStaticFiles
 from app.api.main import api_router
-from app.core.db import init_db
+from app.core.db import async_engine, init_db
+from app.core.executor import shutdown_executors
+from app.core.http import close_http_client, get_http_client
+from app.core.log import configure_logging
+from app.core.metrics import MetricsMiddleware, snapshot_collector
+from app.services.batch_scheduler import get_batch_scheduler
+from app.services.derivative_service import get_derivative_service
+from app.services.detector import get_detector
+from app.services.prediction_cache import get_prediction_cache
+from app.services.violation_broker import get_violation_broker
+from app.services.job_queue import get_job_queue
+from app.services.prediction_writer import get_prediction_writer
+from app.services.retention_service import get_retention_worker
 from app.core.config import settings
 
+configure_logging()
+
 app = FastAPI()
 
 app.add_middleware(
@@ -16,14 +31,45 @@ app.add_middleware(
   allow_headers=['*'],
 )
 
-os.makedirs("images", exist_ok=True)
-os.makedirs("cropped_images", exist_ok=True)
+# Object stores serve their own URLs; only the local backend is mounted here
+if settings.STORAGE_BACKEND == 'local':
+  os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
+  os.makedirs(settings.CROPPED_IMAGES_DIR, exist_ok=True)
+  app.mount("/images", CachedStaticFiles(directory=settings.UPLOAD_DIR), name="images")
+  app.mount("/cropped_images", CachedStaticFiles(directory=settings.CROPPED_IMAGES_DIR, immutable=False), name="cropped_images")
 
-app.mount("/images", StaticFiles(directory="images"), name="images")
-app.mount("/cropped_images", StaticFiles(directory="cropped_images"), name="cropped_images")
+if settings.METRICS_ENABLED:
+  app.add_middleware(MetricsMiddleware)
 
 app.include_router(api_router, prefix=settings.API_STR)
 
+if settings.METRICS_ENABLED:
+  @app.get('/metrics', include_in_schema=False)
+  def get_metrics() -> Response:
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
 @app.on_event("startup")
 async def on_startup():
-  init_db()
\ No newline at end of file
+  init_db()
+  get_http_client()
+  await get_job_queue().start()
+  if settings.RETENTION_ENABLED:
+    await get_retention_worker().start()
+  snapshot_collector.add('batching', lambda: get_batch_scheduler(get_detector()).metrics.snapshot())
+  snapshot_collector.add('prediction_cache', lambda: get_prediction_cache().snapshot())
+  snapshot_collector.add('commits', lambda: get_prediction_writer().snapshot())
+  snapshot_collector.add('http_client', lambda: get_http_client().snapshot())
+  snapshot_collector.add('derivatives', lambda: get_derivative_service().snapshot())
+  snapshot_collector.add('job_queue', lambda: get_job_queue().snapshot())
+  snapshot_collector.add('violation_stream', lambda: get_violation_broker().snapshot())
+  snapshot_collector.add('retention', lambda: get_retention_worker().snapshot())
+
+@app.on_event("shutdown")
+async def on_shutdown():
+  await get_retention_worker().stop()
+  await get_job_queue().stop()
+  await get_prediction_writer().drain()
+  await get_violation_broker().stop()
+  await close_http_client()
+  shutdown_executors()
+  await async_engine.dispose()
@@ -0,0 +1,26 @@
+from datetime import datetime
+from sqlalchemy import Index
+from sqlmodel import Field, SQLModel
+from uuid import UUID
+
+class DetectionBase(SQLModel):
+  image_id: UUID = Field(..., foreign_key='image.id', index=True)
+  violation_id: int | None = Field(default=None, foreign_key='violation.id', index=True)
+  class_name: str = Field(...)
+  confidence: float = Field(...)
+  x: float = Field(...)
+  y: float = Field(...)
+  width: float = Field(...)
+  height: float = Field(...)
+
+class Detection(DetectionBase, table=True):
+  __table_args__ = (
+    # "detections of class C above confidence X" is a range scan on this index
+    Index('ix_detection_class_confidence', 'class_name', 'confidence'),
+  )
+
+  id: int = Field(default=None, primary_key=True)
+  created_at: datetime = Field(default_factory=datetime.utcnow)
+
+class DetectionCreate(DetectionBase):
+  pass
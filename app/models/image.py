@@ -1,4 +1,6 @@
 from datetime import datetime
+from sqlalchemy import Index, event, inspect
+from sqlalchemy.schema import CreateIndex
 from sqlmodel import SQLModel, Field
 from uuid import UUID, uuid4
 
@@ -7,12 +9,59 @@ class ImageBase(SQLModel):
   filepath: str = Field(...)
   content_type: str = Field(...)
   size: int = Field(...)
+  content_hash: str | None = Field(default=None, index=True)
   predictions: str | None = Field(default=None)
+  job_id: UUID | None = Field(default=None)
+  job_status: str | None = Field(default=None)
+  job_attempts: int = Field(default=0)
+  job_error: str | None = Field(default=None)
 
 class Image(ImageBase, table=True):
+  __table_args__ = (
+    # Keyset pagination on (created_at, id)
+    Index('ix_image_created_at_id', 'created_at', 'id'),
+  )
+
   id: UUID = Field(default_factory=uuid4, primary_key=True)
   created_at: datetime = Field(default_factory=datetime.utcnow)
 
+# Columns added to image since its first release, with the value that
+# fills existing rows when the column is NOT NULL
+IMAGE_ADDED_COLUMNS = {
+  'content_hash': None,
+  'job_id': None,
+  'job_status': None,
+  'job_attempts': '0',
+  'job_error': None,
+}
+
+@event.listens_for(SQLModel.metadata, 'after_create')
+def upgrade_image_schema(target, connection, **kw):
+  # create_all neither adds columns nor indexes tables that already exist
+  existing = {column['name'] for column in inspect(connection).get_columns('image')}
+  for name, default in IMAGE_ADDED_COLUMNS.items():
+    if name not in existing:
+      column_type = Image.__table__.c[name].type.compile(dialect=connection.dialect)
+      not_null = f' NOT NULL DEFAULT {default}' if default is not None else ''
+      connection.exec_driver_sql(f'ALTER TABLE image ADD COLUMN {name} {column_type}{not_null}')
+  for index in Image.__table__.indexes:
+    connection.execute(CreateIndex(index, if_not_exists=True))
+
+class ImageBlob(SQLModel, table=True):
+  content_hash: str = Field(primary_key=True)
+  filepath: str = Field(...)
+  content_type: str = Field(...)
+  size: int = Field(...)
+  ref_count: int = Field(default=1)
+  created_at: datetime = Field(default_factory=datetime.utcnow)
+
+class ImageCrop(SQLModel, table=True):
+  # Crops belong to the stored frame, so they go when its blob does.
+  # content_hash is the file stem for uploads that predate deduplication.
+  key: str = Field(primary_key=True)
+  content_hash: str = Field(..., index=True)
+  created_at: datetime = Field(default_factory=datetime.utcnow)
+
 class ImageCreate(ImageBase):
   id: UUID | None = None
 
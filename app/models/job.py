@@ -0,0 +1,26 @@
+from datetime import datetime
+from sqlmodel import SQLModel, Field
+from uuid import UUID, uuid4
+
+class JobStatus:
+  QUEUED = 'queued'
+  RUNNING = 'running'
+  RETRYING = 'retrying'
+  COMPLETED = 'completed'
+  FAILED = 'failed'
+
+  PENDING = (QUEUED, RETRYING)
+  FINISHED = (COMPLETED, FAILED)
+
+class PredictionJobBase(SQLModel):
+  image_id: UUID = Field(..., index=True)
+  status: str = Field(default=JobStatus.QUEUED, index=True)
+  attempts: int = Field(default=0)
+  max_attempts: int = Field(default=3)
+  last_error: str | None = Field(default=None)
+  next_run_at: datetime = Field(default_factory=datetime.utcnow)
+
+class PredictionJob(PredictionJobBase, table=True):
+  id: UUID = Field(default_factory=uuid4, primary_key=True)
+  created_at: datetime = Field(default_factory=datetime.utcnow)
+  updated_at: datetime = Field(default_factory=datetime.utcnow)
@@ -1,4 +1,6 @@
+from datetime import datetime
 from pydantic import BaseModel
+from sqlmodel import SQLModel, Field
 
 class BoundingBox(BaseModel):
   x: float
@@ -12,3 +14,14 @@ class PredictionResult(BaseModel):
   image_id: str
   predictions: list[BoundingBox]
   cropped_images: list[str] | None = None
+
+class CachedPrediction(BaseModel):
+  predictions: list[BoundingBox]
+  cropped_images: list[str] = []
+
+class PredictionCacheEntry(SQLModel, table=True):
+  content_hash: str = Field(primary_key=True)
+  model_version: str = Field(primary_key=True)
+  predictions: str = Field(...)
+  cropped_images: str = Field(default='[]')
+  created_at: datetime = Field(default_factory=datetime.utcnow)
@@ -0,0 +1,9 @@
+from datetime import datetime
+from sqlmodel import Field, SQLModel
+
+class RetentionState(SQLModel, table=True):
+  # Small key/value rows for the retention worker: the lease that keeps it
+  # to one uvicorn worker, and scan cursors so an interrupted run resumes
+  name: str = Field(primary_key=True)
+  value: str | None = Field(default=None)
+  updated_at: datetime = Field(default_factory=datetime.utcnow)
@@ -1,6 +1,11 @@
+import logging
 from datetime import datetime
+from sqlalchemy import Index, event, inspect, text
+from sqlalchemy.schema import CreateIndex
 from sqlmodel import Field, SQLModel
 
+logger = logging.getLogger(__name__)
+
 class ViolationBase(SQLModel):
   status: int = Field(default=0)
   type: int = Field(...)
@@ -11,7 +16,113 @@ class ViolationBase(SQLModel):
   drone: str | None = Field(default=None)
 
 class Violation(ViolationBase, table=True):
+  __table_args__ = (
+    # Keyset pagination on (timestamp, id)
+    Index('ix_violation_timestamp_id', 'timestamp', 'id'),
+    # Search filters, each followed by the (timestamp, id) sort so a
+    # filtered page is read straight off the index
+    Index('ix_violation_status_timestamp_id', 'status', 'timestamp', 'id'),
+    Index('ix_violation_type_timestamp_id', 'type', 'timestamp', 'id'),
+    Index('ix_violation_drone_timestamp_id', 'drone', 'timestamp', 'id'),
+    # Plate prefixes are matched case-insensitively as a range on upper()
+    Index('ix_violation_plate_upper', text('upper(plate_number)')),
+  )
+
+  id: int = Field(default=None, primary_key=True)
+  # Bumped on every status change, so reviewers cannot overwrite a decision
+  # they have not seen
+  version: int = Field(default=1)
+
+class ViolationChange(SQLModel, table=True):
+  # Outbox of status changes, written in the same transaction as the update.
+  # No foreign key, so the history outlives deleted violations.
   id: int = Field(default=None, primary_key=True)
+  violation_id: int = Field(index=True)
+  previous_status: int
+  status: int
+  version: int
+  changed_at: datetime = Field(default_factory=datetime.utcnow)
+
+class ViolationRollup(SQLModel, table=True):
+  # Violation counts per time bucket and dimension combination, kept up to
+  # date in the same transaction that writes the violations. Missing
+  # location/drone are stored as '' so they can be part of the key.
+  period: str = Field(primary_key=True)  # 'hour' or 'day'
+  bucket: datetime = Field(primary_key=True)
+  type: int = Field(primary_key=True)
+  status: int = Field(primary_key=True)
+  location: str = Field(default='', primary_key=True)
+  drone: str = Field(default='', primary_key=True)
+  count: int = Field(default=0)
+
+# Full-text location and trigram plate search. SQLite keeps external-content
+# FTS5 tables in sync with triggers; Postgres indexes the expressions the
+# search queries use. Statements are idempotent so existing databases pick
+# them up on the next init_db.
+SQLITE_SEARCH_TABLES = {
+  'violation_location_fts': "CREATE VIRTUAL TABLE violation_location_fts USING fts5(location, content='violation', content_rowid='id')",
+  'violation_plate_fts': "CREATE VIRTUAL TABLE violation_plate_fts USING fts5(plate_number, content='violation', content_rowid='id', tokenize='trigram')",
+}
+
+SQLITE_SEARCH_TRIGGERS = {
+  'violation_search_insert': '''
+    CREATE TRIGGER IF NOT EXISTS violation_search_insert AFTER INSERT ON violation BEGIN
+      INSERT INTO violation_location_fts(rowid, location) SELECT new.id, new.location WHERE new.location IS NOT NULL;
+      INSERT INTO violation_plate_fts(rowid, plate_number) SELECT new.id, new.plate_number WHERE new.plate_number IS NOT NULL;
+    END''',
+  'violation_search_delete': '''
+    CREATE TRIGGER IF NOT EXISTS violation_search_delete AFTER DELETE ON violation BEGIN
+      INSERT INTO violation_location_fts(violation_location_fts, rowid, location) SELECT 'delete', old.id, old.location WHERE old.location IS NOT NULL;
+      INSERT INTO violation_plate_fts(violation_plate_fts, rowid, plate_number) SELECT 'delete', old.id, old.plate_number WHERE old.plate_number IS NOT NULL;
+    END''',
+  'violation_search_update': '''
+    CREATE TRIGGER IF NOT EXISTS violation_search_update AFTER UPDATE OF location, plate_number ON violation BEGIN
+      INSERT INTO violation_location_fts(violation_location_fts, rowid, location) SELECT 'delete', old.id, old.location WHERE old.location IS NOT NULL;
+      INSERT INTO violation_plate_fts(violation_plate_fts, rowid, plate_number) SELECT 'delete', old.id, old.plate_number WHERE old.plate_number IS NOT NULL;
+      INSERT INTO violation_location_fts(rowid, location) SELECT new.id, new.location WHERE new.location IS NOT NULL;
+      INSERT INTO violation_plate_fts(rowid, plate_number) SELECT new.id, new.plate_number WHERE new.plate_number IS NOT NULL;
+    END''',
+}
+
+# pg_trgm is not created here: the app role usually lacks the privilege on
+# managed Postgres, so it is an admin step (see the README)
+POSTGRES_TRIGRAM_DDL = [
+  'CREATE INDEX IF NOT EXISTS ix_violation_plate_trgm ON violation USING gin (upper(plate_number) gin_trgm_ops)',
+]
+
+POSTGRES_SEARCH_DDL = [
+  "CREATE INDEX IF NOT EXISTS ix_violation_location_tsv ON violation USING gin (to_tsvector('simple', coalesce(location, '')))",
+]
+
+# Extensions found by the last init_db; search falls back without pg_trgm
+postgres_extensions: set[str] = set()
+
+@event.listens_for(SQLModel.metadata, 'after_create')
+def upgrade_violation_schema(target, connection, **kw):
+  # create_all neither adds columns nor indexes tables that already exist
+  if 'version' not in {column['name'] for column in inspect(connection).get_columns('violation')}:
+    connection.exec_driver_sql('ALTER TABLE violation ADD COLUMN version INTEGER NOT NULL DEFAULT 1')
+  for index in Violation.__table__.indexes:
+    connection.execute(CreateIndex(index, if_not_exists=True))
+  if connection.dialect.name == 'sqlite':
+    existing = set(connection.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = 'table'").scalars())
+    for name, ddl in SQLITE_SEARCH_TABLES.items():
+      if name not in existing:
+        connection.exec_driver_sql(ddl)
+        # Index the violations written before the table existed
+        connection.exec_driver_sql(f"INSERT INTO {name}({name}) VALUES ('rebuild')")
+    for ddl in SQLITE_SEARCH_TRIGGERS.values():
+      connection.exec_driver_sql(ddl)
+  elif connection.dialect.name == 'postgresql':
+    postgres_extensions.clear()
+    postgres_extensions.update(connection.exec_driver_sql('SELECT extname FROM pg_extension').scalars())
+    if 'pg_trgm' in postgres_extensions:
+      for ddl in POSTGRES_TRIGRAM_DDL:
+        connection.exec_driver_sql(ddl)
+    else:
+      logger.warning('pg_trgm is not installed; plate search falls back to prefix matching')
+    for ddl in POSTGRES_SEARCH_DDL:
+      connection.exec_driver_sql(ddl)
 
 class ViolationCreate(ViolationBase):
   pass
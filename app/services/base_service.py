@@ -1,6 +1,11 @@
 from sqlmodel import Session
-from app.core.db import engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.core.db import engine, new_async_session
 
 class BaseService:
   def get_session(self) -> Session:
-    return Session(engine)
\ No newline at end of file
+    # Blocking session for scripts; request paths use get_async_session
+    return Session(engine)
+
+  def get_async_session(self) -> AsyncSession:
+    return new_async_session()
\ No newline at end of file
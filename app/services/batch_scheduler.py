@@ -0,0 +1,160 @@
+import asyncio
+import logging
+import time
+from weakref import WeakKeyDictionary
+
+from app.core.config import settings
+from app.core.metrics import STAGE_SECONDS
+from app.models.prediction import BoundingBox
+from app.services.detector import BaseDetector, ImageSource
+
+logger = logging.getLogger(__name__)
+
+class BatchMetrics:
+  def __init__(self, max_batch_size: int):
+    self.max_batch_size = max_batch_size
+    self.batches = 0
+    self.items = 0
+    self.size_flushes = 0
+    self.timer_flushes = 0
+    self.failed_batches = 0
+    self.failed_items = 0
+    self.total_queue_delay_ms = 0.0
+    self.max_queue_delay_ms = 0.0
+    self.total_inference_ms = 0.0
+
+  def record(self, batch_size: int, queue_delays_ms: list[float], inference_ms: float, by_size: bool) -> None:
+    self.batches += 1
+    self.items += batch_size
+    if by_size:
+      self.size_flushes += 1
+    else:
+      self.timer_flushes += 1
+    self.total_queue_delay_ms += sum(queue_delays_ms)
+    self.max_queue_delay_ms = max(self.max_queue_delay_ms, *queue_delays_ms)
+    self.total_inference_ms += inference_ms
+
+  @property
+  def fill_ratio(self) -> float:
+    if not self.batches:
+      return 0.0
+    return self.items / (self.batches * self.max_batch_size)
+
+  @property
+  def avg_queue_delay_ms(self) -> float:
+    return self.total_queue_delay_ms / self.items if self.items else 0.0
+
+  def snapshot(self) -> dict:
+    return {
+      'batches': self.batches,
+      'items': self.items,
+      'max_batch_size': self.max_batch_size,
+      'avg_batch_size': self.items / self.batches if self.batches else 0.0,
+      'fill_ratio': self.fill_ratio,
+      'size_flushes': self.size_flushes,
+      'timer_flushes': self.timer_flushes,
+      'failed_batches': self.failed_batches,
+      'failed_items': self.failed_items,
+      'avg_queue_delay_ms': self.avg_queue_delay_ms,
+      'max_queue_delay_ms': self.max_queue_delay_ms,
+      'avg_inference_ms': self.total_inference_ms / self.batches if self.batches else 0.0,
+    }
+
+class _Pending:
+  __slots__ = ('source', 'future', 'enqueued_at')
+
+  def __init__(self, source: ImageSource, future: asyncio.Future):
+    self.source = source
+    self.future = future
+    self.enqueued_at = time.perf_counter()
+
+class BatchScheduler:
+  def __init__(self, detector: BaseDetector, max_batch_size: int | None = None, max_wait_ms: float | None = None):
+    self.detector = detector
+    self.max_batch_size = max_batch_size or settings.DETECTOR_MAX_BATCH_SIZE
+    self.max_wait_ms = max_wait_ms if max_wait_ms is not None else settings.DETECTOR_MAX_WAIT_MS
+    self.metrics = BatchMetrics(self.max_batch_size)
+    self._pending: list[_Pending] = []
+    self._timer: asyncio.TimerHandle | None = None
+    self._tasks: set[asyncio.Task] = set()
+
+  async def submit(self, source: ImageSource) -> list[BoundingBox]:
+    if self.max_batch_size <= 1:
+      return await self.detector.apredict(source)
+
+    loop = asyncio.get_running_loop()
+    self._pending.append(_Pending(source, loop.create_future()))
+    future = self._pending[-1].future
+    if len(self._pending) >= self.max_batch_size:
+      self._flush(by_size=True)
+    elif self._timer is None:
+      self._timer = loop.call_later(self.max_wait_ms / 1000, self._flush, False)
+    return await future
+
+  async def drain(self) -> None:
+    if self._pending:
+      self._flush(by_size=False)
+    if self._tasks:
+      await asyncio.gather(*self._tasks, return_exceptions=True)
+
+  def _flush(self, by_size: bool) -> None:
+    if self._timer is not None:
+      self._timer.cancel()
+      self._timer = None
+    batch, self._pending = self._pending[:self.max_batch_size], self._pending[self.max_batch_size:]
+    if self._pending:
+      self._timer = asyncio.get_running_loop().call_later(self.max_wait_ms / 1000, self._flush, False)
+    if not batch:
+      return
+    task = asyncio.create_task(self._run_batch(batch, by_size))
+    self._tasks.add(task)
+    task.add_done_callback(self._tasks.discard)
+
+  async def _run_batch(self, batch: list[_Pending], by_size: bool) -> None:
+    started = time.perf_counter()
+    queue_delays = [(started - item.enqueued_at) * 1000 for item in batch]
+    sources = [item.source for item in batch]
+    try:
+      results = await self.detector.apredict_batch(sources)
+    except Exception as e:
+      # The call as a whole failed, so no image has a result yet
+      self.metrics.failed_batches += 1
+      if len(batch) == 1:
+        self._resolve(batch[0].future, exception=e)
+        return
+      # Retry one by one so a single bad image does not fail its neighbours
+      logger.warning('Batched inference failed, retrying individually: %s', e, exc_info=True)
+      await asyncio.gather(*(self._run_single(item) for item in batch))
+      return
+    inference_seconds = time.perf_counter() - started
+    self.metrics.record(len(batch), queue_delays, inference_seconds * 1000, by_size)
+    STAGE_SECONDS.labels('inference').observe(inference_seconds)
+    for delay_ms in queue_delays:
+      STAGE_SECONDS.labels('batch_wait').observe(delay_ms / 1000)
+    for item, predictions in zip(batch, results):
+      if isinstance(predictions, BaseException):
+        self.metrics.failed_items += 1
+        self._resolve(item.future, exception=predictions)
+      else:
+        self._resolve(item.future, result=predictions)
+
+  async def _run_single(self, item: _Pending) -> None:
+    try:
+      self._resolve(item.future, result=await self.detector.apredict(item.source))
+    except Exception as e:
+      self._resolve(item.future, exception=e)
+
+  def _resolve(self, future: asyncio.Future, result: list[BoundingBox] | None = None, exception: BaseException | None = None) -> None:
+    if future.done():
+      return
+    if exception is not None:
+      future.set_exception(exception)
+    else:
+      future.set_result(result)
+
+_schedulers: 'WeakKeyDictionary[BaseDetector, BatchScheduler]' = WeakKeyDictionary()
+
+def get_batch_scheduler(detector: BaseDetector) -> BatchScheduler:
+  if detector not in _schedulers:
+    _schedulers[detector] = BatchScheduler(detector)
+  return _schedulers[detector]
@@ -0,0 +1,63 @@
+import asyncio
+import time
+from typing import Any
+
+from sqlalchemy import text
+from sqlmodel import func, select
+
+from app.core.config import settings
+from app.services.base_service import BaseService
+
+class CountCache(BaseService):
+  # Totals for list endpoints, refreshed at most once per window instead
+  # of running COUNT(*) on every page request. On Postgres, large tables
+  # use the planner's row estimate rather than a full scan.
+  def __init__(self, ttl_seconds: float | None = None):
+    self.ttl_seconds = ttl_seconds if ttl_seconds is not None else settings.COUNT_CACHE_TTL_SECONDS
+    self._values: dict[str, tuple[int, float]] = {}
+    self._locks: dict[str, asyncio.Lock] = {}
+
+  async def count(self, key: str, model: Any, *where: Any) -> int:
+    cached = self._values.get(key)
+    if cached and time.monotonic() - cached[1] < self.ttl_seconds:
+      return cached[0]
+    lock = self._locks.setdefault(key, asyncio.Lock())
+    async with lock:
+      # Another request may have refreshed it while we waited
+      cached = self._values.get(key)
+      if cached and time.monotonic() - cached[1] < self.ttl_seconds:
+        return cached[0]
+      value = await self._count(model, where)
+      self._values[key] = (value, time.monotonic())
+      return value
+
+  def adjust(self, key: str, delta: int) -> None:
+    # Keep this worker's figure close between refreshes
+    cached = self._values.get(key)
+    if cached:
+      self._values[key] = (max(0, cached[0] + delta), cached[1])
+
+  def invalidate(self, key: str) -> None:
+    self._values.pop(key, None)
+
+  async def _count(self, model: Any, where: tuple) -> int:
+    async with self.get_async_session() as session:
+      if not where and settings.DB_TYPE == 'postgres':
+        estimate = (await session.exec(
+          text('SELECT reltuples::bigint FROM pg_class WHERE relname = :table'),
+          params={'table': model.__tablename__}
+        )).first()
+        if estimate and estimate[0] >= settings.COUNT_EXACT_THRESHOLD:
+          return int(estimate[0])
+      statement = select(func.count()).select_from(model)
+      if where:
+        statement = statement.where(*where)
+      return (await session.exec(statement)).first() or 0
+
+_count_cache: CountCache | None = None
+
+def get_count_cache() -> CountCache:
+  global _count_cache
+  if _count_cache is None:
+    _count_cache = CountCache()
+  return _count_cache
@@ -0,0 +1,98 @@
+import asyncio
+import os
+
+from app.core.config import settings
+from app.core.executor import run_image, run_io
+from app.core.storage import get_crop_storage, get_derivative_storage
+from app.services.image_processing import CROP_EXTENSIONS, encode_thumbnail
+
+DERIVATIVE_MEDIA_TYPES = {'WEBP': 'image/webp', 'JPEG': 'image/jpeg'}
+
+class DerivativeService:
+  # Resized copies of crops, written to their own store so the originals
+  # stay untouched. Concurrent requests for a missing variant share one encode.
+  def __init__(self):
+    self.crops = get_crop_storage()
+    self.derivatives = get_derivative_storage()
+    self.sizes = settings.DERIVATIVE_SIZES
+    self.image_format = settings.DERIVATIVE_FORMAT
+    self.media_type = DERIVATIVE_MEDIA_TYPES[self.image_format]
+    self._inflight: dict[str, asyncio.Future] = {}
+    self.hits = 0
+    self.generated = 0
+    self.shared = 0
+
+  def key_for(self, crop_key: str, variant: str) -> str:
+    stem = os.path.splitext(crop_key.rsplit('/', 1)[-1])[0]
+    return self.derivatives.key_for(f'{stem}_{variant}{CROP_EXTENSIONS[self.image_format]}')
+
+  def keys_for(self, crop_key: str) -> list[str]:
+    return [self.key_for(crop_key, variant) for variant in self.sizes]
+
+  async def get(self, crop_key: str, variant: str) -> str | None:
+    # Returns the derivative's key, or None when the crop does not exist
+    key = self.key_for(crop_key, variant)
+    if await run_io(self.derivatives.exists, key):
+      self.hits += 1
+      return key
+    future = self._inflight.get(key)
+    if future is None:
+      future = asyncio.ensure_future(self._generate(crop_key, variant, key))
+      self._inflight[key] = future
+      future.add_done_callback(lambda _: self._inflight.pop(key, None))
+    else:
+      self.shared += 1
+    # Shielded so one cancelled request does not abort the encode for the rest
+    return await asyncio.shield(future)
+
+  async def generate_all(self, crop_key: str) -> None:
+    await asyncio.gather(*(self.get(crop_key, variant) for variant in self.sizes))
+
+  def delete_for(self, crop_keys: list[str]) -> None:
+    keys = [key for crop_key in crop_keys for key in self.keys_for(crop_key)]
+    if keys:
+      self.derivatives.delete_many(keys)
+
+  def snapshot(self) -> dict:
+    return {
+      'sizes': self.sizes,
+      'format': self.image_format,
+      'hits': self.hits,
+      'generated': self.generated,
+      'shared': self.shared,
+      'inflight': len(self._inflight),
+    }
+
+  async def _generate(self, crop_key: str, variant: str, key: str) -> str | None:
+    source = self.crops.local_path(crop_key)
+    if source is not None:
+      if not await run_io(os.path.exists, source):
+        return None
+    else:
+      if not await run_io(self.crops.exists, crop_key):
+        return None
+      source = await run_io(self.crops.read, crop_key)
+    data = await run_image(encode_thumbnail, source, self.sizes[variant], self.image_format)
+    await run_io(self.derivatives.write, key, data)
+    self.generated += 1
+    return key
+
+def derivative_url(image_url: str, variant: str | None = None) -> str | None:
+  # Derivatives are always served through the API, whatever the crop store;
+  # without a variant the smallest configured size is used
+  sizes = settings.DERIVATIVE_SIZES
+  if variant is None:
+    if not sizes:
+      return None
+    variant = min(sizes, key=sizes.get)
+  filename = image_url.rsplit('/', 1)[-1]
+  base_url = settings.BASE_URL or "http://localhost:8000"
+  return f"{base_url}{settings.API_STR}/image/cropped/{filename}?size={variant}"
+
+_derivative_service: DerivativeService | None = None
+
+def get_derivative_service() -> DerivativeService:
+  global _derivative_service
+  if _derivative_service is None:
+    _derivative_service = DerivativeService()
+  return _derivative_service
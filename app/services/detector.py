@@ -0,0 +1,211 @@
+import asyncio
+import hashlib
+import io
+import os
+from functools import lru_cache
+from typing import Any
+
+import httpx
+from fastapi import HTTPException, status
+from PIL import Image
+
+from app.core.config import settings
+from app.core.executor import run_io
+from app.core.http import get_http_client
+from app.models.prediction import BoundingBox
+
+# Detectors take a local file path, the raw bytes of a stored object, or an
+# already decoded image
+ImageSource = str | bytes | Image.Image
+
+class BaseDetector:
+  name: str = 'base'
+  # Whether predict() can use a decoded image instead of reading the file
+  accepts_images: bool = False
+
+  @property
+  def model_version(self) -> str:
+    # Part of the prediction cache key; must change whenever the model does
+    return self.name
+
+  def predict(self, source: ImageSource) -> list[BoundingBox]:
+    raise NotImplementedError
+
+  def predict_batch(self, sources: list[ImageSource]) -> list[list[BoundingBox]]:
+    return [self.predict(source) for source in sources]
+
+  # Async entry points used by the batch scheduler; blocking backends run
+  # on the I/O pool, network backends override these
+  async def apredict(self, source: ImageSource) -> list[BoundingBox]:
+    return await run_io(self.predict, source)
+
+  async def apredict_batch(self, sources: list[ImageSource]) -> list[list[BoundingBox] | Exception]:
+    # One result per source; an item that failed on its own is returned as
+    # its exception, and an exception raised here fails the whole call
+    return await run_io(self.predict_batch, sources)
+
+  def _read_image(self, image_path: str | bytes) -> bytes:
+    if isinstance(image_path, bytes):
+      return image_path
+    if not os.path.exists(image_path):
+      raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Image file not found')
+    with open(image_path, 'rb') as img_file:
+      return img_file.read()
+
+class RoboflowDetector(BaseDetector):
+  name = 'roboflow'
+
+  def __init__(self, model_url: str | None = None, api_key: str | None = None):
+    model_url = model_url or settings.ROBOFLOW_MODEL_URL
+    api_key = api_key or settings.ROBOFLOW_API_KEY
+    self.model_url = model_url
+    self.api_url = f'{model_url}?api_key={api_key}'
+
+  @property
+  def model_version(self) -> str:
+    return f'{self.name}:{self.model_url}'
+
+  def predict(self, image_path: ImageSource) -> list[BoundingBox]:
+    # Blocking path for scripts; the API goes through apredict
+    response = httpx.post(
+      self.api_url,
+      files={'file': self._read_image(image_path)},
+      timeout=settings.HTTP_TIMEOUT_SECONDS
+    )
+    return self._handle_response(response)
+
+  async def apredict(self, image_path: ImageSource) -> list[BoundingBox]:
+    # Send the stored file as multipart instead of a base64 copy of it
+    content = await run_io(self._read_image, image_path)
+    response = await get_http_client().post(self.api_url, files={'file': content})
+    return self._handle_response(response)
+
+  async def apredict_batch(self, image_paths: list[ImageSource]) -> list[list[BoundingBox] | Exception]:
+    # The hosted API has no batch call; fan out over the pooled client.
+    # Each request already retried on its own, so a failure stays with its
+    # image instead of failing (and re-sending) the rest of the batch
+    return await asyncio.gather(*(self.apredict(image_path) for image_path in image_paths), return_exceptions=True)
+
+  def _handle_response(self, response: httpx.Response) -> list[BoundingBox]:
+    if response.status_code != 200:
+      raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f'Roboflow API error: {response.text}')
+    return self._parse_response(response.json())
+
+  def _parse_response(self, data: dict) -> list[BoundingBox]:
+    return [
+      BoundingBox(
+        x=pred['x'],
+        y=pred['y'],
+        width=pred['width'],
+        height=pred['height'],
+        confidence=pred['confidence'],
+        class_name=pred['class']
+      ) for pred in data['predictions']
+    ]
+
+@lru_cache(maxsize=None)
+def load_yolo_model(weights_path: str) -> Any:
+  # Imported lazily so the roboflow backend does not pay for torch at startup
+  from ultralytics import YOLO
+  return YOLO(weights_path)
+
+@lru_cache(maxsize=16)
+def weights_fingerprint(path: str, mtime_ns: int, size: int) -> str:
+  # Hashed once per file version; mtime and size are part of the cache key,
+  # so weights swapped in place under the same name get a new fingerprint
+  digest = hashlib.sha256()
+  with open(path, 'rb') as weights_file:
+    while chunk := weights_file.read(1024 * 1024):
+      digest.update(chunk)
+  return digest.hexdigest()[:16]
+
+class LocalDetector(BaseDetector):
+  name = 'local'
+  accepts_images = True
+
+  def __init__(
+    self,
+    weights_path: str | None = None,
+    model: Any = None,
+    confidence: float | None = None,
+    image_size: int | None = None,
+    device: str | None = None,
+  ):
+    self.weights_path = weights_path or settings.YOLO_WEIGHTS_PATH
+    self.confidence = confidence if confidence is not None else settings.YOLO_CONFIDENCE
+    self.image_size = image_size or settings.YOLO_IMAGE_SIZE
+    self.device = device or settings.YOLO_DEVICE
+    # A stand-in with the same `predict` signature can be injected for offline use
+    self._model = model
+
+  @property
+  def model_version(self) -> str:
+    version = f'{self.name}:{os.path.basename(self.weights_path)}'
+    try:
+      stat = os.stat(self.weights_path)
+    except OSError:
+      # Injected stand-ins may not have a weights file
+      return version
+    return f'{version}:{weights_fingerprint(self.weights_path, stat.st_mtime_ns, stat.st_size)}'
+
+  @property
+  def model(self) -> Any:
+    if self._model is None:
+      self._model = load_yolo_model(self.weights_path)
+    return self._model
+
+  def predict(self, source: ImageSource) -> list[BoundingBox]:
+    return self.predict_batch([source])[0]
+
+  def predict_batch(self, sources: list[ImageSource]) -> list[list[BoundingBox]]:
+    for source in sources:
+      if isinstance(source, str) and not os.path.exists(source):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Image file not found')
+    # ultralytics takes paths and decoded images but not encoded bytes
+    sources = [Image.open(io.BytesIO(source)) if isinstance(source, bytes) else source for source in sources]
+    results = self.model.predict(
+      sources,
+      conf=self.confidence,
+      imgsz=self.image_size,
+      device=self.device,
+      verbose=False
+    )
+    return [self._parse_result(result) for result in results]
+
+  def _parse_result(self, result: Any) -> list[BoundingBox]:
+    names = result.names
+    boxes = result.boxes
+    xywh = self._to_list(boxes.xywh)
+    confs = self._to_list(boxes.conf)
+    classes = self._to_list(boxes.cls)
+    return [
+      BoundingBox(
+        x=float(x),
+        y=float(y),
+        width=float(w),
+        height=float(h),
+        confidence=float(conf),
+        class_name=names[int(cls)]
+      ) for (x, y, w, h), conf, cls in zip(xywh, confs, classes)
+    ]
+
+  def _to_list(self, value: Any) -> list:
+    # ultralytics returns tensors; stand-ins may return plain lists
+    if hasattr(value, 'tolist'):
+      return value.tolist()
+    return list(value)
+
+DETECTOR_BACKENDS: dict[str, type[BaseDetector]] = {
+  RoboflowDetector.name: RoboflowDetector,
+  LocalDetector.name: LocalDetector,
+}
+
+def get_detector(backend: str | None = None) -> BaseDetector:
+  return _get_detector(backend or settings.DETECTOR_BACKEND)
+
+@lru_cache(maxsize=None)
+def _get_detector(backend: str) -> BaseDetector:
+  # One shared instance per worker so batching sees every caller
+  if backend not in DETECTOR_BACKENDS:
+    raise ValueError(f'Unknown detector backend: {backend}')
+  return DETECTOR_BACKENDS[backend]()
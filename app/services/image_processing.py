@@ -0,0 +1,137 @@
+import io
+import logging
+import os
+from typing import BinaryIO
+
+from PIL import Image
+
+from app.core.config import settings
+
+IMAGE_SIGNATURES: list[tuple[bytes, str, str]] = [
+  (b'\xff\xd8\xff', 'image/jpeg', '.jpg'),
+  (b'\x89PNG\r\n\x1a\n', 'image/png', '.png'),
+  (b'GIF87a', 'image/gif', '.gif'),
+  (b'GIF89a', 'image/gif', '.gif'),
+  (b'BM', 'image/bmp', '.bmp'),
+  (b'II*\x00', 'image/tiff', '.tiff'),
+  (b'MM\x00*', 'image/tiff', '.tiff'),
+]
+
+logger = logging.getLogger(__name__)
+
+CROP_EXTENSIONS = {'JPEG': '.jpeg', 'WEBP': '.webp'}
+
+def crop_filename(owner: str, slot: int) -> str:
+  # <frame>_violation_<position of the driver among the frame's drivers>
+  return f'{owner}_violation_{slot}{CROP_EXTENSIONS[settings.CROP_FORMAT]}'
+
+def parse_crop_name(name: str) -> tuple[str, int] | None:
+  # (frame, driver slot) from a crop file name, storage key or URL
+  stem = os.path.splitext(name.split('?', 1)[0].rsplit('/', 1)[-1])[0]
+  owner, marker, slot = stem.rpartition('_violation_')
+  if not marker or not slot.isdigit():
+    return None
+  return owner, int(slot)
+
+def sniff_image_type(header: bytes) -> tuple[str, str] | None:
+  if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+    return 'image/webp', '.webp'
+  for signature, content_type, extension in IMAGE_SIGNATURES:
+    if header.startswith(signature):
+      return content_type, extension
+  return None
+
+class DecodedImage:
+  # An image decoded once and shared by inference and every crop.
+  # `scale` maps decoded pixels back to original pixels when draft mode
+  # decoded a JPEG at reduced resolution.
+  def __init__(self, image: Image.Image, original_size: tuple[int, int]):
+    self.image = image
+    self.original_size = original_size
+    self.scale = original_size[0] / image.size[0] if image.size[0] else 1.0
+
+  def to_decoded(self, bbox: tuple[float, float, float, float]) -> tuple[float, float, float, float]:
+    return tuple(value / self.scale for value in bbox)
+
+def _open_source(source: str | bytes) -> str | BinaryIO:
+  # A local file path, or the raw bytes of an object from remote storage
+  return io.BytesIO(source) if isinstance(source, bytes) else source
+
+def decode_image(source: str | bytes, target_size: int | None = None) -> DecodedImage:
+  target_size = target_size if target_size is not None else settings.IMAGE_DECODE_TARGET_SIZE
+  with Image.open(_open_source(source)) as img:
+    original_size = img.size
+    longest = max(original_size)
+    if target_size and longest > target_size and img.format == 'JPEG':
+      # Let libjpeg scale by 1/2, 1/4 or 1/8 during decode, as far as the
+      # longest side stays at or above target_size
+      ratio = target_size / longest
+      img.draft('RGB', (int(original_size[0] * ratio), int(original_size[1] * ratio)))
+    decoded = img.convert('RGB')
+  return DecodedImage(decoded, original_size)
+
+def crop_box(
+  decoded: DecodedImage,
+  bbox: tuple[float, float, float, float],
+) -> Image.Image | None:
+  x, y, width, height = decoded.to_decoded(bbox)
+  img_width, img_height = decoded.image.size
+
+  # Ensure coordinates are within image bounds
+  left = max(0, int(x))
+  top = max(0, int(y))
+  right = min(img_width, int(x + width))
+  bottom = min(img_height, int(y + height))
+
+  if left >= right or top >= bottom:
+    logger.warning('Invalid crop coordinates: left=%s, top=%s, right=%s, bottom=%s', left, top, right, bottom)
+    return None
+  return decoded.image.crop((left, top, right, bottom))
+
+def encode_crop(
+  decoded: DecodedImage,
+  bbox: tuple[float, float, float, float],
+  image_format: str | None = None,
+  quality: int | None = None,
+) -> bytes | None:
+  cropped = crop_box(decoded, bbox)
+  if cropped is None:
+    return None
+  image_format = image_format or settings.CROP_FORMAT
+  options = {
+    'quality': quality or settings.CROP_QUALITY,
+    'optimize': settings.CROP_OPTIMIZE,
+  }
+  if image_format == 'JPEG':
+    options['progressive'] = settings.CROP_PROGRESSIVE
+  elif image_format == 'WEBP':
+    options['method'] = settings.CROP_WEBP_METHOD
+  buffer = io.BytesIO()
+  cropped.save(buffer, format=image_format, **options)
+  return buffer.getvalue()
+
+def read_image_size(source: str | bytes) -> tuple[int, int]:
+  # Only the header is parsed; pixel data is not decoded
+  with Image.open(_open_source(source)) as img:
+    return img.size
+
+def encode_thumbnail(
+  source: str | bytes,
+  max_side: int,
+  image_format: str | None = None,
+  quality: int | None = None,
+) -> bytes:
+  image_format = image_format or settings.DERIVATIVE_FORMAT
+  with Image.open(_open_source(source)) as img:
+    # JPEG sources decode at a reduced scale when that is still large enough
+    img.draft('RGB', (max_side, max_side))
+    img = img.convert('RGB')
+    img.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+  options = {'quality': quality or settings.DERIVATIVE_QUALITY}
+  if image_format == 'WEBP':
+    options['method'] = settings.CROP_WEBP_METHOD
+  elif image_format == 'JPEG':
+    options['optimize'] = True
+  buffer = io.BytesIO()
+  img.save(buffer, format=image_format, **options)
+  return buffer.getvalue()
@@ -1,105 +1,333 @@
 from uuid import UUID, uuid4
+from typing import Any, AsyncIterator, BinaryIO, NamedTuple
 import aiofiles
+import asyncio
+import hashlib
 import os
+import tarfile
+import zipfile
 from fastapi import UploadFile, HTTPException, status
-from sqlalchemy import func
+from sqlalchemy import delete, exists, tuple_, update
+from sqlalchemy.exc import IntegrityError
 from sqlmodel import select
-from app.models.image import Image, ImageCreate
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.models.detection import Detection
+from app.models.image import Image, ImageBlob, ImageCreate, ImageCrop
+from app.models.violation import Violation
 from app.core.config import settings
-from app.core.exceptions import ImageNotFoundException, InvalidImageFormatException
+from app.core.exceptions import FileTooLargeException, ImageNotFoundException, InvalidImageFormatException
+from app.core.executor import run_io
+from app.core.metrics import UPLOAD_BYTES, UPLOADS, timed
+from app.core.pagination import decode_cursor
+from app.core.storage import get_crop_storage, get_image_storage
+from app.services.derivative_service import get_derivative_service
 from app.services.base_service import BaseService
+from app.services.count_cache import get_count_cache
+from app.services.image_processing import sniff_image_type
+from app.services.job_queue import get_job_queue
+from app.services.prediction_cache import get_prediction_cache
 from app.services.prediction_service import PredictionService
+from app.services.violation_rollup import apply_rollups, count_rollups
+
+class SavedFile(NamedTuple):
+  filepath: str
+  filename: str
+  content_type: str
+  size: int
+  content_hash: str
+
+class PurgedImages(NamedTuple):
+  images: int
+  violations: int
+  # Storage keys and sizes of frames no other image references any more
+  file_keys: list[str]
+  bytes_freed: int
+  crop_keys: list[str]
+  content_hashes: list[str]
+
+class ArchiveMember:
+  # Async read adapter so archive entries go through the same streaming path as uploads
+  def __init__(self, filename: str, fileobj: BinaryIO):
+    self.filename = filename
+    self.fileobj = fileobj
+
+  async def read(self, size: int = -1) -> bytes:
+    return await run_io(self.fileobj.read, size)
 
 class ImageService(BaseService):
-  def __init__(self, upload_dir: str = 'images'):
-    self.upload_dir = upload_dir
+  def __init__(self, upload_dir: str | None = None):
+    # Uploads are staged here before they are moved into storage
+    self.upload_dir = upload_dir or settings.UPLOAD_DIR
+    self.images = get_image_storage()
+    self.crops = get_crop_storage()
     self.prediction_service = PredictionService()
 
   async def upload(self, file: UploadFile) -> dict:
     try:
-      await self._validate_image(file)
       await self._ensure_upload_dir()
       
-      file_path, unique_filename, file_id = self._generate_file_path(file)
-      await self._save_file(file, file_path)
-      
-      image_data = ImageCreate(
-        id=UUID(file_id),
-        filename=unique_filename,
-        filepath=file_path,
-        content_type=file.content_type,
-        size=os.path.getsize(file_path)
-      )
+      image_data = await self._ingest_file(file)
       db_image = await self._save_to_database(image_data)
+      get_count_cache().adjust('image', 1)
       
-      # Automatically run prediction after upload
-      try:
-        print(f"Running prediction for image: {file_id}")
-        await self.prediction_service.predict_image(db_image.id)
-        print(f"Prediction completed for image: {file_id}")
-      except Exception as e:
-        print(f"Error in prediction: {str(e)}")
-        # Don't raise the error - we still want to return upload success
+      # Prediction runs in the background job queue so upload latency
+      # does not depend on the detector
+      job = await get_job_queue().enqueue(db_image.id)
+      UPLOADS.labels('accepted').inc()
       
       return {
-        'status': 'success',
-        'id': file_id,
-        'filename': unique_filename,
-        'filepath': file_path,
-        'message': 'Image uploaded and processed successfully',
+        'status': 'accepted',
+        'id': str(db_image.id),
+        'filename': image_data.filename,
+        'filepath': image_data.filepath,
+        'job_id': str(job.id),
+        'message': 'Image uploaded, prediction queued',
       }
         
     except HTTPException as he:
+      UPLOADS.labels('failed').inc()
       raise he
     except Exception as e:
+      UPLOADS.labels('failed').inc()
       raise HTTPException(
         status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
         detail=f'An error occurred while uploading the image: {str(e)}'
       )
 
 
+  async def upload_batch(self, files: list[UploadFile]) -> dict:
+    await self._ensure_upload_dir()
+    items: list[dict] = []
+    semaphore = asyncio.Semaphore(settings.UPLOAD_BATCH_CONCURRENCY)
+
+    async def _ingest(source: UploadFile | ArchiveMember) -> None:
+      item = {'filename': source.filename, 'status': 'failed'}
+      items.append(item)
+      if len(items) > settings.UPLOAD_BATCH_MAX_FILES:
+        item['error'] = f'Batch exceeds {settings.UPLOAD_BATCH_MAX_FILES} files'
+        return
+      try:
+        async with semaphore:
+          item['image'] = await self._ingest_file(source)
+      except HTTPException as he:
+        item['error'] = he.detail
+      except Exception as e:
+        item['error'] = str(e)
+
+    async def _ingest_upload(file: UploadFile) -> None:
+      if await self._is_archive(file):
+        try:
+          async for member in self._iter_archive(file):
+            await _ingest(member)
+        except Exception as e:
+          items.append({'filename': file.filename, 'status': 'failed', 'error': f'Invalid archive: {str(e)}'})
+      else:
+        await _ingest(file)
+
+    await asyncio.gather(*(_ingest_upload(file) for file in files))
+
+    accepted = [item for item in items if 'image' in item]
+    if accepted:
+      try:
+        db_images = await self._save_many_to_database([item['image'] for item in accepted])
+        get_count_cache().adjust('image', len(db_images))
+        jobs = await get_job_queue().enqueue_many([image.id for image in db_images])
+        for item, job in zip(accepted, jobs):
+          item.update(status='accepted', id=str(job.image_id), job_id=str(job.id))
+      except Exception as e:
+        for item in accepted:
+          item['error'] = str(e)
+
+    for item in items:
+      image = item.pop('image', None)
+      if image is not None and item['status'] == 'accepted':
+        item['filepath'] = image.filepath
+
+    succeeded = sum(1 for item in items if item['status'] == 'accepted')
+    UPLOADS.labels('accepted').inc(succeeded)
+    UPLOADS.labels('failed').inc(len(items) - succeeded)
+    return {
+      'status': 'accepted' if succeeded else 'failed',
+      'total': len(items),
+      'accepted': succeeded,
+      'failed': len(items) - succeeded,
+      'items': items,
+    }
+
   async def get_image(self, image_id: UUID) -> Image:
-    with self.get_session() as session:
-      image = session.get(Image, image_id)
-      if not image:
-        raise ImageNotFoundException()
-      return image
+    async with self.get_async_session() as session:
+      image = await session.get(Image, image_id)
+    if not image:
+      raise ImageNotFoundException()
+    return image
 
   async def count_images(self) -> int:
-    with self.get_session() as session:
-      statement = select(func.count(Image.id))
-      result = session.exec(statement).first()
-      return result or 0
-
-  async def list_images(self, skip: int = 0, limit: int = 100) -> list[Image]:
-    with self.get_session() as session:
-      statement = select(Image).offset(skip).limit(limit)
-      images = session.exec(statement).all()
-      return images
-
-  async def list_violations(self, skip: int = 0, limit: int = 100) -> list[Image]:
-    with self.get_session() as session:
-      statement = select(Image).where(Image.predictions.isnot(None)).offset(skip).limit(limit)
-      images = session.exec(statement).all()
-      return images
-
-  async def count_violations(self) -> int:
-    with self.get_session() as session:
-      result = session.exec(select(func.count()).select_from(Image).where(Image.predictions.isnot(None))).first()
-      return result or 0
+    return await get_count_cache().count('image', Image)
+
+  async def list_images(self, skip: int = 0, limit: int = 100, cursor: str | None = None) -> list[Image]:
+    after = decode_cursor(cursor, UUID) if cursor else None
+    statement = select(Image).order_by(Image.created_at.desc(), Image.id.desc())
+    if after:
+      # Keyset: continue strictly after the last (created_at, id) seen
+      statement = statement.where(tuple_(Image.created_at, Image.id) < after)
+    else:
+      statement = statement.offset(skip)
+    async with self.get_async_session() as session:
+      return (await session.exec(statement.limit(limit))).all()
+
+  async def list_violations(self, skip: int = 0, limit: int = 100, min_confidence: float = 0.0) -> list[Image]:
+    statement = (
+      select(Image)
+      .where(self._has_violation(min_confidence))
+      .order_by(Image.created_at.desc(), Image.id.desc())
+      .offset(skip)
+      .limit(limit)
+    )
+    async with self.get_async_session() as session:
+      return (await session.exec(statement)).all()
+
+  async def count_violations(self, min_confidence: float = 0.0) -> int:
+    return await get_count_cache().count(f'image_violation:{min_confidence}', Image, self._has_violation(min_confidence))
+
+  def _has_violation(self, min_confidence: float) -> Any:
+    # Images with an unhelmeted driver at or above min_confidence
+    return exists().where(
+      Detection.image_id == Image.id,
+      Detection.class_name == 'driver',
+      Detection.violation_id.isnot(None),
+      Detection.confidence >= min_confidence
+    )
 
   async def delete_image(self, image_id: UUID) -> None:
-    with self.get_session() as session:
-      image = session.get(Image, image_id)
+    async with self.get_async_session() as session:
+      image = await session.get(Image, image_id)
       if not image: raise ImageNotFoundException()
-      if os.path.exists(image.filepath): os.remove(image.filepath)
-      base_name = f"{image_id}_violation_"
-      cropped_dir = settings.CROPPED_IMAGES_DIR
-      for file in os.listdir(cropped_dir):
-        if file.startswith(base_name):
-          os.remove(os.path.join(cropped_dir, file))
-      session.delete(image)
-      session.commit()
+      purged = await self._purge(session, [image])
+      await session.commit()
+    await self._finish_purge(purged)
+
+  async def delete_images(self, image_ids: list[UUID]) -> PurgedImages:
+    # Batch form of delete_image; ids that no longer exist are skipped
+    async with self.get_async_session() as session:
+      images = (await session.exec(select(Image).where(Image.id.in_(image_ids)))).all()
+      purged = await self._purge(session, images)
+      await session.commit()
+    await self._finish_purge(purged)
+    return purged
+
+  async def _purge(self, session: AsyncSession, images: list[Image]) -> PurgedImages:
+    # Deletes the rows in the caller's transaction and returns what to
+    # remove from storage once it commits
+    file_keys, crop_keys, content_hashes = [], [], []
+    bytes_freed = 0
+    for image in images:
+      if await self._release_blob(session, image):
+        file_keys.append(image.filepath)
+        bytes_freed += image.size
+        crop_keys.extend(await self._release_crops(session, image))
+        if image.content_hash:
+          content_hashes.append(image.content_hash)
+    image_ids = [image.id for image in images]
+
+    # The image's violations point at its crops, so they go with it
+    violation_ids = select(Detection.violation_id).where(Detection.image_id.in_(image_ids), Detection.violation_id.isnot(None))
+    violations = (await session.exec(select(Violation).where(Violation.id.in_(violation_ids)))).all() if images else []
+    await session.exec(delete(Detection).where(Detection.image_id.in_(image_ids)))
+    if violations:
+      await apply_rollups(session, count_rollups(violations, sign=-1))
+      await session.exec(delete(Violation).where(Violation.id.in_([violation.id for violation in violations])))
+    await session.exec(delete(Image).where(Image.id.in_(image_ids)))
+    return PurgedImages(len(images), len(violations), file_keys, bytes_freed, crop_keys, content_hashes)
+
+  async def _finish_purge(self, purged: PurgedImages) -> None:
+    get_count_cache().adjust('image', -purged.images)
+    get_count_cache().adjust('violation', -purged.violations)
+
+    # Blob files and their crops go once the last image referencing them is deleted
+    if purged.file_keys or purged.crop_keys:
+      await run_io(self._remove_image_files, purged.file_keys, purged.crop_keys)
+    for content_hash in purged.content_hashes:
+      await get_prediction_cache().invalidate(content_hash)
+
+  async def _release_blob(self, session: AsyncSession, image: Image) -> bool:
+    if not image.content_hash:
+      return True
+    result = (await session.exec(
+      update(ImageBlob)
+      .where(ImageBlob.content_hash == image.content_hash)
+      .values(ref_count=ImageBlob.ref_count - 1)
+      .returning(ImageBlob.ref_count)
+    )).first()
+    if result is None:
+      return True
+    if result[0] > 0:
+      return False
+    await session.exec(delete(ImageBlob).where(ImageBlob.content_hash == image.content_hash))
+    return True
+
+  async def _release_crops(self, session: AsyncSession, image: Image) -> list[str]:
+    # Crops are looked up by their owning frame instead of scanning storage
+    owner = image.content_hash or os.path.splitext(os.path.basename(image.filepath))[0]
+    keys = (await session.exec(select(ImageCrop.key).where(ImageCrop.content_hash == owner))).all()
+    if keys:
+      await session.exec(delete(ImageCrop).where(ImageCrop.content_hash == owner))
+    return list(keys)
+
+  def _remove_image_files(self, keys: list[str], crop_keys: list[str]) -> None:
+    self.images.delete_many(keys)
+    if crop_keys:
+      self.crops.delete_many(crop_keys)
+      get_derivative_service().delete_for(crop_keys)
+
+  async def _acquire_blob(self, session: AsyncSession, image: Image) -> None:
+    # Counter is bumped in SQL so concurrent uploads of one frame don't lose updates
+    result = await session.exec(
+      update(ImageBlob)
+      .where(ImageBlob.content_hash == image.content_hash)
+      .values(ref_count=ImageBlob.ref_count + 1)
+    )
+    if result.rowcount == 0:
+      session.add(ImageBlob(
+        content_hash=image.content_hash,
+        filepath=image.filepath,
+        content_type=image.content_type,
+        size=image.size
+      ))
+
+  @timed('save_image_record')
+  async def _save_many_to_database(self, images_data: list[ImageCreate]) -> list[Image]:
+    async def _save() -> list[Image]:
+      async with self.get_async_session() as session:
+        db_images = [Image.model_validate(image_data) for image_data in images_data]
+        session.add_all(db_images)
+        for db_image in db_images:
+          await self._acquire_blob(session, db_image)
+          # Make a blob added for this batch visible to the next duplicate's UPDATE
+          await session.flush()
+        await session.commit()
+        for db_image in db_images:
+          await session.refresh(db_image)
+        return db_images
+
+    try:
+      try:
+        return await _save()
+      except IntegrityError:
+        return await _save()
+    except Exception as e:
+      for image_data in images_data:
+        if not await self._blob_exists(image_data.content_hash):
+          await run_io(self.images.delete, image_data.filepath)
+      raise HTTPException(
+        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        detail=f"Failed to save images to database: {str(e)}"
+      )
+
+  async def _blob_exists(self, content_hash: str | None) -> bool:
+    if not content_hash:
+      return False
+    async with self.get_async_session() as session:
+      return await session.get(ImageBlob, content_hash) is not None
 
   def _create_upload_response(self, db_image: Image, filename: str, filepath: str) -> dict:
     return {
@@ -110,36 +338,115 @@ class ImageService(BaseService):
       'message': 'Image uploaded successfully',
     }
 
-  async def _validate_image(self, file: UploadFile) -> None:
-    if not file.content_type.startswith('image/'):
+  async def _ingest_file(self, file: UploadFile | ArchiveMember) -> ImageCreate:
+    file_id = str(uuid4())
+    saved = await self._save_file(file, file_id)
+    return ImageCreate(
+      id=UUID(file_id),
+      filename=saved.filename,
+      filepath=saved.filepath,
+      content_type=saved.content_type,
+      size=saved.size,
+      content_hash=saved.content_hash
+    )
+
+  async def _is_archive(self, file: UploadFile) -> bool:
+    header = await file.read(512)
+    await file.seek(0)
+    return (
+      header.startswith(b'PK\x03\x04')
+      or header.startswith(b'\x1f\x8b')
+      or header[257:262] == b'ustar'
+    )
+
+  async def _iter_archive(self, file: UploadFile) -> AsyncIterator[ArchiveMember]:
+    header = await file.read(4)
+    await file.seek(0)
+    if header == b'PK\x03\x04':
+      archive = await run_io(zipfile.ZipFile, file.file)
+      with archive:
+        for info in archive.infolist():
+          if info.is_dir():
+            continue
+          with archive.open(info) as member:
+            yield ArchiveMember(info.filename, member)
+      return
+
+    # Stream mode reads the tar sequentially without seeking
+    archive = await run_io(tarfile.open, fileobj=file.file, mode='r|*')
+    with archive:
+      while (info := await run_io(archive.next)) is not None:
+        if not info.isfile():
+          continue
+        member = archive.extractfile(info)
+        yield ArchiveMember(info.name, member)
+
+  def _validate_image(self, header: bytes) -> tuple[str, str]:
+    # Trust the magic bytes, not the client-supplied content type
+    image_type = sniff_image_type(header)
+    if not image_type:
       raise InvalidImageFormatException()
+    return image_type
 
   async def _ensure_upload_dir(self) -> None:
-    os.makedirs(self.upload_dir, exist_ok=True)
+    await run_io(os.makedirs, self.upload_dir, exist_ok=True)
 
-  def _generate_file_path(self, file: UploadFile) -> tuple[str, str]:
-    original_extension = os.path.splitext(file.filename)[1]
-    file_id = str(uuid4())
-    unique_filename = f"{file_id}{original_extension}"
-    file_path = os.path.join(self.upload_dir, unique_filename)
-    return file_path, unique_filename, file_id
+  def _generate_file_path(self, content_hash: str, extension: str) -> tuple[str, str]:
+    # Returns the storage key and the file name it ends in
+    unique_filename = f"{content_hash}{extension}"
+    return self.images.key_for(unique_filename), unique_filename
 
-  async def _save_file(self, file: UploadFile, file_path: str) -> None:
-    async with aiofiles.open(file_path, 'wb') as out_file:
-      content = await file.read()
-      await out_file.write(content)
+  @timed('save_file')
+  async def _save_file(self, file: UploadFile | ArchiveMember, file_id: str) -> SavedFile:
+    # Stream to a partial file in chunks so the upload is never held in memory
+    partial_path = os.path.join(self.upload_dir, f"{file_id}.part")
+    digest = hashlib.sha256()
+    size = 0
+    image_type = None
+    try:
+      async with aiofiles.open(partial_path, 'wb') as out_file:
+        while chunk := await file.read(settings.UPLOAD_CHUNK_SIZE):
+          if image_type is None:
+            image_type = self._validate_image(chunk)
+          size += len(chunk)
+          if size > settings.UPLOAD_MAX_SIZE_BYTES:
+            raise FileTooLargeException(settings.UPLOAD_MAX_SIZE_BYTES)
+          digest.update(chunk)
+          await out_file.write(chunk)
+      if image_type is None:
+        raise InvalidImageFormatException()
+      content_type, extension = image_type
+      # Content-addressed name so re-sent frames share one file on disk
+      content_hash = digest.hexdigest()
+      file_path, unique_filename = self._generate_file_path(content_hash, extension)
+      await run_io(self.images.save, file_path, partial_path)
+    except Exception:
+      if await run_io(os.path.exists, partial_path):
+        await run_io(os.remove, partial_path)
+      raise
+    UPLOAD_BYTES.inc(size)
+    return SavedFile(file_path, unique_filename, content_type, size, content_hash)
 
+  @timed('save_image_record')
   async def _save_to_database(self, image_data: ImageCreate) -> Image:
-    try:
-      with self.get_session() as session:
+    async def _save() -> Image:
+      async with self.get_async_session() as session:
         db_image = Image.model_validate(image_data)
         session.add(db_image)
-        session.commit()
-        session.refresh(db_image)
+        await self._acquire_blob(session, db_image)
+        await session.commit()
+        await session.refresh(db_image)
         return db_image
+
+    try:
+      try:
+        return await _save()
+      except IntegrityError:
+        # Another upload of the same content created the blob first
+        return await _save()
     except Exception as e:
-      if os.path.exists(image_data.filepath):
-        os.remove(image_data.filepath)
+      if not await self._blob_exists(image_data.content_hash):
+        await run_io(self.images.delete, image_data.filepath)
       raise HTTPException(
         status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
         detail=f"Failed to save image to database: {str(e)}"
@@ -0,0 +1,268 @@
+import asyncio
+import logging
+import random
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable
+from uuid import UUID
+
+from sqlalchemy import or_, update
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.config import settings
+from app.core.exceptions import ImageNotFoundException
+from app.core.metrics import JOBS
+from app.models.image import Image
+from app.models.job import JobStatus, PredictionJob
+from app.services.base_service import BaseService
+from app.services.prediction_service import PredictionService
+from app.services.prediction_writer import get_prediction_writer
+
+logger = logging.getLogger(__name__)
+
+JobHandler = Callable[[UUID], Awaitable[object]]
+
+class JobStore(BaseService):
+  async def save(self, job: PredictionJob) -> None:
+    raise NotImplementedError
+
+  async def save_many(self, jobs: list[PredictionJob]) -> None:
+    for job in jobs:
+      await self.save(job)
+
+  async def claim(self, job: PredictionJob) -> bool:
+    raise NotImplementedError
+
+  async def list_pending(self) -> list[PredictionJob]:
+    raise NotImplementedError
+
+  async def _apply_to_image(self, session: AsyncSession, job: PredictionJob) -> None:
+    image = await session.get(Image, job.image_id)
+    if not image:
+      return
+    image.job_id = job.id
+    image.job_status = job.status
+    image.job_attempts = job.attempts
+    image.job_error = job.last_error
+    session.add(image)
+
+class MemoryJobStore(JobStore):
+  def __init__(self):
+    self.jobs: dict[UUID, PredictionJob] = {}
+
+  async def save(self, job: PredictionJob) -> None:
+    job.updated_at = datetime.utcnow()
+    self.jobs[job.id] = job
+    async with self.get_async_session() as session:
+      await self._apply_to_image(session, job)
+      await session.commit()
+
+  async def claim(self, job: PredictionJob) -> bool:
+    current = self.jobs.get(job.id)
+    if not current or current.status not in JobStatus.PENDING:
+      return False
+    current.status = JobStatus.RUNNING
+    await self.save(current)
+    return True
+
+  async def list_pending(self) -> list[PredictionJob]:
+    return [job for job in self.jobs.values() if job.status in JobStatus.PENDING]
+
+class DatabaseJobStore(JobStore):
+  async def save(self, job: PredictionJob) -> None:
+    job.updated_at = datetime.utcnow()
+    async with self.get_async_session() as session:
+      await session.merge(PredictionJob(**job.model_dump()))
+      await self._apply_to_image(session, job)
+      await session.commit()
+
+  async def save_many(self, jobs: list[PredictionJob]) -> None:
+    now = datetime.utcnow()
+    async with self.get_async_session() as session:
+      for job in jobs:
+        job.updated_at = now
+        await session.merge(PredictionJob(**job.model_dump()))
+        await self._apply_to_image(session, job)
+      await session.commit()
+
+  async def claim(self, job: PredictionJob) -> bool:
+    # Conditional update so only one uvicorn worker picks up a recovered job
+    now = datetime.utcnow()
+    async with self.get_async_session() as session:
+      result = await session.exec(
+        update(PredictionJob)
+        .where(PredictionJob.id == job.id, PredictionJob.status.in_(JobStatus.PENDING))
+        .values(status=JobStatus.RUNNING, updated_at=now)
+      )
+      if result.rowcount != 1:
+        await session.rollback()
+        return False
+      job.status = JobStatus.RUNNING
+      job.updated_at = now
+      await self._apply_to_image(session, job)
+      await session.commit()
+      return True
+
+  async def list_pending(self) -> list[PredictionJob]:
+    stale_before = datetime.utcnow() - timedelta(seconds=settings.JOB_STALE_AFTER_SECONDS)
+    statement = select(PredictionJob).where(or_(
+      PredictionJob.status.in_(JobStatus.PENDING),
+      (PredictionJob.status == JobStatus.RUNNING) & (PredictionJob.updated_at < stale_before)
+    )).order_by(PredictionJob.created_at)
+    async with self.get_async_session() as session:
+      jobs = (await session.exec(statement)).all()
+      for job in jobs:
+        # Jobs left running by a dead worker are handed out again
+        if job.status == JobStatus.RUNNING:
+          job.status = JobStatus.RETRYING
+          session.add(job)
+      await session.commit()
+      return [PredictionJob(**job.model_dump()) for job in jobs]
+
+JOB_STORES: dict[str, type[JobStore]] = {
+  'database': DatabaseJobStore,
+  'memory': MemoryJobStore,
+}
+
+class JobQueue:
+  def __init__(
+    self,
+    handler: JobHandler,
+    store: JobStore | None = None,
+    concurrency: int | None = None,
+    max_attempts: int | None = None,
+    backoff_seconds: float | None = None,
+    backoff_max_seconds: float | None = None,
+  ):
+    self.handler = handler
+    self.store = store or JOB_STORES[settings.JOB_QUEUE_BACKEND]()
+    self.concurrency = concurrency or settings.JOB_WORKER_CONCURRENCY
+    self.max_attempts = max_attempts or settings.JOB_MAX_ATTEMPTS
+    self.backoff_seconds = backoff_seconds if backoff_seconds is not None else settings.JOB_RETRY_BACKOFF_SECONDS
+    self.backoff_max_seconds = backoff_max_seconds if backoff_max_seconds is not None else settings.JOB_RETRY_BACKOFF_MAX_SECONDS
+    self._queue: asyncio.Queue[PredictionJob] | None = None
+    self._workers: list[asyncio.Task] = []
+    self._timers: set[asyncio.TimerHandle] = set()
+
+  @property
+  def running(self) -> bool:
+    return bool(self._workers)
+
+  async def start(self) -> None:
+    if self.running:
+      return
+    self._queue = asyncio.Queue()
+    self._workers = [asyncio.create_task(self._worker(), name=f'prediction-job-{i}') for i in range(self.concurrency)]
+    for job in await self.store.list_pending():
+      self._schedule(job)
+
+  async def stop(self) -> None:
+    for timer in self._timers:
+      timer.cancel()
+    self._timers.clear()
+    for worker in self._workers:
+      worker.cancel()
+    await asyncio.gather(*self._workers, return_exceptions=True)
+    self._workers = []
+    self._queue = None
+
+  def snapshot(self) -> dict:
+    return {
+      'queued': self._queue.qsize() if self._queue is not None else 0,
+      'backing_off': len(self._timers),
+      'workers': len(self._workers),
+    }
+
+  async def join(self) -> None:
+    # Waits for queued jobs and for retries that are still backing off
+    while self._queue is not None:
+      await self._queue.join()
+      if not self._timers:
+        return
+      await asyncio.sleep(0.05)
+
+  async def enqueue(self, image_id: UUID) -> PredictionJob:
+    job = PredictionJob(image_id=image_id, max_attempts=self.max_attempts)
+    await self.store.save(job)
+    self._schedule(job)
+    return job
+
+  async def enqueue_many(self, image_ids: list[UUID]) -> list[PredictionJob]:
+    jobs = [PredictionJob(image_id=image_id, max_attempts=self.max_attempts) for image_id in image_ids]
+    if jobs:
+      await self.store.save_many(jobs)
+    for job in jobs:
+      self._schedule(job)
+    return jobs
+
+  def _schedule(self, job: PredictionJob) -> None:
+    if self._queue is None:
+      # Not started yet; the job is persisted and picked up by start()
+      return
+    delay = (job.next_run_at - datetime.utcnow()).total_seconds()
+    if delay <= 0:
+      self._queue.put_nowait(job)
+      return
+    loop = asyncio.get_running_loop()
+    timer: asyncio.TimerHandle
+
+    def _put() -> None:
+      self._timers.discard(timer)
+      if self._queue is not None:
+        self._queue.put_nowait(job)
+    timer = loop.call_later(delay, _put)
+    self._timers.add(timer)
+
+  def _backoff(self, attempts: int) -> float:
+    delay = min(self.backoff_seconds * 2 ** (attempts - 1), self.backoff_max_seconds)
+    return delay * random.uniform(0.5, 1.0)
+
+  async def _worker(self) -> None:
+    while True:
+      job = await self._queue.get()
+      try:
+        await self._run(job)
+      except Exception as e:
+        logger.exception('Error updating job %s: %s', job.id, e)
+      finally:
+        self._queue.task_done()
+
+  async def _run(self, job: PredictionJob) -> None:
+    if not await self.store.claim(job):
+      return
+    job.attempts += 1
+    try:
+      await self.handler(job.image_id)
+    except ImageNotFoundException:
+      job.status = JobStatus.FAILED
+      job.last_error = 'Image not found'
+      JOBS.labels('failed').inc()
+    except Exception as e:
+      job.last_error = getattr(e, 'detail', None) or str(e)
+      logger.warning(
+        'Prediction job %s failed (attempt %s): %s', job.id, job.attempts, job.last_error,
+        exc_info=True, extra={'job_id': str(job.id), 'image_id': str(job.image_id), 'attempt': job.attempts}
+      )
+      if job.attempts < job.max_attempts:
+        job.status = JobStatus.RETRYING
+        job.next_run_at = datetime.utcnow() + timedelta(seconds=self._backoff(job.attempts))
+        JOBS.labels('retried').inc()
+      else:
+        job.status = JobStatus.FAILED
+        JOBS.labels('failed').inc()
+    else:
+      job.status = JobStatus.COMPLETED
+      job.last_error = None
+      JOBS.labels('completed').inc()
+    await self.store.save(job)
+    if job.status == JobStatus.RETRYING:
+      self._schedule(job)
+
+_job_queue: JobQueue | None = None
+
+def get_job_queue() -> JobQueue:
+  global _job_queue
+  if _job_queue is None:
+    # Workers share one writer so results finishing together commit together
+    _job_queue = JobQueue(PredictionService(writer=get_prediction_writer()).predict_image)
+  return _job_queue
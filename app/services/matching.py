@@ -0,0 +1,62 @@
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+from app.models.prediction import BoundingBox
+
+# Cost assigned to pairs that fail the thresholds; large enough that the
+# assignment solver only picks them when nothing valid is left
+INVALID_COST = 1e6
+
+def boxes_to_array(boxes: list[BoundingBox]) -> np.ndarray:
+  # (N, 4) array of centre x, centre y, width, height
+  if not boxes:
+    return np.empty((0, 4), dtype=np.float64)
+  return np.array([(box.x, box.y, box.width, box.height) for box in boxes], dtype=np.float64)
+
+def pairwise_distance(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+  delta = a[:, None, :2] - b[None, :, :2]
+  return np.sqrt((delta ** 2).sum(axis=-1))
+
+def pairwise_iou(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+  a_min, a_max = a[:, :2] - a[:, 2:] / 2, a[:, :2] + a[:, 2:] / 2
+  b_min, b_max = b[:, :2] - b[:, 2:] / 2, b[:, :2] + b[:, 2:] / 2
+  top_left = np.maximum(a_min[:, None, :], b_min[None, :, :])
+  bottom_right = np.minimum(a_max[:, None, :], b_max[None, :, :])
+  intersection = np.clip(bottom_right - top_left, 0, None).prod(axis=-1)
+  area_a = a[:, 2:].prod(axis=-1)
+  area_b = b[:, 2:].prod(axis=-1)
+  union = area_a[:, None] + area_b[None, :] - intersection
+  return np.divide(intersection, union, out=np.zeros_like(intersection), where=union > 0)
+
+def match_helmets(
+  drivers: np.ndarray,
+  helmets: np.ndarray,
+  image_size: tuple[int, int],
+  max_distance: float,
+  min_iou: float = 0.0,
+  one_to_one: bool = True,
+) -> np.ndarray:
+  # Returns the index of the helmet matched to each driver, or -1.
+  # max_distance is a fraction of the image diagonal so the same setting
+  # works across resolutions. A pair is valid when the centres are within
+  # max_distance or, if min_iou > 0, the boxes overlap by at least min_iou.
+  matches = np.full(len(drivers), -1, dtype=np.int64)
+  if len(drivers) == 0 or len(helmets) == 0:
+    return matches
+
+  diagonal = float(np.hypot(*image_size)) or 1.0
+  distance = pairwise_distance(drivers, helmets) / diagonal
+  iou = pairwise_iou(drivers, helmets)
+  valid = distance <= max_distance
+  if min_iou > 0:
+    valid |= iou >= min_iou
+  cost = np.where(valid, distance - iou, INVALID_COST)
+
+  if one_to_one:
+    rows, cols = linear_sum_assignment(cost)
+  else:
+    rows = np.arange(len(drivers))
+    cols = cost.argmin(axis=1)
+  keep = valid[rows, cols]
+  matches[rows[keep]] = cols[keep]
+  return matches
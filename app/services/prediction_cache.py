@@ -0,0 +1,108 @@
+import json
+from collections import OrderedDict
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import delete
+
+from app.core.config import settings
+from app.core.executor import run_io
+from app.core.storage import get_crop_storage
+from app.models.prediction import BoundingBox, CachedPrediction, PredictionCacheEntry
+from app.services.base_service import BaseService
+
+class PredictionCache(BaseService):
+  def __init__(self, max_size: int | None = None):
+    self.max_size = max_size or settings.PREDICTION_CACHE_SIZE
+    self._entries: OrderedDict[tuple[str, str], CachedPrediction] = OrderedDict()
+    self.memory_hits = 0
+    self.db_hits = 0
+    self.misses = 0
+    self.stale = 0
+
+  async def get(self, content_hash: str, model_version: str) -> CachedPrediction | None:
+    key = (content_hash, model_version)
+    cached = self._entries.get(key)
+    if cached is not None:
+      self._entries.move_to_end(key)
+    else:
+      cached = await self._load(key)
+    if cached is None:
+      self.misses += 1
+      return None
+    # Crops may have been removed with their blob; treat that as a miss
+    if not await run_io(self._crops_exist, cached.cropped_images):
+      self.stale += 1
+      self.misses += 1
+      await self.invalidate(content_hash)
+      return None
+    if key in self._entries:
+      self.memory_hits += 1
+    else:
+      self.db_hits += 1
+      self._remember(key, cached)
+    return cached
+
+  async def set(self, content_hash: str, model_version: str, predictions: list[BoundingBox], cropped_images: list[str]) -> None:
+    cached = CachedPrediction(predictions=predictions, cropped_images=cropped_images)
+    entry = PredictionCacheEntry(
+      content_hash=content_hash,
+      model_version=model_version,
+      predictions=json.dumps([pred.model_dump() for pred in predictions]),
+      cropped_images=json.dumps(cropped_images)
+    )
+
+    try:
+      async with self.get_async_session() as session:
+        await session.merge(entry)
+        await session.commit()
+    except IntegrityError:
+      # A concurrent prediction of the same frame stored an equivalent entry
+      pass
+    self._remember((content_hash, model_version), cached)
+
+  async def invalidate(self, content_hash: str) -> None:
+    for key in [key for key in self._entries if key[0] == content_hash]:
+      del self._entries[key]
+    async with self.get_async_session() as session:
+      await session.exec(delete(PredictionCacheEntry).where(PredictionCacheEntry.content_hash == content_hash))
+      await session.commit()
+
+  def snapshot(self) -> dict:
+    hits = self.memory_hits + self.db_hits
+    lookups = hits + self.misses
+    return {
+      'size': len(self._entries),
+      'max_size': self.max_size,
+      'memory_hits': self.memory_hits,
+      'db_hits': self.db_hits,
+      'misses': self.misses,
+      'stale': self.stale,
+      'hit_ratio': hits / lookups if lookups else 0.0,
+    }
+
+  async def _load(self, key: tuple[str, str]) -> CachedPrediction | None:
+    async with self.get_async_session() as session:
+      entry = await session.get(PredictionCacheEntry, key)
+    if not entry:
+      return None
+    return CachedPrediction(
+      predictions=[BoundingBox(**pred) for pred in json.loads(entry.predictions)],
+      cropped_images=json.loads(entry.cropped_images)
+    )
+
+  def _remember(self, key: tuple[str, str], cached: CachedPrediction) -> None:
+    self._entries[key] = cached
+    self._entries.move_to_end(key)
+    while len(self._entries) > self.max_size:
+      self._entries.popitem(last=False)
+
+  def _crops_exist(self, cropped_images: list[str]) -> bool:
+    crops = get_crop_storage()
+    return all(crops.exists(key) for key in cropped_images)
+
+_prediction_cache: PredictionCache | None = None
+
+def get_prediction_cache() -> PredictionCache:
+  global _prediction_cache
+  if _prediction_cache is None:
+    _prediction_cache = PredictionCache()
+  return _prediction_cache
@@ -1,115 +1,159 @@
-import base64
-import requests
-import json
+import asyncio
+import logging
 import os
 from uuid import UUID
-from PIL import Image
 from fastapi import HTTPException, status
 
 from app.core.config import settings
 from app.core.exceptions import ImageNotFoundException
-from app.models.violation import Violation, ViolationCreate
+from app.core.executor import run_image, run_io
+from app.core.metrics import DETECTIONS, PREDICTIONS, PREDICTIONS_IN_FLIGHT, stage_timer, timed
+from app.core.storage import get_crop_storage, get_image_storage
 from app.services.base_service import BaseService
+from app.services.image_processing import DecodedImage, crop_filename, decode_image, encode_crop, parse_crop_name, read_image_size
+from app.services.matching import boxes_to_array, match_helmets
 from app.models.image import Image as DBImage
 from app.models.prediction import BoundingBox, PredictionResult
+from app.services.detector import BaseDetector, ImageSource, get_detector
+from app.services.batch_scheduler import get_batch_scheduler
+from app.services.derivative_service import get_derivative_service
+from app.services.prediction_cache import get_prediction_cache
+from app.services.prediction_writer import PredictionWrite, PredictionWriter
 
-class PredictionService(BaseService):
-  def __init__(self):
-    self.api_url = f'{settings.ROBOFLOW_MODEL_URL}?api_key={settings.ROBOFLOW_API_KEY}'
-    self.cropped_dir = settings.CROPPED_IMAGES_DIR
-    self.base_url = settings.BASE_URL or "http://localhost:8000"
-    os.makedirs(self.cropped_dir, exist_ok=True)
+logger = logging.getLogger(__name__)
 
-  async def predict_image(self, image_id: UUID) -> dict:
+class PredictionService(BaseService):
+  def __init__(self, detector: BaseDetector | None = None, writer: PredictionWriter | None = None):
+    self.detector = detector or get_detector()
+    self.scheduler = get_batch_scheduler(self.detector)
+    self.cache = get_prediction_cache()
+    # Without a shared writer every prediction commits on its own
+    self.writer = writer or PredictionWriter(max_batch_size=1)
+    self.images = get_image_storage()
+    self.crops = get_crop_storage()
+    self.derivatives = get_derivative_service()
+
+  async def predict_image(self, image_id: UUID, use_cache: bool = True) -> dict:
+    with PREDICTIONS_IN_FLIGHT.track_inprogress(), stage_timer('predict'):
+      return await self._predict_image(image_id, use_cache)
+
+  async def _predict_image(self, image_id: UUID, use_cache: bool) -> dict:
     try:
       image = await self._get_image(image_id)
-      predictions = await self._run_prediction(image.filepath)
       original_id = os.path.splitext(os.path.basename(image.filepath))[0]
-      cropped_images = await self._process_detections(original_id, image.filepath, predictions)
+      cached = None
+      if use_cache and image.content_hash:
+        cached = await self.cache.get(image.content_hash, self._cache_version())
+      if cached:
+        # Same frame seen before: reuse its detections and crops. The crops
+        # still name their drivers, so the writer keeps the violations as
+        # they are instead of treating them as gone
+        predictions, cropped_images = cached.predictions, cached.cropped_images
+        violations = self._cached_violations(predictions, cropped_images)
+        PREDICTIONS.labels('cached').inc()
+      else:
+        # Decode once up front only if the detector can use the pixels;
+        # otherwise crops decode lazily and only when there are violations
+        source = await self._load_source(image.filepath)
+        decoded = None
+        if self.detector.accepts_images:
+          with stage_timer('decode'):
+            decoded = await run_image(decode_image, source)
+        predictions = await self._run_prediction(source, decoded)
+        for pred in predictions:
+          DETECTIONS.labels(pred.class_name).inc()
+        violations = await self._process_detections(original_id, source, predictions, decoded)
+        cropped_images = [key for _, key in violations]
+        PREDICTIONS.labels('computed').inc()
+        if image.content_hash:
+          await self.cache.set(image.content_hash, self._cache_version(), predictions, cropped_images)
       result = PredictionResult(image_id=original_id, predictions=predictions, cropped_images=cropped_images)
-      await self._save_predictions(image_id, predictions)
+      # Violations, predictions and detections are written in one transaction
+      with stage_timer('save_predictions'):
+        await self.writer.write(PredictionWrite(image_id, original_id, predictions, violations))
       return self._create_prediction_response(result)
     except ImageNotFoundException as e:
       raise e
     except Exception as e:
-      print(f'Error during prediction: {str(e)}')  # Debug print
+      PREDICTIONS.labels('failed').inc()
+      logger.exception('Error during prediction of image %s: %s', image_id, e, extra={'image_id': str(image_id)})
       raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f'An error occurred during prediction: {str(e)}')
     
-  async def _process_detections(self, image_id: str, image_path: str, predictions: list[BoundingBox]) -> list[str]:
-    driver_boxes = [pred for pred in predictions if pred.class_name == 'driver']
+  @timed('process_detections')
+  async def _process_detections(
+    self,
+    image_id: str,
+    source: ImageSource,
+    predictions: list[BoundingBox],
+    decoded: DecodedImage | None = None
+  ) -> list[tuple[int, str]]:
+    # Returns (prediction index, crop storage key) for each unhelmeted driver
+    driver_indices = [i for i, pred in enumerate(predictions) if pred.class_name == 'driver']
+    driver_boxes = [predictions[i] for i in driver_indices]
     helmet_boxes = [pred for pred in predictions if pred.class_name == 'helmet']
-    cropped_images = []
 
-    print(f"Processing image: {image_path}")
-    print(f"Found {len(driver_boxes)} drivers and {len(helmet_boxes)} helmets")
+    logger.debug(
+      'Found %d drivers and %d helmets in %s', len(driver_boxes), len(helmet_boxes), image_id,
+      extra={'image_id': image_id, 'drivers': len(driver_boxes), 'helmets': len(helmet_boxes)}
+    )
+
+    image_size = decoded.original_size if decoded else await run_io(read_image_size, source)
+    matches = match_helmets(
+      boxes_to_array(driver_boxes),
+      boxes_to_array(helmet_boxes),
+      image_size,
+      max_distance=settings.HELMET_MATCH_MAX_DISTANCE,
+      min_iou=settings.HELMET_MATCH_MIN_IOU,
+      one_to_one=settings.HELMET_MATCH_ONE_TO_ONE
+    )
+
+    crops = []
+    crop_sources = {}
+    for i, (driver, helmet_index) in enumerate(zip(driver_boxes, matches)):
+      if helmet_index < 0:
+        # Add padding to the bounding box
+        padding = 50
+        bbox = (
+          driver.x - driver.width/2 - padding,
+          driver.y - driver.height/2 - padding,
+          driver.width + 2*padding,
+          driver.height + 2*padding
+        )
+        key = self.crops.key_for(crop_filename(image_id, i))
+        crops.append((bbox, key))
+        crop_sources[key] = driver_indices[i]
+
+    if not crops:
+      return []
 
     try:
-      with Image.open(image_path) as img:
-        for i, driver in enumerate(driver_boxes):
-          closest_helmet = None
-          min_distance = float('inf')
-          
-          for helmet in helmet_boxes:
-            distance = self._calculate_distance(driver.x, driver.y, helmet.x, helmet.y)
-            if distance < min_distance and distance < 200:
-              min_distance = distance
-              closest_helmet = helmet
-
-          if not closest_helmet:
-            try:
-              # Add padding to the bounding box
-              padding = 50
-              bbox = (
-                driver.x - driver.width/2 - padding,
-                driver.y - driver.height/2 - padding,
-                driver.width + 2*padding,
-                driver.height + 2*padding
-              )
-              
-              filename = f'{image_id}_violation_{i}.jpeg'
-              filepath = os.path.join(self.cropped_dir, filename)
-              
-              os.makedirs(self.cropped_dir, exist_ok=True)
-              await self._crop_and_save(img, bbox, filepath)
-              cropped_images.append(filepath)
-              
-              # Save violation in database
-              await self._save_violation(filepath)
-              print(f"Saved violation in database for image: {image_id}")
-              
-            except Exception as e:
-              print(f"Error processing violation {i}: {str(e)}")
-              import traceback
-              print(traceback.format_exc())
-
+      if decoded is None:
+        with stage_timer('decode'):
+          decoded = await run_image(decode_image, source)
+      saved = await self._crop_and_save(decoded, crops)
     except Exception as e:
-      print(f"Error processing image: {str(e)}")
-      import traceback
-      print(traceback.format_exc())
-
-    return cropped_images
-
-  async def _save_violation(self, cropped_path: str) -> None:
-    try:
-      filename = os.path.basename(cropped_path)
-      url_path = f"{self.base_url}/cropped_images/{filename}"
-      
-      violation_data = ViolationCreate(
-        type=1,
-        image_url=url_path
-      )
-      
-      with self.get_session() as session:
-        violation = Violation.model_validate(violation_data)
-        session.add(violation)
-        session.commit()
-        print(f"Saved violation: {violation.id} with URL: {url_path}")
-    except Exception as e:
-      print(f"Error saving violation: {str(e)}")
-      import traceback
-      print(traceback.format_exc())
-      raise e
-
+      logger.exception('Error cropping image %s: %s', image_id, e, extra={'image_id': image_id})
+      return []
+
+    return [(crop_sources[key], key) for key in saved]
+
+  def _cache_version(self) -> str:
+    # Matching decides which drivers become violations and get crops, so a
+    # change to its settings must miss the cache as a new model would
+    return (
+      f'{self.detector.model_version}|match:{settings.HELMET_MATCH_MAX_DISTANCE}:'
+      f'{settings.HELMET_MATCH_MIN_IOU}:{settings.HELMET_MATCH_ONE_TO_ONE}'
+    )
+
+  def _cached_violations(self, predictions: list[BoundingBox], cropped_images: list[str]) -> list[tuple[int, str]]:
+    # Maps each cached crop back to the prediction index of its driver
+    driver_indices = [i for i, pred in enumerate(predictions) if pred.class_name == 'driver']
+    violations = []
+    for key in cropped_images:
+      parsed = parse_crop_name(key)
+      if parsed is not None and parsed[1] < len(driver_indices):
+        violations.append((driver_indices[parsed[1]], key))
+    return violations
 
   def _create_prediction_response(self, result: PredictionResult) -> dict:
     return {
@@ -121,70 +165,60 @@ class PredictionService(BaseService):
     }
 
   async def _get_image(self, image_id: UUID) -> DBImage:
-    with self.get_session() as session:
-      image = session.get(DBImage, image_id)
-      if not image:
-        raise ImageNotFoundException()
-      return image
-
-  async def _run_prediction(self, image_path: str) -> list[BoundingBox]:
-    if not os.path.exists(image_path):
-      raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Image file not found')
-    with open(image_path, 'rb') as img_file:
-      encoded_image = base64.b64encode(img_file.read()).decode('utf-8')
-
-    headers = {'Content-Type': 'application/json'}
-    response = requests.post(self.api_url, data=encoded_image, headers=headers)
-      
-    if response.status_code != 200:
-      raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f'Roboflow API error: {response.text}')
-
-    data = response.json()
-    predictions = []
-    for pred in data['predictions']:
-      bbox = BoundingBox(
-        x=pred['x'],
-        y=pred['y'],
-        width=pred['width'],
-        height=pred['height'],
-        confidence=pred['confidence'],
-        class_name=pred['class']
-      )
-      predictions.append(bbox)
-
-    return predictions
-
-  def _calculate_distance(self, x1: float, y1: float, x2: float, y2: float) -> float:
-    return ((x1 - x2) ** 2 + (y1 - y2) ** 2) ** 0.5
-
-  async def _crop_and_save(self, image: Image.Image, bbox: tuple[float, float, float, float], filepath: str) -> None:
-    try:
-      x, y, width, height = bbox
-      img_width, img_height = image.size
-      
-      # Ensure coordinates are within image bounds
-      left = max(0, int(x))
-      top = max(0, int(y))
-      right = min(img_width, int(x + width))
-      bottom = min(img_height, int(y + height))
-      
-      if left >= right or top >= bottom:
-        print(f'Invalid crop coordinates: left={left}, top={top}, right={right}, bottom={bottom}')
-        return
-      
-      cropped = image.crop((left, top, right, bottom))
-      cropped.save(filepath)
-      print(f'Successfully saved cropped image: {filepath}')
-    except Exception as e:
-      print(f'Error saving cropped image: {str(e)}')
-      raise e
-
-  async def _save_predictions(self, image_id: UUID, predictions: list[BoundingBox]) -> None:
-    with self.get_session() as session:
-      image = session.get(DBImage, image_id)
-      if not image: 
-        raise ImageNotFoundException()      
-      predictions_data = [pred.model_dump() for pred in predictions]
-      image.predictions = json.dumps(predictions_data)
-      session.add(image)
-      session.commit()
\ No newline at end of file
+    async with self.get_async_session() as session:
+      image = await session.get(DBImage, image_id)
+    if not image:
+      raise ImageNotFoundException()
+    return image
+
+  @timed('load_source')
+  async def _load_source(self, key: str) -> str | bytes:
+    # Local files are read in place; remote objects are fetched once
+    path = self.images.local_path(key)
+    if path is not None:
+      return path
+    return await run_io(self.images.read, key)
+
+  @timed('run_prediction')
+  async def _run_prediction(self, source: str | bytes, decoded: DecodedImage | None = None) -> list[BoundingBox]:
+    if decoded is None:
+      return await self.scheduler.submit(source)
+    predictions = await self.scheduler.submit(decoded.image)
+    if decoded.scale == 1.0:
+      return predictions
+    # Map boxes from the draft-decoded image back to original pixels
+    return [
+      pred.model_copy(update={
+        'x': pred.x * decoded.scale,
+        'y': pred.y * decoded.scale,
+        'width': pred.width * decoded.scale,
+        'height': pred.height * decoded.scale,
+      }) for pred in predictions
+    ]
+
+  @timed('crop_and_save')
+  async def _crop_and_save(self, decoded: DecodedImage, crops: list[tuple[tuple[float, float, float, float], str]]) -> list[str]:
+    # Crops share the decoded image and are encoded in parallel
+    results = await asyncio.gather(
+      *(self._store_crop(decoded, bbox, key) for bbox, key in crops),
+      return_exceptions=True
+    )
+    saved = []
+    for (_, key), result in zip(crops, results):
+      if isinstance(result, Exception):
+        logger.error('Error saving cropped image %s: %s', key, result, exc_info=result)
+      elif result:
+        logger.debug('Saved cropped image %s', key, extra={'key': key})
+        saved.append(key)
+    return saved
+
+  async def _store_crop(self, decoded: DecodedImage, bbox: tuple[float, float, float, float], key: str) -> bool:
+    data = await run_image(encode_crop, decoded, bbox)
+    if data is None:
+      return False
+    await run_io(self.crops.write, key, data)
+    # A re-run may have replaced the crop, so older resized copies go with it
+    await run_io(self.derivatives.delete_for, [key])
+    if settings.DERIVATIVE_EAGER:
+      await self.derivatives.generate_all(key)
+    return True
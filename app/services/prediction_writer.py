@@ -0,0 +1,223 @@
+import asyncio
+import json
+import logging
+from datetime import datetime
+from typing import NamedTuple
+from uuid import UUID
+
+from sqlalchemy import delete, insert, update
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import select
+
+from app.core.config import settings
+from app.core.exceptions import ImageNotFoundException
+from app.core.metrics import VIOLATIONS, stage_timer
+from app.core.storage import get_crop_storage
+from app.models.detection import Detection
+from app.models.image import Image as DBImage, ImageCrop
+from app.models.prediction import BoundingBox
+from app.models.violation import Violation
+from app.services.base_service import BaseService
+from app.services.count_cache import get_count_cache
+from app.services.violation_broker import get_violation_broker
+from app.services.violation_rollup import apply_rollups, count_rollups
+
+logger = logging.getLogger(__name__)
+
+def violation_url(key: str) -> str:
+  # Served straight from the crop store when it has public URLs
+  filename = key.rsplit('/', 1)[-1]
+  base_url = settings.BASE_URL or "http://localhost:8000"
+  return get_crop_storage().url(key) or f"{base_url}{settings.API_STR}/image/cropped/{filename}"
+
+class PredictionWrite(NamedTuple):
+  image_id: UUID
+  # Owner of the crops: the frame's content hash, or its file stem for
+  # uploads that predate deduplication
+  content_hash: str
+  predictions: list[BoundingBox]
+  # (prediction index, crop storage key) for each unhelmeted driver
+  violations: list[tuple[int, str]]
+
+class PredictionWriter(BaseService):
+  # Persists prediction results, one transaction per image or, when
+  # max_batch_size > 1, one transaction for every image written together
+  def __init__(self, max_batch_size: int | None = None, max_wait_ms: float | None = None):
+    self.max_batch_size = max_batch_size or settings.PREDICTION_COMMIT_MAX_BATCH_SIZE
+    self.max_wait_ms = max_wait_ms if max_wait_ms is not None else settings.PREDICTION_COMMIT_MAX_WAIT_MS
+    self.commits = 0
+    self.items = 0
+    self.failed_batches = 0
+    self._pending: list[tuple[PredictionWrite, asyncio.Future]] = []
+    self._timer: asyncio.TimerHandle | None = None
+    self._tasks: set[asyncio.Task] = set()
+
+  async def write(self, item: PredictionWrite) -> None:
+    if self.max_batch_size <= 1:
+      missing = await self._commit([item])
+      if missing:
+        raise ImageNotFoundException()
+      return
+
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+    self._pending.append((item, future))
+    if len(self._pending) >= self.max_batch_size:
+      self._flush()
+    elif self._timer is None:
+      self._timer = loop.call_later(self.max_wait_ms / 1000, self._flush)
+    await future
+
+  async def drain(self) -> None:
+    if self._pending:
+      self._flush()
+    if self._tasks:
+      await asyncio.gather(*self._tasks, return_exceptions=True)
+
+  def snapshot(self) -> dict:
+    return {
+      'commits': self.commits,
+      'items': self.items,
+      'max_batch_size': self.max_batch_size,
+      'avg_batch_size': self.items / self.commits if self.commits else 0.0,
+      'failed_batches': self.failed_batches,
+    }
+
+  def _flush(self) -> None:
+    if self._timer is not None:
+      self._timer.cancel()
+      self._timer = None
+    batch, self._pending = self._pending[:self.max_batch_size], self._pending[self.max_batch_size:]
+    if self._pending:
+      self._timer = asyncio.get_running_loop().call_later(self.max_wait_ms / 1000, self._flush)
+    if not batch:
+      return
+    task = asyncio.create_task(self._run_batch(batch))
+    self._tasks.add(task)
+    task.add_done_callback(self._tasks.discard)
+
+  async def _run_batch(self, batch: list[tuple[PredictionWrite, asyncio.Future]]) -> None:
+    try:
+      missing = await self._commit([item for item, _ in batch])
+    except Exception as e:
+      self.failed_batches += 1
+      if len(batch) == 1:
+        self._resolve(batch[0][1], exception=e)
+        return
+      # Retry one by one so a single bad image does not fail its neighbours
+      logger.warning('Grouped commit failed, retrying individually: %s', e, exc_info=True)
+      for item, future in batch:
+        await self._run_batch([(item, future)])
+      return
+    for item, future in batch:
+      if item.image_id in missing:
+        self._resolve(future, exception=ImageNotFoundException())
+      else:
+        self._resolve(future)
+
+  def _resolve(self, future: asyncio.Future, exception: Exception | None = None) -> None:
+    if future.done():
+      return
+    if exception is not None:
+      future.set_exception(exception)
+    else:
+      future.set_result(None)
+
+  async def _commit(self, items: list[PredictionWrite]) -> set[UUID]:
+    # Returns the ids of images that no longer exist; those items are skipped
+    try:
+      return await self._commit_once(items)
+    except IntegrityError:
+      # A concurrent write registered one of the same crops first
+      return await self._commit_once(items)
+
+  async def _commit_once(self, items: list[PredictionWrite]) -> set[UUID]:
+    now = datetime.utcnow()
+    with stage_timer('db_commit'):
+      return await self._write(items, now)
+
+  async def _write(self, items: list[PredictionWrite], now: datetime) -> set[UUID]:
+    async with self.get_async_session() as session:
+      ids = [item.image_id for item in items]
+      found = set((await session.exec(select(DBImage.id).where(DBImage.id.in_(ids)))).all())
+      items = [item for item in items if item.image_id in found]
+      if not items:
+        return set(ids)
+
+      # A re-run keeps the violations whose crop is still a violation, with
+      # their ids and review status, and drops the ones that are not
+      existing = {
+        (image_id, violation.image_url): violation
+        for image_id, violation in (await session.exec(
+          select(Detection.image_id, Violation)
+          .join(Violation, Detection.violation_id == Violation.id)
+          .where(Detection.image_id.in_([item.image_id for item in items]))
+        )).all()
+      }
+      kept = {}
+      violations = {}
+      for item in items:
+        for index, key in item.violations:
+          url = violation_url(key)
+          if (item.image_id, url) in existing:
+            kept[(item.image_id, index)] = existing.pop((item.image_id, url))
+          else:
+            violations[(item.image_id, index)] = Violation(type=1, image_url=url, timestamp=now)
+      stale = list(existing.values())
+      session.add_all(violations.values())
+      # Crops are recorded so deleting a frame never has to scan storage
+      crops = {key: item.content_hash for item in items for _, key in item.violations}
+      if crops:
+        known = set((await session.exec(select(ImageCrop.key).where(ImageCrop.key.in_(list(crops))))).all())
+        session.add_all(ImageCrop(key=key, content_hash=owner) for key, owner in crops.items() if key not in known)
+      # One multi-row INSERT; the flush fills in the ids the detections link to
+      await session.flush()
+      # Dashboard aggregates move with the violations, in the same transaction
+      deltas = count_rollups(violations.values())
+      deltas.update(count_rollups(stale, sign=-1))
+      await apply_rollups(session, deltas)
+
+      # The JSON column stays for API compatibility; queries use Detection rows
+      await session.exec(update(DBImage), params=[
+        {'id': item.image_id, 'predictions': json.dumps([pred.model_dump() for pred in item.predictions])}
+        for item in items
+      ])
+      await session.exec(delete(Detection).where(Detection.image_id.in_([item.image_id for item in items])))
+      if stale:
+        await session.exec(delete(Violation).where(Violation.id.in_([violation.id for violation in stale])))
+      linked = {**kept, **violations}
+      detection_rows = [
+        {
+          'image_id': item.image_id,
+          'violation_id': linked[(item.image_id, i)].id if (item.image_id, i) in linked else None,
+          'class_name': pred.class_name,
+          'confidence': pred.confidence,
+          'x': pred.x,
+          'y': pred.y,
+          'width': pred.width,
+          'height': pred.height,
+          'created_at': now,
+        } for item in items for i, pred in enumerate(item.predictions)
+      ]
+      if detection_rows:
+        await session.exec(insert(Detection), params=detection_rows)
+      await session.commit()
+
+    self.commits += 1
+    self.items += len(items)
+    if stale:
+      get_count_cache().adjust('violation', -len(stale))
+    if violations:
+      get_count_cache().adjust('violation', len(violations))
+      VIOLATIONS.inc(len(violations))
+      get_violation_broker().publish(list(violations.values()))
+      logger.debug('Saved %d violations for %d images', len(violations), len(items))
+    return set(ids) - found
+
+_prediction_writer: PredictionWriter | None = None
+
+def get_prediction_writer() -> PredictionWriter:
+  global _prediction_writer
+  if _prediction_writer is None:
+    _prediction_writer = PredictionWriter()
+  return _prediction_writer
@@ -0,0 +1,415 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from itertools import islice
+from typing import Any
+from uuid import UUID, uuid4
+
+from sqlalchemy import delete, or_, tuple_, update
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import func, select
+
+from app.core.config import settings
+from app.core.executor import run_io
+from app.core.pagination import decode_cursor, encode_cursor
+from app.core.storage import StoredObject, get_crop_storage, get_derivative_storage, get_image_storage
+from app.models.detection import Detection
+from app.models.image import Image, ImageBlob, ImageCrop
+from app.models.job import JobStatus
+from app.models.retention import RetentionState
+from app.models.violation import Violation
+from app.services.base_service import BaseService
+from app.services.derivative_service import get_derivative_service
+from app.services.image_processing import CROP_EXTENSIONS
+from app.services.image_service import ImageService, PurgedImages
+from app.services.prediction_writer import violation_url
+
+logger = logging.getLogger(__name__)
+
+LEASE = 'lease'
+
+class RateLimiter:
+  # Spaces storage operations to at most per_second on average, so a large
+  # cleanup does not compete with uploads for disk or S3 throughput
+  def __init__(self, per_second: float):
+    self.interval = 1 / per_second if per_second > 0 else 0.0
+    self._next = time.monotonic()
+
+  async def acquire(self, count: int = 1) -> None:
+    if not self.interval or count <= 0:
+      return
+    now = time.monotonic()
+    start = max(self._next, now)
+    self._next = start + count * self.interval
+    if start > now:
+      await asyncio.sleep(start - now)
+
+class RetentionReport:
+  def __init__(self, dry_run: bool):
+    self.dry_run = dry_run
+    self.ran = False
+    self.started_at = datetime.utcnow()
+    self.finished_at: datetime | None = None
+    self.counts: Counter = Counter()
+
+  def add(self, name: str, value: int = 1) -> None:
+    self.counts[name] += value
+
+  def add_purged(self, reason: str, purged: PurgedImages) -> None:
+    self.add(reason, purged.images)
+    self.add('violations', purged.violations)
+    self.add('image_files', len(purged.file_keys))
+    self.add('crop_files', len(purged.crop_keys))
+    self.add('bytes_freed', purged.bytes_freed)
+
+  def as_dict(self) -> dict:
+    return {
+      'dry_run': self.dry_run,
+      'ran': self.ran,
+      'started_at': self.started_at.isoformat(),
+      'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+      **dict(sorted(self.counts.items())),
+    }
+
+class RetentionService(BaseService):
+  # One retention pass: age and size policies, then reconciliation of
+  # storage against the database in both directions. Work is committed a
+  # batch at a time and scans keep a cursor, so an interrupted run resumes
+  # where it stopped. A dry run reads everything and changes nothing.
+  def __init__(self, dry_run: bool = False):
+    self.dry_run = dry_run
+    self.image_service = ImageService()
+    self.stores = {
+      'images': get_image_storage(),
+      'crops': get_crop_storage(),
+      'derivatives': get_derivative_storage(),
+    }
+    self.limiter = RateLimiter(settings.RETENTION_MAX_FILE_OPS_PER_SECOND)
+    self.batch_size = settings.RETENTION_BATCH_SIZE
+    self.owner = f'{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:8]}'
+
+  async def run(self) -> RetentionReport:
+    report = RetentionReport(self.dry_run)
+    if not self.dry_run and not await self.acquire_lease():
+      # Another worker is already on it
+      return report
+    report.ran = True
+    try:
+      if settings.RETENTION_MAX_AGE_DAYS is not None:
+        cutoff = datetime.utcnow() - timedelta(days=settings.RETENTION_MAX_AGE_DAYS)
+        await self._delete_oldest(report, 'expired_images', Image.created_at < cutoff)
+      if settings.RETENTION_MAX_BYTES is not None:
+        excess = await self._stored_bytes() - settings.RETENTION_MAX_BYTES
+        if excess > 0:
+          await self._delete_oldest(report, 'oversize_images', None, excess)
+      for name in self.stores:
+        await self._remove_orphan_files(report, name)
+      await self._remove_missing_images(report)
+      await self._remove_missing_crops(report)
+    finally:
+      report.finished_at = datetime.utcnow()
+      if not self.dry_run:
+        await self.release_lease()
+    return report
+
+  async def acquire_lease(self) -> bool:
+    # Conditional update so only one uvicorn worker runs retention; a lease
+    # left by a dead worker is taken over once it expires
+    now = datetime.utcnow()
+    expired = now - timedelta(seconds=settings.RETENTION_LEASE_SECONDS)
+    async with self.get_async_session() as session:
+      result = await session.exec(
+        update(RetentionState)
+        .where(RetentionState.name == LEASE)
+        .where(or_(RetentionState.value == self.owner, RetentionState.value.is_(None), RetentionState.updated_at < expired))
+        .values(value=self.owner, updated_at=now)
+      )
+      if result.rowcount == 1:
+        await session.commit()
+        return True
+      if await session.get(RetentionState, LEASE) is not None:
+        return False
+      session.add(RetentionState(name=LEASE, value=self.owner, updated_at=now))
+      try:
+        await session.commit()
+      except IntegrityError:
+        return False
+      return True
+
+  async def release_lease(self) -> None:
+    async with self.get_async_session() as session:
+      await session.exec(
+        update(RetentionState)
+        .where(RetentionState.name == LEASE, RetentionState.value == self.owner)
+        .values(value=None, updated_at=datetime.utcnow())
+      )
+      await session.commit()
+
+  async def _renew_lease(self) -> None:
+    if not self.dry_run and not await self.acquire_lease():
+      raise RuntimeError('Retention lease was taken over by another worker')
+
+  async def _load_cursor(self, name: str) -> str | None:
+    # Dry runs always report on everything
+    if self.dry_run:
+      return None
+    async with self.get_async_session() as session:
+      state = await session.get(RetentionState, name)
+      return state.value if state else None
+
+  async def _save_cursor(self, name: str, value: str | None) -> None:
+    if self.dry_run:
+      return
+    async with self.get_async_session() as session:
+      await session.merge(RetentionState(name=name, value=value, updated_at=datetime.utcnow()))
+      await session.commit()
+
+  def _deletable(self) -> Any:
+    # Images with a prediction still queued or running are left for next time
+    busy = (*JobStatus.PENDING, JobStatus.RUNNING)
+    return or_(Image.job_status.is_(None), Image.job_status.notin_(busy))
+
+  async def _stored_bytes(self) -> int:
+    # Deduplicated frames count once; uploads that predate blobs count per row
+    async with self.get_async_session() as session:
+      blobs = (await session.exec(select(func.coalesce(func.sum(ImageBlob.size), 0)))).one()
+      legacy = (await session.exec(
+        select(func.coalesce(func.sum(Image.size), 0)).where(Image.content_hash.is_(None))
+      )).one()
+    return int(blobs) + int(legacy)
+
+  async def _delete_oldest(self, report: RetentionReport, reason: str, where: Any, bytes_needed: int | None = None) -> None:
+    # Oldest first, one committed batch at a time. With bytes_needed, stops
+    # once that much has been freed (to batch granularity).
+    refs: dict[str, int] = {}
+    after = None
+    freed = 0
+    while bytes_needed is None or freed < bytes_needed:
+      statement = select(Image).where(self._deletable()).order_by(Image.created_at, Image.id).limit(self.batch_size)
+      if where is not None:
+        statement = statement.where(where)
+      if after is not None:
+        statement = statement.where(tuple_(Image.created_at, Image.id) > after)
+      async with self.get_async_session() as session:
+        images = (await session.exec(statement)).all()
+      if not images:
+        break
+      after = (images[-1].created_at, images[-1].id)
+      if self.dry_run:
+        purged = await self._estimate_purge(images, refs)
+      else:
+        await self._renew_lease()
+        purged = await self.image_service.delete_images([image.id for image in images])
+      report.add_purged(reason, purged)
+      freed += purged.bytes_freed
+      # Crops have one derivative per configured size
+      await self.limiter.acquire(len(purged.file_keys) + len(purged.crop_keys) * (1 + len(settings.DERIVATIVE_SIZES)))
+
+  async def _estimate_purge(self, images: list[Image], refs: dict[str, int]) -> PurgedImages:
+    # What delete_images would remove, tracking blob references across
+    # batches since nothing is actually released in a dry run
+    hashes = {image.content_hash for image in images if image.content_hash and image.content_hash not in refs}
+    image_ids = [image.id for image in images]
+    async with self.get_async_session() as session:
+      if hashes:
+        rows = (await session.exec(
+          select(ImageBlob.content_hash, ImageBlob.ref_count).where(ImageBlob.content_hash.in_(hashes))
+        )).all()
+        refs.update({content_hash: ref_count for content_hash, ref_count in rows})
+      violations = (await session.exec(
+        select(func.count(func.distinct(Detection.violation_id))).where(Detection.image_id.in_(image_ids))
+      )).one()
+      file_keys, owners, content_hashes = [], [], []
+      bytes_freed = 0
+      for image in images:
+        if image.content_hash in refs:
+          refs[image.content_hash] -= 1
+          if refs[image.content_hash] > 0:
+            continue
+        file_keys.append(image.filepath)
+        bytes_freed += image.size
+        owners.append(image.content_hash or os.path.splitext(os.path.basename(image.filepath))[0])
+        if image.content_hash:
+          content_hashes.append(image.content_hash)
+      crop_keys = (await session.exec(select(ImageCrop.key).where(ImageCrop.content_hash.in_(owners)))).all() if owners else []
+    return PurgedImages(len(images), violations, file_keys, bytes_freed, list(crop_keys), content_hashes)
+
+  async def _remove_orphan_files(self, report: RetentionReport, name: str) -> None:
+    # Files no row refers to: frames and crops left by crashed uploads or
+    # old deletes, and derivatives of crops that are gone
+    storage = self.stores[name]
+    checkpoint = f'orphans:{name}'
+    grace_cutoff = datetime.utcnow() - timedelta(seconds=settings.RETENTION_ORPHAN_GRACE_SECONDS)
+    objects = storage.list_keys(await self._load_cursor(checkpoint))
+
+    def next_page() -> list[StoredObject]:
+      return list(islice(objects, self.batch_size))
+
+    while True:
+      await self.limiter.acquire()
+      page = await run_io(next_page)
+      if not page:
+        break
+      candidates = [item for item in page if item.modified < grace_cutoff]
+      known = await self._known_keys(name, [item.key for item in candidates]) if candidates else set()
+      orphans = [item for item in candidates if item.key not in known]
+      if orphans:
+        report.add(f'orphan_files:{name}', len(orphans))
+        report.add(f'orphan_bytes:{name}', sum(item.size for item in orphans))
+        if not self.dry_run:
+          await self._renew_lease()
+          await self.limiter.acquire(len(orphans))
+          await run_io(storage.delete_many, [item.key for item in orphans])
+      await self._save_cursor(checkpoint, page[-1].key)
+    # Finished; the next run starts from the beginning
+    await self._save_cursor(checkpoint, None)
+
+  async def _known_keys(self, name: str, keys: list[str]) -> set[str]:
+    async with self.get_async_session() as session:
+      if name == 'images':
+        known = set((await session.exec(select(Image.filepath).where(Image.filepath.in_(keys)))).all())
+        known |= set((await session.exec(select(ImageBlob.filepath).where(ImageBlob.filepath.in_(keys)))).all())
+        return known
+      if name == 'crops':
+        return set((await session.exec(select(ImageCrop.key).where(ImageCrop.key.in_(keys)))).all())
+      # A derivative is known while the crop it was made from is
+      sources = {key: self._derivative_sources(key) for key in keys}
+      crop_keys = {crop_key for candidates in sources.values() for crop_key in candidates}
+      existing = set((await session.exec(select(ImageCrop.key).where(ImageCrop.key.in_(crop_keys)))).all()) if crop_keys else set()
+      return {key for key, candidates in sources.items() if candidates & existing}
+
+  def _derivative_sources(self, key: str) -> set[str]:
+    # Derivatives are named <crop stem>_<variant>.<ext>; the crop's own
+    # extension is not recorded, so every crop format is a candidate
+    stem, _, variant = os.path.splitext(key.rsplit('/', 1)[-1])[0].rpartition('_')
+    if not stem or variant not in settings.DERIVATIVE_SIZES:
+      return set()
+    crops = self.stores['crops']
+    return {crops.key_for(f'{stem}{extension}') for extension in set(CROP_EXTENSIONS.values())}
+
+  async def _remove_missing_images(self, report: RetentionReport) -> None:
+    # Image rows whose frame is gone can be neither shown nor re-run
+    storage = self.stores['images']
+    checkpoint = 'missing:images'
+    grace_cutoff = datetime.utcnow() - timedelta(seconds=settings.RETENTION_ORPHAN_GRACE_SECONDS)
+    cursor = await self._load_cursor(checkpoint)
+    after = decode_cursor(cursor, UUID) if cursor else None
+    while True:
+      statement = select(Image).where(Image.created_at < grace_cutoff).order_by(Image.created_at, Image.id).limit(self.batch_size)
+      if after is not None:
+        statement = statement.where(tuple_(Image.created_at, Image.id) > after)
+      async with self.get_async_session() as session:
+        images = (await session.exec(statement)).all()
+      if not images:
+        break
+      after = (images[-1].created_at, images[-1].id)
+      keys = sorted({image.filepath for image in images})
+      await self.limiter.acquire(len(keys))
+      present = await run_io(self._existing, storage, keys)
+      missing = [image for image in images if image.filepath not in present]
+      if missing:
+        if self.dry_run:
+          purged = await self._estimate_purge(missing, {})
+        else:
+          await self._renew_lease()
+          purged = await self.image_service.delete_images([image.id for image in missing])
+        report.add_purged('missing_image_files', purged)
+      await self._save_cursor(checkpoint, encode_cursor(*after))
+    await self._save_cursor(checkpoint, None)
+
+  async def _remove_missing_crops(self, report: RetentionReport) -> None:
+    # Crop rows whose file is gone are dropped with their derivatives. The
+    # violations that point at them are review records, so they are only
+    # counted in the report.
+    storage = self.stores['crops']
+    checkpoint = 'missing:crops'
+    grace_cutoff = datetime.utcnow() - timedelta(seconds=settings.RETENTION_ORPHAN_GRACE_SECONDS)
+    after = await self._load_cursor(checkpoint)
+    while True:
+      statement = select(ImageCrop).where(ImageCrop.created_at < grace_cutoff).order_by(ImageCrop.key).limit(self.batch_size)
+      if after is not None:
+        statement = statement.where(ImageCrop.key > after)
+      async with self.get_async_session() as session:
+        crops = (await session.exec(statement)).all()
+      if not crops:
+        break
+      after = crops[-1].key
+      await self.limiter.acquire(len(crops))
+      present = await run_io(self._existing, storage, [crop.key for crop in crops])
+      missing = [crop.key for crop in crops if crop.key not in present]
+      if missing:
+        report.add('missing_crop_files', len(missing))
+        async with self.get_async_session() as session:
+          urls = [violation_url(key) for key in missing]
+          dangling = (await session.exec(select(func.count()).select_from(Violation).where(Violation.image_url.in_(urls)))).one()
+          report.add('dangling_violations', dangling)
+          if not self.dry_run:
+            await session.exec(delete(ImageCrop).where(ImageCrop.key.in_(missing)))
+            await session.commit()
+        if not self.dry_run:
+          await self.limiter.acquire(len(missing) * len(settings.DERIVATIVE_SIZES))
+          await run_io(get_derivative_service().delete_for, missing)
+      await self._save_cursor(checkpoint, after)
+    await self._save_cursor(checkpoint, None)
+
+  def _existing(self, storage: Any, keys: list[str]) -> set[str]:
+    return {key for key in keys if storage.exists(key)}
+
+class RetentionWorker:
+  # Runs retention periodically in the background. Every uvicorn worker
+  # has one; the lease lets only one of them do the work each round.
+  def __init__(self, interval_seconds: float | None = None):
+    self.interval_seconds = interval_seconds or settings.RETENTION_INTERVAL_SECONDS
+    self._task: asyncio.Task | None = None
+    self.runs = 0
+    self.failures = 0
+    self.last_report: RetentionReport | None = None
+
+  @property
+  def running(self) -> bool:
+    return self._task is not None and not self._task.done()
+
+  async def start(self) -> None:
+    if not self.running:
+      self._task = asyncio.create_task(self._loop())
+
+  async def stop(self) -> None:
+    if self._task is not None:
+      self._task.cancel()
+      await asyncio.gather(self._task, return_exceptions=True)
+      self._task = None
+
+  def snapshot(self) -> dict:
+    return {
+      'running': self.running,
+      'runs': self.runs,
+      'failures': self.failures,
+      'last_report': self.last_report.as_dict() if self.last_report else None,
+    }
+
+  async def _loop(self) -> None:
+    # The first round waits a minute so it stays off the startup path
+    await asyncio.sleep(min(60.0, self.interval_seconds))
+    while True:
+      try:
+        report = await RetentionService().run()
+        if report.ran:
+          self.runs += 1
+          self.last_report = report
+          logger.info('Retention run finished: %s', dict(report.counts), extra={'report': report.as_dict()})
+      except Exception as e:
+        self.failures += 1
+        logger.warning('Retention run failed: %s', e)
+      await asyncio.sleep(self.interval_seconds)
+
+_retention_worker: RetentionWorker | None = None
+
+def get_retention_worker() -> RetentionWorker:
+  global _retention_worker
+  if _retention_worker is None:
+    _retention_worker = RetentionWorker()
+  return _retention_worker
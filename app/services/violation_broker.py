@@ -0,0 +1,197 @@
+import asyncio
+import logging
+import time
+
+from sqlmodel import SQLModel, func, select
+
+from app.core.config import settings
+from app.models.violation import Violation, ViolationChange
+from app.services.base_service import BaseService
+
+logger = logging.getLogger(__name__)
+
+# New violations and status changes share one stream
+ViolationEvent = Violation | ViolationChange
+
+class Subscription:
+  # Bounded per-client buffer. A client that falls behind is closed rather
+  # than slowing publishers; it reconnects and resumes from its last id.
+  def __init__(self, max_size: int):
+    self._queue: asyncio.Queue[ViolationEvent | None] = asyncio.Queue(maxsize=max_size)
+    self.overflowed = False
+
+  def put(self, event: ViolationEvent) -> None:
+    if self.overflowed:
+      return
+    try:
+      self._queue.put_nowait(event)
+    except asyncio.QueueFull:
+      self.overflowed = True
+      # Drop the backlog and leave only the end-of-stream marker
+      while not self._queue.empty():
+        self._queue.get_nowait()
+      self._queue.put_nowait(None)
+
+  async def get(self, timeout: float) -> ViolationEvent | None:
+    # None on timeout; raises once the subscription has overflowed
+    try:
+      event = await asyncio.wait_for(self._queue.get(), timeout)
+    except asyncio.TimeoutError:
+      return None
+    if event is None:
+      raise OverflowError('Subscriber fell behind')
+    return event
+
+class ViolationBroker(BaseService):
+  # Whether published events are read back from the tables instead
+  polls_database = False
+
+  def __init__(self, queue_size: int | None = None):
+    self.queue_size = queue_size or settings.VIOLATION_STREAM_QUEUE_SIZE
+    self.subscribers: set[Subscription] = set()
+    self.published = 0
+    self.dropped = 0
+
+  async def subscribe(self) -> Subscription:
+    subscription = Subscription(self.queue_size)
+    self.subscribers.add(subscription)
+    return subscription
+
+  def unsubscribe(self, subscription: Subscription) -> None:
+    self.subscribers.discard(subscription)
+
+  def publish(self, events: list[ViolationEvent]) -> None:
+    # Called once the violations or status changes are committed
+    raise NotImplementedError
+
+  async def stop(self) -> None:
+    pass
+
+  def snapshot(self) -> dict:
+    return {
+      'subscribers': len(self.subscribers),
+      'published': self.published,
+      'dropped': self.dropped,
+    }
+
+  def _deliver(self, events: list[ViolationEvent]) -> None:
+    self.published += len(events)
+    for subscription in list(self.subscribers):
+      for event in events:
+        subscription.put(event)
+      if subscription.overflowed:
+        self.dropped += 1
+        self.unsubscribe(subscription)
+
+class MemoryViolationBroker(ViolationBroker):
+  # Fans out within this process only; for a single worker
+  def publish(self, events: list[ViolationEvent]) -> None:
+    if events and self.subscribers:
+      self._deliver(events)
+
+class TableTail:
+  # Follows a table by id. Ids are taken at insert but become visible at
+  # commit, so on Postgres a lower id can commit after a higher one has
+  # been read. Ids skipped below the watermark are re-checked until they
+  # appear or expire; rolled-back and deleted rows never appear.
+  max_gaps = 10_000
+
+  def __init__(self, model: type[SQLModel], gap_seconds: float):
+    self.model = model
+    self.gap_seconds = gap_seconds
+    self.last_id = 0
+    self.gaps: dict[int, float] = {}
+
+  async def start(self, session) -> None:
+    self.last_id = (await session.exec(select(func.max(self.model.id)))).one() or 0
+    self.gaps.clear()
+
+  async def read(self, session, limit: int) -> tuple[list, bool]:
+    # Returns late rows then new rows, and whether more new rows are waiting
+    now = time.monotonic()
+    self.gaps = {row_id: seen for row_id, seen in self.gaps.items() if now - seen < self.gap_seconds}
+    late = []
+    if self.gaps:
+      late = list((await session.exec(select(self.model).where(self.model.id.in_(list(self.gaps))))).all())
+      for row in late:
+        del self.gaps[row.id]
+    rows = list((await session.exec(
+      select(self.model).where(self.model.id > self.last_id).order_by(self.model.id).limit(limit)
+    )).all())
+    expected = self.last_id + 1
+    for row in rows:
+      # Only the newest ids of a very large jump are tracked
+      for missing in range(max(expected, row.id - self.max_gaps), row.id):
+        self.gaps[missing] = now
+      expected = row.id + 1
+    if len(self.gaps) > self.max_gaps:
+      self.gaps = dict(sorted(self.gaps.items())[-self.max_gaps:])
+    if rows:
+      self.last_id = rows[-1].id
+    return late + rows, len(rows) == limit
+
+class DatabaseViolationBroker(ViolationBroker):
+  # Each worker tails the violation and change tables by id while it has
+  # subscribers, so events committed by any worker reach every dashboard
+  batch_size = 500
+  polls_database = True
+
+  def __init__(self, queue_size: int | None = None, poll_ms: float | None = None, gap_seconds: float | None = None):
+    super().__init__(queue_size)
+    self.poll_ms = poll_ms or settings.VIOLATION_STREAM_POLL_MS
+    gap_seconds = gap_seconds or settings.VIOLATION_STREAM_GAP_SECONDS
+    self._violations = TableTail(Violation, gap_seconds)
+    self._changes = TableTail(ViolationChange, gap_seconds)
+    self._poller: asyncio.Task | None = None
+    self._lock = asyncio.Lock()
+
+  async def subscribe(self) -> Subscription:
+    subscription = await super().subscribe()
+    async with self._lock:
+      if self._poller is None or self._poller.done():
+        # The watermark is read before the caller backfills, so every row
+        # is either in its backfill or picked up by the poller
+        async with self.get_async_session() as session:
+          await self._violations.start(session)
+          await self._changes.start(session)
+        self._poller = asyncio.create_task(self._poll())
+    return subscription
+
+  def publish(self, events: list[ViolationEvent]) -> None:
+    # The poller picks them up from the tables along with other workers' rows
+    pass
+
+  async def stop(self) -> None:
+    if self._poller is not None:
+      self._poller.cancel()
+      await asyncio.gather(self._poller, return_exceptions=True)
+      self._poller = None
+
+  async def _poll(self) -> None:
+    while self.subscribers:
+      try:
+        async with self.get_async_session() as session:
+          violations, more_violations = await self._violations.read(session, self.batch_size)
+          changes, more_changes = await self._changes.read(session, self.batch_size)
+        if violations:
+          self._deliver(violations)
+        if changes:
+          self._deliver(changes)
+        if more_violations or more_changes:
+          continue
+      except Exception as e:
+        logger.warning('Violation stream poll failed: %s', e)
+      await asyncio.sleep(self.poll_ms / 1000)
+
+VIOLATION_BROKERS: dict[str, type[ViolationBroker]] = {
+  'database': DatabaseViolationBroker,
+  'memory': MemoryViolationBroker,
+}
+
+_violation_broker: ViolationBroker | None = None
+
+def get_violation_broker() -> ViolationBroker:
+  global _violation_broker
+  if _violation_broker is None:
+    _violation_broker = VIOLATION_BROKERS[settings.VIOLATION_BROKER_BACKEND]()
+  return _violation_broker
@@ -0,0 +1,58 @@
+from collections import Counter
+from datetime import datetime
+from typing import Iterable
+
+from sqlalchemy.dialects.postgresql import insert as postgres_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.config import settings
+from app.models.violation import Violation, ViolationRollup
+
+ROLLUP_PERIODS = ('hour', 'day')
+ROLLUP_KEY = ('period', 'bucket', 'type', 'status', 'location', 'drone')
+
+RollupKey = tuple[str, datetime, int, int, str, str]
+
+def bucket_start(timestamp: datetime, period: str) -> datetime:
+  if period == 'day':
+    return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+  return timestamp.replace(minute=0, second=0, microsecond=0)
+
+def rollup_keys(violation: Violation, status: int | None = None) -> list[RollupKey]:
+  # status overrides the violation's own, for moving a count between statuses
+  status = violation.status if status is None else status
+  return [
+    (period, bucket_start(violation.timestamp, period), violation.type, status, violation.location or '', violation.drone or '')
+    for period in ROLLUP_PERIODS
+  ]
+
+def count_rollups(violations: Iterable[Violation], sign: int = 1) -> Counter:
+  deltas: Counter = Counter()
+  for violation in violations:
+    for key in rollup_keys(violation):
+      deltas[key] += sign
+  return deltas
+
+def move_rollups(violations: Iterable[Violation], status: int) -> Counter:
+  # Moves each violation's counts from its current status to status
+  violations = list(violations)
+  deltas = count_rollups(violations, sign=-1)
+  for violation in violations:
+    for key in rollup_keys(violation, status):
+      deltas[key] += 1
+  return deltas
+
+async def apply_rollups(session: AsyncSession, deltas: Counter) -> None:
+  # Upserts count deltas in the caller's transaction. Keys are written in
+  # sorted order so concurrent transactions lock rows in the same order.
+  rows = [dict(zip(ROLLUP_KEY, key), count=delta) for key, delta in sorted(deltas.items()) if delta]
+  if not rows:
+    return
+  insert = postgres_insert if settings.DB_TYPE == 'postgres' else sqlite_insert
+  statement = insert(ViolationRollup)
+  statement = statement.on_conflict_do_update(
+    index_elements=list(ROLLUP_KEY),
+    set_={'count': ViolationRollup.count + statement.excluded.count}
+  )
+  await session.exec(statement, params=rows)
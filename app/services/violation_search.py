@@ -0,0 +1,91 @@
+import re
+from datetime import datetime
+from typing import Any, NamedTuple
+
+from sqlalchemy import column, false, func, text, tuple_
+from sqlmodel import select
+
+from app.core.config import settings
+from app.models.violation import Violation, postgres_extensions
+
+# FTS5's trigram tokenizer cannot match fewer than three characters
+MIN_TRIGRAM_LENGTH = 3
+
+class ViolationFilters(NamedTuple):
+  start: datetime | None = None
+  end: datetime | None = None
+  status: int | None = None
+  type: int | None = None
+  drone: str | None = None
+  location: str | None = None
+  plate_prefix: str | None = None
+  plate: str | None = None
+
+def search_terms(query: str) -> list[str]:
+  # Words only, so user input never reaches the FTS query syntax
+  return re.findall(r'\w+', query.lower())
+
+def escape_like(value: str) -> str:
+  return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def location_clause(query: str) -> Any:
+  terms = search_terms(query)
+  if not terms:
+    # Nothing searchable, e.g. only punctuation
+    return false()
+  # Every word must match; the last one may be a prefix, for search-as-you-type
+  if settings.DB_TYPE == 'postgres':
+    return text(
+      "to_tsvector('simple', coalesce(violation.location, '')) @@ to_tsquery('simple', :location_query)"
+    ).bindparams(location_query=' & '.join(terms) + ':*')
+  match = ' '.join(f'"{term}"' for term in terms) + '*'
+  return Violation.id.in_(
+    text('SELECT rowid FROM violation_location_fts WHERE violation_location_fts MATCH :location_query')
+    .bindparams(location_query=match)
+    .columns(column('rowid'))
+  )
+
+def plate_clause(plate: str) -> Any:
+  plate = plate.strip().upper()
+  if settings.DB_TYPE != 'postgres' and len(plate) >= MIN_TRIGRAM_LENGTH:
+    return Violation.id.in_(
+      text('SELECT rowid FROM violation_plate_fts WHERE violation_plate_fts MATCH :plate_query')
+      .bindparams(plate_query='"' + plate.replace('"', '""') + '"')
+      .columns(column('rowid'))
+    )
+  if settings.DB_TYPE == 'postgres' and 'pg_trgm' not in postgres_extensions:
+    # Without the trigram index a substring LIKE scans the table; match the
+    # start of the plate instead, off the upper(plate_number) index
+    return plate_prefix_clause(plate)
+  # Served by the pg_trgm index on Postgres; a scan for very short input on SQLite
+  return func.upper(Violation.plate_number).like(f'%{escape_like(plate)}%', escape='\\')
+
+def plate_prefix_clause(prefix: str) -> Any:
+  # A range rather than LIKE, so the upper(plate_number) index is usable
+  # whatever the collation or LIKE case sensitivity
+  prefix = prefix.strip().upper()
+  upper_bound = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+  plate = func.upper(Violation.plate_number)
+  return (plate >= prefix) & (plate < upper_bound)
+
+def search_statement(filters: ViolationFilters, after: tuple[datetime, int] | None = None) -> Any:
+  statement = select(Violation).order_by(Violation.timestamp.desc(), Violation.id.desc())
+  if filters.start:
+    statement = statement.where(Violation.timestamp >= filters.start)
+  if filters.end:
+    statement = statement.where(Violation.timestamp < filters.end)
+  for name in ('status', 'type', 'drone'):
+    value = getattr(filters, name)
+    if value is not None:
+      statement = statement.where(getattr(Violation, name) == value)
+  clauses = [
+    location_clause(filters.location) if filters.location else None,
+    plate_prefix_clause(filters.plate_prefix) if filters.plate_prefix and filters.plate_prefix.strip() else None,
+    plate_clause(filters.plate) if filters.plate and filters.plate.strip() else None,
+  ]
+  for clause in clauses:
+    if clause is not None:
+      statement = statement.where(clause)
+  if after:
+    statement = statement.where(tuple_(Violation.timestamp, Violation.id) < after)
+  return statement
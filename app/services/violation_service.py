@@ -1,14 +1,198 @@
-from sqlmodel import select, func
+from collections import deque
+from datetime import datetime
+from typing import AsyncIterator
+
+from sqlalchemy import insert, tuple_, update
+from sqlmodel import func, select
+from app.core.config import settings
+from app.core.pagination import decode_cursor
 from app.services.base_service import BaseService
-from app.models.violation import Violation
+from app.services.count_cache import get_count_cache
+from app.services.violation_broker import ViolationEvent, get_violation_broker
+from app.models.violation import Violation, ViolationChange, ViolationRollup
+from app.services.violation_rollup import apply_rollups, bucket_start, move_rollups
+from app.services.violation_search import ViolationFilters, search_statement
+
+STATS_DIMENSIONS = ('type', 'status', 'location', 'drone')
+REVIEW_OUTCOMES = ('updated', 'unchanged', 'conflict', 'not_found')
 
 class ViolationService(BaseService):
-  async def list_violations(self, skip: int = 0, limit: int = 100) -> list[Violation]:
-    with self.get_session() as session:
-      statement = select(Violation).order_by(Violation.timestamp.desc()).offset(skip).limit(limit)
-      return session.exec(statement).all()
+  async def list_violations(self, skip: int = 0, limit: int = 100, cursor: str | None = None) -> list[Violation]:
+    after = decode_cursor(cursor, int) if cursor else None
+
+    statement = select(Violation).order_by(Violation.timestamp.desc(), Violation.id.desc())
+    if after:
+      # Keyset: continue strictly after the last (timestamp, id) seen
+      statement = statement.where(tuple_(Violation.timestamp, Violation.id) < after)
+    else:
+      statement = statement.offset(skip)
+    async with self.get_async_session() as session:
+      return (await session.exec(statement.limit(limit))).all()
+
+  async def search(self, filters: ViolationFilters, limit: int = 100, cursor: str | None = None) -> list[Violation]:
+    # Keyset only: an exact total would cost a full count per filter combination
+    after = decode_cursor(cursor, int) if cursor else None
+    async with self.get_async_session() as session:
+      return (await session.exec(search_statement(filters, after).limit(limit))).all()
 
   async def count_violations(self) -> int:
-    with self.get_session() as session:
-      total = session.exec(select(func.count()).select_from(Violation)).first()
-      return total or 0
\ No newline at end of file
+    return await get_count_cache().count('violation', Violation)
+
+  async def stats(
+    self,
+    period: str = 'hour',
+    start: datetime | None = None,
+    end: datetime | None = None,
+    group_by: list[str] | None = None,
+    filters: dict | None = None
+  ) -> list[dict]:
+    # Served from the rollup table, so the cost follows the number of
+    # buckets and dimension combinations, not the number of violations
+    columns = [getattr(ViolationRollup, dimension) for dimension in group_by or []]
+    total = func.sum(ViolationRollup.count)
+    statement = select(ViolationRollup.bucket, *columns, total).where(ViolationRollup.period == period)
+    if start:
+      statement = statement.where(ViolationRollup.bucket >= bucket_start(start, period))
+    if end:
+      statement = statement.where(ViolationRollup.bucket < end)
+    for dimension, value in (filters or {}).items():
+      if value is not None:
+        statement = statement.where(getattr(ViolationRollup, dimension) == value)
+    statement = statement.group_by(ViolationRollup.bucket, *columns).having(total > 0).order_by(ViolationRollup.bucket, *columns)
+    async with self.get_async_session() as session:
+      rows = (await session.exec(statement)).all()
+    buckets = []
+    for bucket, *values, count in rows:
+      item = {'bucket': bucket, 'count': count}
+      for dimension, value in zip(group_by or [], values):
+        # '' stands in for a missing location or drone in the rollup key
+        item[dimension] = value if value != '' else None
+      buckets.append(item)
+    return buckets
+
+  async def review(
+    self,
+    status: int,
+    versions: dict[int, int | None] | None = None,
+    filters: ViolationFilters | None = None
+  ) -> tuple[list[tuple[int, str, int | None]], bool]:
+    # Sets the status of the given ids (each optionally at the version the
+    # reviewer saw) or of violations matching filters, in one transaction.
+    # Returns (id, outcome, version) per violation and whether more
+    # violations match the filters than one request may change.
+    limit = settings.VIOLATION_REVIEW_MAX_ITEMS
+    now = datetime.utcnow()
+    async with self.get_async_session() as session:
+      if versions is not None:
+        statement = select(Violation).where(Violation.id.in_(list(versions)))
+      else:
+        # Rows already at the target status are skipped, so repeating the
+        # request works through a large match set
+        statement = search_statement(filters).where(Violation.status != status).limit(limit + 1)
+      violations = (await session.exec(statement)).all()
+      has_more = len(violations) > limit
+      found = {violation.id: violation for violation in violations[:limit]}
+
+      outcomes: dict[int, tuple[str, int | None]] = {}
+      targets = []
+      for id in (versions if versions is not None else found):
+        violation = found.get(id)
+        if violation is None:
+          outcomes[id] = ('not_found', None)
+        elif versions and versions[id] is not None and versions[id] != violation.version:
+          outcomes[id] = ('conflict', violation.version)
+        elif violation.status == status:
+          outcomes[id] = ('unchanged', violation.version)
+        else:
+          # Placeholder that keeps the request order; replaced once updated
+          outcomes[id] = ('conflict', None)
+          targets.append(violation)
+
+      changed = []
+      if targets:
+        # One set-based UPDATE; the (id, version) guard turns a concurrent
+        # change since the read above into a conflict instead of a lost update
+        result = await session.exec(
+          update(Violation)
+          .where(tuple_(Violation.id, Violation.version).in_([(violation.id, violation.version) for violation in targets]))
+          .values(status=status, version=Violation.version + 1)
+          .returning(Violation.id, Violation.version)
+          .execution_options(synchronize_session=False)
+        )
+        new_versions = dict(result.all())
+        for violation in targets:
+          if violation.id in new_versions:
+            outcomes[violation.id] = ('updated', new_versions[violation.id])
+            changed.append(violation)
+
+      broker = get_violation_broker()
+      changes = []
+      if changed:
+        # The loaded rows still hold the previous status
+        await apply_rollups(session, move_rollups(changed, status))
+        rows = [
+          {
+            'violation_id': violation.id,
+            'previous_status': violation.status,
+            'status': status,
+            'version': outcomes[violation.id][1],
+            'changed_at': now,
+          }
+          for violation in changed
+        ]
+        if broker.polls_database:
+          # Plain executemany; the broker reads the rows back with their ids
+          await session.exec(insert(ViolationChange), params=rows)
+        else:
+          changes = [ViolationChange(**row) for row in rows]
+          session.add_all(changes)
+      await session.commit()
+
+    broker.publish(changes)
+    return [(id, outcome, version) for id, (outcome, version) in outcomes.items()], has_more
+
+  async def list_changes(self, after_id: int = 0, limit: int = 100) -> list[ViolationChange]:
+    statement = select(ViolationChange).where(ViolationChange.id > after_id).order_by(ViolationChange.id).limit(limit)
+    async with self.get_async_session() as session:
+      return (await session.exec(statement)).all()
+
+  async def list_after(self, after_id: int, limit: int = 100) -> list[Violation]:
+    statement = select(Violation).where(Violation.id > after_id).order_by(Violation.id).limit(limit)
+    async with self.get_async_session() as session:
+      return (await session.exec(statement)).all()
+
+  async def stream(self, after_id: int | None = None) -> AsyncIterator[ViolationEvent | None]:
+    # New violations and status changes as they are committed, after first
+    # replaying violations newer than after_id. Changes are not replayed;
+    # list_changes covers those. Yields None when idle so callers can send
+    # a keepalive; ends if the client falls too far behind.
+    broker = get_violation_broker()
+    subscription = await broker.subscribe()
+    try:
+      # Events buffered during the replay may already have been sent. They
+      # were committed after subscribing, so they are at the end of the
+      # replay; ids are not compared, as a lower id can commit late.
+      limit = settings.VIOLATION_STREAM_BACKFILL_LIMIT
+      recent: deque[int] = deque(maxlen=limit)
+      if after_id is not None:
+        last_id = after_id
+        while True:
+          violations = await self.list_after(last_id, limit)
+          for violation in violations:
+            last_id = violation.id
+            recent.append(violation.id)
+            yield violation
+          if len(violations) < limit:
+            break
+      replayed = set(recent)
+      while True:
+        try:
+          event = await subscription.get(settings.VIOLATION_STREAM_HEARTBEAT_SECONDS)
+        except OverflowError:
+          return
+        if event is None or isinstance(event, ViolationChange):
+          yield event
+        elif event.id not in replayed:
+          yield event
+    finally:
+      broker.unsubscribe(subscription)
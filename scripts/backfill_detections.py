@@ -0,0 +1,110 @@
+# scripts/backfill_detections.py
+import os
+import sys
+import json
+import argparse
+
+# Add project root to Python path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from sqlalchemy import exists, insert, tuple_
+from sqlmodel import Session, select
+from app.core.db import engine, init_db
+from app.models.detection import Detection
+from app.models.image import Image
+from app.models.violation import Violation
+from app.services.image_processing import parse_crop_name
+
+def load_violation_links(session: Session) -> dict[tuple[str, int], int]:
+  # Crops are named <stem>_violation_<driver index>.<ext>, so the driver a
+  # violation came from can be recovered from its URL. Every violation not
+  # yet linked to a detection is parsed once, instead of scanning the
+  # table for each image.
+  unlinked = (
+    select(Violation.id, Violation.image_url)
+    .where(~exists().where(Detection.violation_id == Violation.id))
+    .execution_options(yield_per=5000)
+  )
+  links = {}
+  for violation_id, image_url in session.exec(unlinked):
+    parsed = parse_crop_name(image_url)
+    if parsed is not None:
+      links[parsed] = violation_id
+  return links
+
+def build_rows(image: Image, violation_links: dict[tuple[str, int], int]) -> list[dict]:
+  predictions = json.loads(image.predictions)
+  stem = os.path.splitext(os.path.basename(image.filepath))[0]
+  rows = []
+  driver_index = 0
+  for pred in predictions:
+    violation_id = None
+    if pred['class_name'] == 'driver':
+      violation_id = violation_links.get((stem, driver_index))
+      driver_index += 1
+    rows.append({
+      'image_id': image.id,
+      'violation_id': violation_id,
+      'class_name': pred['class_name'],
+      'confidence': pred['confidence'],
+      'x': pred['x'],
+      'y': pred['y'],
+      'width': pred['width'],
+      'height': pred['height'],
+      'created_at': image.created_at,
+    })
+  return rows
+
+def backfill(batch_size: int, dry_run: bool) -> None:
+  # Adds the columns and tables newer code expects before anything is read
+  init_db()
+  with Session(engine) as session:
+    violation_links = load_violation_links(session)
+  # Images that have JSON predictions but no Detection rows yet, so the
+  # script can be re-run safely after an interruption
+  pending = (
+    select(Image)
+    .where(Image.predictions.isnot(None))
+    .where(~exists().where(Detection.image_id == Image.id))
+    .order_by(Image.created_at, Image.id)
+  )
+  total_images = 0
+  total_rows = 0
+  last_key = None
+  while True:
+    with Session(engine) as session:
+      statement = pending
+      if last_key is not None:
+        statement = statement.where(tuple_(Image.created_at, Image.id) > last_key)
+      images = session.exec(statement.limit(batch_size)).all()
+      if not images:
+        break
+      rows = []
+      for image in images:
+        try:
+          rows.extend(build_rows(image, violation_links))
+        except (ValueError, KeyError) as e:
+          print(f"Skipping image {image.id}: unreadable predictions ({str(e)})")
+      if rows and not dry_run:
+        session.exec(insert(Detection), params=rows)
+        session.commit()
+      last_key = (images[-1].created_at, images[-1].id)
+      total_images += len(images)
+      total_rows += len(rows)
+      print(f"Backfilled {total_images} images, {total_rows} detections")
+  print(f"{'Would insert' if dry_run else 'Inserted'} {total_rows} detections for {total_images} images")
+
+def main():
+  parser = argparse.ArgumentParser(description='Backfill Detection rows from the Image.predictions JSON column')
+  parser.add_argument('--batch-size', type=int, default=500)
+  parser.add_argument('--dry-run', action='store_true')
+  args = parser.parse_args()
+  try:
+    backfill(args.batch_size, args.dry_run)
+  except Exception as e:
+    print(f"Error during backfill: {str(e)}")
+    raise e
+
+if __name__ == "__main__":
+  main()
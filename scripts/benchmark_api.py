@@ -0,0 +1,414 @@
+# scripts/benchmark_api.py
+import os
+import sys
+import io
+import json
+import time
+import random
+import socket
+import asyncio
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+from datetime import datetime
+
+# Add project root to Python path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+DEFAULT_BASELINE = os.path.join(project_root, 'scripts', 'benchmark_baseline.json')
+SCENARIOS = ['single_upload', 'burst_batch', 'list_pagination', 'concurrent_delete']
+# Metric -> whether a larger value is better, for baseline comparison
+COMPARED_METRICS = {'throughput_rps': True, 'p50_ms': False, 'p99_ms': False, 'peak_rss_mb': False}
+
+def make_image(index: int, size: tuple[int, int] = (640, 480)) -> bytes:
+  # Shapes over a gradient so JPEG sizes resemble real frames, and distinct
+  # pixels per index so deduplication does not skip the work
+  from PIL import Image, ImageDraw
+  rng = random.Random(index)
+  image = Image.linear_gradient('L').resize(size).convert('RGB')
+  draw = ImageDraw.Draw(image)
+  width, height = size
+  for _ in range(40):
+    x, y = rng.randrange(width), rng.randrange(height)
+    color = (rng.randrange(256), rng.randrange(256), rng.randrange(256))
+    draw.rectangle((x, y, x + rng.randrange(10, 120), y + rng.randrange(10, 120)), fill=color)
+  buffer = io.BytesIO()
+  image.save(buffer, 'JPEG', quality=85)
+  return buffer.getvalue()
+
+def percentile(values: list[float], fraction: float) -> float:
+  if not values:
+    return 0.0
+  ordered = sorted(values)
+  return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def summarize(latencies: list[float], errors: int, elapsed: float, count: int | None = None) -> dict:
+  # count is the unit of work when one request carries several images
+  count = len(latencies) if count is None else count
+  return {
+    'requests': len(latencies),
+    'errors': errors,
+    'throughput_rps': count / elapsed if elapsed else 0.0,
+    'p50_ms': percentile(latencies, 0.50) * 1000,
+    'p90_ms': percentile(latencies, 0.90) * 1000,
+    'p99_ms': percentile(latencies, 0.99) * 1000,
+    'max_ms': max(latencies, default=0.0) * 1000,
+  }
+
+def process_tree_rss(pid: int) -> int:
+  # Resident bytes of a process and its children, read from /proc (Linux only)
+  children: dict[int, list[int]] = {}
+  for entry in os.listdir('/proc'):
+    if not entry.isdigit():
+      continue
+    try:
+      with open(f'/proc/{entry}/stat') as stat_file:
+        parent = int(stat_file.read().rsplit(')', 1)[1].split()[1])
+    except (OSError, IndexError, ValueError):
+      continue
+    children.setdefault(parent, []).append(int(entry))
+  total = 0
+  pending = [pid]
+  while pending:
+    current = pending.pop()
+    pending.extend(children.get(current, []))
+    try:
+      with open(f'/proc/{current}/status') as status_file:
+        for line in status_file:
+          if line.startswith('VmRSS:'):
+            total += int(line.split()[1]) * 1024
+    except OSError:
+      continue
+  return total
+
+class RssSampler:
+  # Samples the server's RSS in the background and keeps the peak
+  def __init__(self, pid: int, interval: float = 0.2):
+    self.pid = pid
+    self.interval = interval
+    self.peak = 0
+    self._stop = threading.Event()
+    self._thread = threading.Thread(target=self._run, daemon=True)
+
+  def __enter__(self) -> 'RssSampler':
+    self._thread.start()
+    return self
+
+  def __exit__(self, *exc) -> None:
+    self._stop.set()
+    self._thread.join()
+
+  def _run(self) -> None:
+    while True:
+      if os.path.isdir('/proc'):
+        self.peak = max(self.peak, process_tree_rss(self.pid))
+      if self._stop.wait(self.interval):
+        return
+
+def free_port() -> int:
+  with socket.socket() as sock:
+    sock.bind(('127.0.0.1', 0))
+    return sock.getsockname()[1]
+
+def wait_ready(url: str, process: subprocess.Popen, timeout: float = 60.0) -> None:
+  import httpx
+  deadline = time.monotonic() + timeout
+  while time.monotonic() < deadline:
+    if process.poll() is not None:
+      raise RuntimeError(f'{url} exited with code {process.returncode}')
+    try:
+      if httpx.get(url, timeout=1.0).status_code < 500:
+        return
+    except httpx.HTTPError:
+      pass
+    time.sleep(0.2)
+  raise RuntimeError(f'{url} did not come up within {timeout}s')
+
+class Stack:
+  # Fake detector plus the API under uvicorn, in a scratch directory with a
+  # fresh database, so every scenario starts from the same state
+  def __init__(self, args: argparse.Namespace):
+    self.args = args
+    self.processes: list[subprocess.Popen] = []
+    self._logs: list = []
+
+  def __enter__(self) -> 'Stack':
+    self._workdir = tempfile.TemporaryDirectory(prefix='etle-bench-')
+    workdir = self._workdir.name
+    detector_port = free_port()
+    self.port = free_port()
+    self.base_url = f'http://127.0.0.1:{self.port}'
+    env = {
+      **os.environ,
+      'PYTHONPATH': project_root,
+      'DETECTOR_BACKEND': 'roboflow',
+      'ROBOFLOW_MODEL_URL': f'http://127.0.0.1:{detector_port}/bench/1',
+      'BASE_URL': self.base_url,
+      'SQLITE_DB_FILE': 'benchmark.db',
+      'STORAGE_BACKEND': 'local',
+      'LOG_LEVEL': 'WARNING',
+    }
+    self._start([
+      sys.executable, os.path.join(project_root, 'scripts', 'fake_detector_server.py'),
+      '--port', str(detector_port),
+      '--latency-ms', str(self.args.detector_latency_ms),
+      '--jitter-ms', str(self.args.detector_jitter_ms),
+    ], workdir, env, 'detector.log')
+    wait_ready(f'http://127.0.0.1:{detector_port}/health', self.processes[-1])
+    # Create the schema once so workers do not race each other on startup
+    subprocess.run(
+      [sys.executable, '-c', 'import app.main; from app.core.db import init_db; init_db()'],
+      cwd=workdir, env=env, check=True, capture_output=True
+    )
+    self.app = self._start([
+      sys.executable, '-m', 'uvicorn', 'app.main:app',
+      '--host', '127.0.0.1', '--port', str(self.port),
+      '--workers', str(self.args.workers), '--log-level', 'warning',
+    ], workdir, env, 'app.log')
+    wait_ready(f'{self.base_url}{self.args.api_str}/image/list?size=1', self.app)
+    return self
+
+  def __exit__(self, *exc) -> None:
+    for process in reversed(self.processes):
+      process.terminate()
+      try:
+        process.wait(timeout=15)
+      except subprocess.TimeoutExpired:
+        process.kill()
+    for log in self._logs:
+      log.close()
+    self._workdir.cleanup()
+
+  def _start(self, command: list[str], workdir: str, env: dict, log_name: str) -> subprocess.Popen:
+    log = open(os.path.join(workdir, log_name), 'wb')
+    self._logs.append(log)
+    process = subprocess.Popen(command, cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+    self.processes.append(process)
+    return process
+
+class Scenario:
+  def __init__(self, client, api: str, args: argparse.Namespace):
+    self.client = client
+    self.api = api
+    self.args = args
+    self.semaphore = asyncio.Semaphore(args.concurrency)
+    self._next_image = 0
+
+  def images(self, count: int, duplicates: float = 0.0) -> list[bytes]:
+    # A fraction of repeats exercises shared blobs and the prediction cache
+    images = []
+    for _ in range(count):
+      if images and random.random() < duplicates:
+        images.append(random.choice(images))
+      else:
+        images.append(make_image(self._next_image))
+        self._next_image += 1
+    return images
+
+  async def timed(self, method: str, url: str, **kwargs) -> tuple[float, object]:
+    async with self.semaphore:
+      started = time.perf_counter()
+      response = await self.client.request(method, url, **kwargs)
+      return time.perf_counter() - started, response
+
+  async def upload_batch(self, images: list[bytes]) -> list[str]:
+    files = [('files', (f'frame_{i}.jpg', content, 'image/jpeg')) for i, content in enumerate(images)]
+    response = await self.client.post(f'{self.api}/image/upload/batch', files=files)
+    response.raise_for_status()
+    return [item['id'] for item in response.json()['items'] if item.get('id')]
+
+  async def seed(self, count: int, duplicates: float = 0.0) -> list[str]:
+    ids = []
+    images = self.images(count, duplicates)
+    for start in range(0, len(images), self.args.batch_size):
+      ids.extend(await self.upload_batch(images[start:start + self.args.batch_size]))
+    await self.wait_for_jobs(ids)
+    return ids
+
+  async def wait_for_jobs(self, ids: list[str], timeout: float = 600.0) -> float:
+    # Polls job status until every image has finished; returns the wait
+    started = time.perf_counter()
+    pending = set(ids)
+    while pending:
+      if time.perf_counter() - started > timeout:
+        raise RuntimeError(f'{len(pending)} prediction jobs still pending after {timeout}s')
+      batch = list(pending)
+      responses = await asyncio.gather(*(self.timed('GET', f'{self.api}/image/{image_id}/status') for image_id in batch))
+      for image_id, (_, response) in zip(batch, responses):
+        if response.status_code == 200 and response.json()['status'] in ('completed', 'failed'):
+          pending.discard(image_id)
+      if pending:
+        await asyncio.sleep(0.2)
+    return time.perf_counter() - started
+
+  async def single_upload(self) -> dict:
+    # One file per request, one request at a time
+    latencies = []
+    errors = 0
+    ids = []
+    started = time.perf_counter()
+    for content in self.images(self.args.uploads):
+      latency, response = await self.timed('POST', f'{self.api}/image/upload', files={'file': ('frame.jpg', content, 'image/jpeg')})
+      latencies.append(latency)
+      if response.is_success:
+        ids.append(response.json()['id'])
+      else:
+        errors += 1
+    accepted = time.perf_counter() - started
+    await self.wait_for_jobs(ids)
+    result = summarize(latencies, errors, accepted)
+    result['processed_per_second'] = len(ids) / (time.perf_counter() - started)
+    return result
+
+  async def burst_batch(self) -> dict:
+    # Many batch uploads at once, then wait for the job queue to drain
+    batches = [self.images(self.args.batch_size, duplicates=0.1) for _ in range(self.args.batches)]
+    files = [
+      [('files', (f'frame_{i}.jpg', content, 'image/jpeg')) for i, content in enumerate(batch)]
+      for batch in batches
+    ]
+    started = time.perf_counter()
+    responses = await asyncio.gather(*(self.timed('POST', f'{self.api}/image/upload/batch', files=batch) for batch in files))
+    accepted = time.perf_counter() - started
+    ids = []
+    errors = 0
+    for _, response in responses:
+      if response.is_success:
+        ids.extend(item['id'] for item in response.json()['items'] if item.get('id'))
+      else:
+        errors += 1
+    await self.wait_for_jobs(ids)
+    result = summarize([latency for latency, _ in responses], errors, accepted, count=len(ids))
+    result['images'] = len(ids)
+    result['processed_per_second'] = len(ids) / (time.perf_counter() - started)
+    return result
+
+  async def list_pagination(self) -> dict:
+    # Walks every page by cursor, then reads the deepest page by offset
+    await self.seed(self.args.list_items)
+    size = self.args.page_size
+    latencies = []
+    errors = 0
+    cursor = None
+    started = time.perf_counter()
+    while True:
+      params = {'size': size, **({'cursor': cursor} if cursor else {})}
+      latency, response = await self.timed('GET', f'{self.api}/image/list', params=params)
+      latencies.append(latency)
+      if response.status_code != 200:
+        errors += 1
+        break
+      cursor = response.json()['next_cursor']
+      if not cursor:
+        break
+    result = summarize(latencies, errors, time.perf_counter() - started)
+
+    last_page = max(1, (self.args.list_items + size - 1) // size)
+    offset_latencies = []
+    offset_errors = 0
+    started = time.perf_counter()
+    for _ in range(self.args.repeats):
+      latency, response = await self.timed('GET', f'{self.api}/image/list', params={'size': size, 'page': last_page})
+      offset_latencies.append(latency)
+      offset_errors += response.status_code != 200
+    result['deep_offset'] = summarize(offset_latencies, offset_errors, time.perf_counter() - started)
+    return result
+
+  async def concurrent_delete(self) -> dict:
+    # Duplicates make some deletes drop a shared blob and others only a reference
+    ids = await self.seed(self.args.delete_items, duplicates=0.25)
+    started = time.perf_counter()
+    responses = await asyncio.gather(*(self.timed('DELETE', f'{self.api}/image/{image_id}') for image_id in ids))
+    elapsed = time.perf_counter() - started
+    errors = sum(1 for _, response in responses if response.status_code != 204)
+    return summarize([latency for latency, _ in responses], errors, elapsed)
+
+async def run_scenario(name: str, stack: Stack, args: argparse.Namespace) -> dict:
+  import httpx
+  limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+  async with httpx.AsyncClient(base_url=stack.base_url, timeout=120.0, limits=limits) as client:
+    scenario = Scenario(client, args.api_str, args)
+    with RssSampler(stack.app.pid) as sampler:
+      result = await getattr(scenario, name)()
+    result['peak_rss_mb'] = sampler.peak / (1024 * 1024)
+  return result
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+  # Returns the regressions beyond tolerance and prints every change
+  regressions = []
+  print(f"\n{'scenario':<20} {'metric':<16} {'baseline':>10} {'current':>10} {'change':>8}")
+  for name, current in results['scenarios'].items():
+    previous = baseline.get('scenarios', {}).get(name)
+    if previous is None:
+      continue
+    for metric, higher_is_better in COMPARED_METRICS.items():
+      if not previous.get(metric) or metric not in current:
+        continue
+      change = (current[metric] - previous[metric]) / previous[metric]
+      worse = -change if higher_is_better else change
+      flag = ' !' if worse > tolerance else ''
+      print(f"{name:<20} {metric:<16} {previous[metric]:>10.1f} {current[metric]:>10.1f} {change:>+7.0%}{flag}")
+      if flag:
+        regressions.append(f'{name}.{metric} {change:+.0%}')
+  return regressions
+
+def main():
+  parser = argparse.ArgumentParser(description='Load scenarios against the API under uvicorn with a fake detector')
+  parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=SCENARIOS)
+  parser.add_argument('--workers', type=int, default=2)
+  parser.add_argument('--concurrency', type=int, default=32, help='Maximum in-flight requests')
+  parser.add_argument('--uploads', type=int, default=100, help='single_upload: files uploaded one by one')
+  parser.add_argument('--batches', type=int, default=8, help='burst_batch: concurrent batch requests')
+  parser.add_argument('--batch-size', type=int, default=25, help='Files per batch request')
+  parser.add_argument('--list-items', type=int, default=1000, help='list_pagination: images to page through')
+  parser.add_argument('--page-size', type=int, default=50)
+  parser.add_argument('--repeats', type=int, default=20, help='list_pagination: deep offset reads')
+  parser.add_argument('--delete-items', type=int, default=200, help='concurrent_delete: images deleted at once')
+  parser.add_argument('--detector-latency-ms', type=float, default=50.0)
+  parser.add_argument('--detector-jitter-ms', type=float, default=10.0)
+  parser.add_argument('--api-str', default='/api')
+  parser.add_argument('--seed', type=int, default=0)
+  parser.add_argument('--output', help='Write the results as JSON to this file')
+  parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='Baseline to compare against')
+  parser.add_argument('--save-baseline', action='store_true', help='Overwrite the baseline with these results')
+  parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed relative regression before failing')
+  args = parser.parse_args()
+  random.seed(args.seed)
+
+  results = {
+    'created_at': datetime.utcnow().isoformat(),
+    'environment': {
+      'python': platform.python_version(),
+      'platform': platform.platform(),
+      'cpus': os.cpu_count(),
+    },
+    'parameters': {key: value for key, value in vars(args).items() if key not in ('output', 'baseline', 'save_baseline', 'scenarios')},
+    'scenarios': {},
+  }
+  print(f"{'scenario':<20} {'req/s':>8} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'errors':>7} {'peak RSS MB':>12}")
+  for name in args.scenarios:
+    with Stack(args) as stack:
+      result = asyncio.run(run_scenario(name, stack, args))
+    results['scenarios'][name] = result
+    print(f"{name:<20} {result['throughput_rps']:>8.1f} {result['p50_ms']:>8.1f} {result['p90_ms']:>8.1f} {result['p99_ms']:>8.1f} {result['errors']:>7} {result['peak_rss_mb']:>12.1f}")
+
+  if args.output:
+    with open(args.output, 'w') as out_file:
+      json.dump(results, out_file, indent=2)
+  if args.save_baseline:
+    with open(args.baseline, 'w') as out_file:
+      json.dump(results, out_file, indent=2)
+    print(f"Baseline written to {args.baseline}")
+    return
+  if os.path.exists(args.baseline):
+    with open(args.baseline) as in_file:
+      regressions = compare(results, json.load(in_file), args.tolerance)
+    if regressions:
+      print(f"Regressions beyond {args.tolerance:.0%}: {', '.join(regressions)}")
+      sys.exit(1)
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,74 @@
+# scripts/benchmark_matching.py
+import os
+import sys
+import argparse
+import random
+import timeit
+
+# Add project root to Python path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from app.models.prediction import BoundingBox
+from app.services.matching import boxes_to_array, match_helmets
+
+IMAGE_SIZE = (3840, 2160)
+
+def make_scene(drivers: int, helmets: int, seed: int = 0) -> tuple[list[BoundingBox], list[BoundingBox]]:
+  rng = random.Random(seed)
+  width, height = IMAGE_SIZE
+
+  def box(class_name: str, size: float) -> BoundingBox:
+    return BoundingBox(
+      x=rng.uniform(0, width),
+      y=rng.uniform(0, height),
+      width=size * rng.uniform(0.8, 1.2),
+      height=size * rng.uniform(1.5, 2.5),
+      confidence=rng.uniform(0.4, 1.0),
+      class_name=class_name
+    )
+  return [box('driver', 80) for _ in range(drivers)], [box('helmet', 30) for _ in range(helmets)]
+
+def legacy_match(driver_boxes: list[BoundingBox], helmet_boxes: list[BoundingBox]) -> list[int]:
+  # The original nested-loop matcher, kept here as the baseline
+  matches = []
+  for driver in driver_boxes:
+    closest, min_distance = -1, float('inf')
+    for j, helmet in enumerate(helmet_boxes):
+      distance = ((driver.x - helmet.x) ** 2 + (driver.y - helmet.y) ** 2) ** 0.5
+      if distance < min_distance and distance < 200:
+        min_distance, closest = distance, j
+    matches.append(closest)
+  return matches
+
+def vectorized_match(driver_boxes: list[BoundingBox], helmet_boxes: list[BoundingBox], one_to_one: bool) -> list[int]:
+  return match_helmets(
+    boxes_to_array(driver_boxes),
+    boxes_to_array(helmet_boxes),
+    IMAGE_SIZE,
+    max_distance=200 / (IMAGE_SIZE[0] ** 2 + IMAGE_SIZE[1] ** 2) ** 0.5,
+    one_to_one=one_to_one
+  ).tolist()
+
+def main():
+  parser = argparse.ArgumentParser(description='Benchmark driver/helmet matching on crowded scenes')
+  parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 300, 1000])
+  parser.add_argument('--repeat', type=int, default=5)
+  args = parser.parse_args()
+
+  print(f"{'boxes':>6} {'legacy ms':>10} {'greedy ms':>10} {'1:1 ms':>10} {'speedup':>8}")
+  for size in args.sizes:
+    drivers, helmets = make_scene(size, size)
+    number = max(1, 2000 // size)
+    timings = {}
+    for name, fn in (
+      ('legacy', lambda: legacy_match(drivers, helmets)),
+      ('greedy', lambda: vectorized_match(drivers, helmets, one_to_one=False)),
+      ('one_to_one', lambda: vectorized_match(drivers, helmets, one_to_one=True)),
+    ):
+      timings[name] = min(timeit.repeat(fn, number=number, repeat=args.repeat)) / number * 1000
+    speedup = timings['legacy'] / timings['greedy']
+    print(f"{size:>6} {timings['legacy']:>10.3f} {timings['greedy']:>10.3f} {timings['one_to_one']:>10.3f} {speedup:>7.1f}x")
+
+if __name__ == "__main__":
+  main()
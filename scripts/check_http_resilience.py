@@ -0,0 +1,242 @@
+# scripts/check_http_resilience.py
+import os
+import sys
+import time
+import socket
+import asyncio
+import argparse
+import subprocess
+
+# Add project root to Python path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+import httpx
+from fastapi import HTTPException
+from app.core.config import settings
+from app.core.exceptions import UpstreamUnavailableException
+from app.core.http import CircuitBreaker, ResilientClient, close_http_client
+from app.services.batch_scheduler import BatchScheduler
+from app.services.detector import RoboflowDetector
+
+CASE_TIMEOUT_SECONDS = 10.0
+DEFAULTS = {'latency_ms': 5.0, 'jitter_ms': 0.0, 'error_rate': 0.0, 'fail_next': 0, 'retry_after': None}
+
+def free_port() -> int:
+  with socket.socket() as sock:
+    sock.bind(('127.0.0.1', 0))
+    return sock.getsockname()[1]
+
+def wait_ready(url: str, process: subprocess.Popen, timeout: float = 30.0) -> None:
+  deadline = time.monotonic() + timeout
+  while time.monotonic() < deadline:
+    if process.poll() is not None:
+      raise RuntimeError(f'{url} exited with code {process.returncode}')
+    try:
+      if httpx.get(url, timeout=1.0).status_code < 500:
+        return
+    except httpx.HTTPError:
+      pass
+    time.sleep(0.2)
+  raise RuntimeError(f'{url} did not come up within {timeout}s')
+
+class Detector:
+  # The fake detector server, reconfigured between cases through /control
+  def __init__(self, base_url: str):
+    self.base_url = base_url
+    self.url = f'{base_url}/check/1'
+
+  def configure(self, **changes) -> None:
+    # Requests a client gave up on may still be running on the server;
+    # wait for them so they do not consume the next case's failures
+    deadline = time.monotonic() + CASE_TIMEOUT_SECONDS
+    while httpx.get(f'{self.base_url}/health').json()['in_flight'] and time.monotonic() < deadline:
+      time.sleep(0.05)
+    httpx.put(f'{self.base_url}/control', json={**DEFAULTS, **changes}).raise_for_status()
+
+  def requests(self) -> int:
+    return httpx.get(f'{self.base_url}/health').json()['requests']
+
+def make_client(**kwargs) -> ResilientClient:
+  options = {'timeout': 2.0, 'max_retries': 0, 'backoff': 0.01, 'max_backoff': 0.2, 'breaker': CircuitBreaker(3, 0.3)}
+  return ResilientClient(**{**options, **kwargs})
+
+async def post(client: ResilientClient, detector: Detector) -> httpx.Response:
+  return await client.post(detector.url, files={'file': b'frame'})
+
+async def rejects(client: ResilientClient, detector: Detector) -> bool:
+  try:
+    await post(client, detector)
+  except UpstreamUnavailableException:
+    return True
+  return False
+
+async def open_breaker(client: ResilientClient, detector: Detector) -> None:
+  detector.configure(fail_next=client.breaker.failure_threshold)
+  for _ in range(client.breaker.failure_threshold):
+    await post(client, detector)
+
+async def check_retry_recovers(detector: Detector) -> str | None:
+  client = make_client(max_retries=3)
+  detector.configure(fail_next=2)
+  response = await post(client, detector)
+  if response.status_code != 200 or client.retries != 2:
+    return f'expected 200 after 2 retries, got {response.status_code} after {client.retries}'
+
+async def check_retries_exhausted(detector: Detector) -> str | None:
+  client = make_client(max_retries=2)
+  detector.configure(fail_next=10)
+  response = await post(client, detector)
+  if response.status_code != 503 or client.retries != 2 or client.failures != 1:
+    return f'expected 503 after 2 retries, got {response.status_code} after {client.retries}'
+
+async def check_breaker_opens(detector: Detector) -> str | None:
+  client = make_client()
+  await open_breaker(client, detector)
+  if client.breaker.state != CircuitBreaker.OPEN:
+    return f'breaker is {client.breaker.state} after {client.breaker.failure_threshold} failures'
+  before = detector.requests()
+  if not await rejects(client, detector) or detector.requests() != before:
+    return 'open breaker let a request through'
+
+async def check_breaker_closes(detector: Detector) -> str | None:
+  client = make_client()
+  await open_breaker(client, detector)
+  await asyncio.sleep(client.breaker.reset_timeout)
+  detector.configure()
+  response = await post(client, detector)
+  if response.status_code != 200 or client.breaker.state != CircuitBreaker.CLOSED:
+    return f'probe got {response.status_code}, breaker is {client.breaker.state}'
+
+async def check_failed_probe_reopens(detector: Detector) -> str | None:
+  client = make_client()
+  await open_breaker(client, detector)
+  await asyncio.sleep(client.breaker.reset_timeout)
+  detector.configure(fail_next=1)
+  await post(client, detector)
+  if client.breaker.state != CircuitBreaker.OPEN or not await rejects(client, detector):
+    return f'breaker is {client.breaker.state} after a failed probe'
+
+async def check_cancelled_probe(detector: Detector) -> str | None:
+  client = make_client()
+  await open_breaker(client, detector)
+  await asyncio.sleep(client.breaker.reset_timeout)
+  detector.configure(latency_ms=1000)
+  probe = asyncio.create_task(post(client, detector))
+  await asyncio.sleep(0.1)
+  probe.cancel()
+  await asyncio.gather(probe, return_exceptions=True)
+  detector.configure()
+  try:
+    response = await post(client, detector)
+  except UpstreamUnavailableException:
+    return 'breaker stayed half-open after its probe was cancelled'
+  if response.status_code != 200 or client.breaker.state != CircuitBreaker.CLOSED:
+    return f'next probe got {response.status_code}, breaker is {client.breaker.state}'
+
+async def check_stale_failure_during_probe(detector: Detector) -> str | None:
+  # A request that started before the breaker opened fails while the probe
+  # is still out; the probe slot must stay taken
+  breaker = CircuitBreaker(1, 0.0)
+  breaker.record_failure()
+  if not breaker.allow():
+    return 'no probe let through after the reset timeout'
+  breaker.record_failure()
+  if breaker.allow():
+    return 'a second probe was let through while the first was in flight'
+  breaker.record_success(probe=True)
+  if breaker.state != CircuitBreaker.CLOSED or not breaker.allow():
+    return f'breaker is {breaker.state} after the probe succeeded'
+
+async def check_timeout(detector: Detector) -> str | None:
+  client = make_client(timeout=0.2, max_retries=1)
+  detector.configure(latency_ms=1000)
+  started = time.monotonic()
+  try:
+    await post(client, detector)
+  except UpstreamUnavailableException:
+    elapsed = time.monotonic() - started
+    if elapsed > 1.0:
+      return f'timed out only after {elapsed:.2f}s'
+    return None
+  return 'slow upstream did not time out'
+
+async def check_retry_after_capped(detector: Detector) -> str | None:
+  client = make_client(max_retries=1)
+  detector.configure(fail_next=1, retry_after=3600)
+  started = time.monotonic()
+  response = await post(client, detector)
+  elapsed = time.monotonic() - started
+  if response.status_code != 200 or elapsed > client.max_backoff + 0.5:
+    return f'got {response.status_code} after {elapsed:.2f}s with Retry-After: 3600'
+
+async def check_partial_batch_failure(detector: Detector) -> str | None:
+  # The detector goes through the shared client; no retries, so every
+  # request the server sees is a first attempt
+  settings.HTTP_MAX_RETRIES = 0
+  await close_http_client()
+  scheduler = BatchScheduler(RoboflowDetector(model_url=detector.url, api_key='check'), max_batch_size=4, max_wait_ms=50)
+  detector.configure(fail_next=1)
+  before = detector.requests()
+  try:
+    results = await asyncio.gather(*(scheduler.submit(f'frame {i}'.encode()) for i in range(4)), return_exceptions=True)
+  finally:
+    await close_http_client()
+  calls = detector.requests() - before
+  failed = sum(isinstance(result, HTTPException) for result in results)
+  if calls != 4 or failed != 1:
+    return f'{calls} detector calls and {failed} failed images for a batch of 4 with one failure'
+
+CASES = [
+  ('retries recover from transient 503s', check_retry_recovers),
+  ('retries stop at max_retries', check_retries_exhausted),
+  ('breaker opens and fails fast', check_breaker_opens),
+  ('successful probe closes the breaker', check_breaker_closes),
+  ('failed probe reopens the breaker', check_failed_probe_reopens),
+  ('cancelled probe does not wedge the breaker', check_cancelled_probe),
+  ('stale failure does not admit a second probe', check_stale_failure_during_probe),
+  ('slow upstream times out', check_timeout),
+  ('Retry-After is capped', check_retry_after_capped),
+  ('partial batch failure is not re-sent', check_partial_batch_failure),
+]
+
+async def run_cases(detector: Detector) -> int:
+  failures = 0
+  for name, case in CASES:
+    try:
+      # A stuck retry or breaker shows up as a failure, not a hang
+      error = await asyncio.wait_for(case(detector), CASE_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+      error = f'did not finish within {CASE_TIMEOUT_SECONDS}s'
+    failures += error is not None
+    print(f"{'ok  ' if error is None else 'FAIL'} {name}" + (f": {error}" if error else ''))
+  print(f"{len(CASES) - failures}/{len(CASES)} resilience checks passed")
+  return failures
+
+def check(port: int | None) -> int:
+  port = port or free_port()
+  base_url = f'http://127.0.0.1:{port}'
+  process = subprocess.Popen(
+    [sys.executable, os.path.join(project_root, 'scripts', 'fake_detector_server.py'), '--port', str(port)],
+    stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT
+  )
+  try:
+    wait_ready(f'{base_url}/health', process)
+    return asyncio.run(run_cases(Detector(base_url)))
+  finally:
+    process.terminate()
+    process.wait(timeout=10)
+
+def main():
+  parser = argparse.ArgumentParser(description='Check retries, timeouts and the circuit breaker against the fake detector')
+  parser.add_argument('--port', type=int, default=None, help='Port for the fake detector (default: any free port)')
+  args = parser.parse_args()
+  try:
+    failures = check(args.port)
+  except Exception as e:
+    print(f"Error during resilience check: {str(e)}")
+    raise e
+  sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,97 @@
+# scripts/check_query_plans.py
+import os
+import sys
+import argparse
+from datetime import datetime, timedelta
+
+# Add project root to Python path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ClauseElement, Executable
+from app.core.db import engine, init_db
+from app.models.violation import postgres_extensions
+from app.services.violation_search import ViolationFilters, search_statement
+
+class Explain(Executable, ClauseElement):
+  inherit_cache = False
+
+  def __init__(self, statement):
+    self.statement = statement
+
+@compiles(Explain)
+def compile_explain(element, compiler, **kw):
+  prefix = 'EXPLAIN QUERY PLAN ' if compiler.dialect.name == 'sqlite' else 'EXPLAIN '
+  return prefix + compiler.process(element.statement, **kw)
+
+NOW = datetime(2024, 1, 1)
+
+# Each search filter and the index (or FTS table) its plan must mention,
+# per dialect
+CASES = [
+  ('time range', ViolationFilters(start=NOW - timedelta(days=1), end=NOW), {
+    'sqlite': 'ix_violation_timestamp_id', 'postgresql': 'ix_violation_timestamp_id'}),
+  ('status', ViolationFilters(status=1), {
+    'sqlite': 'ix_violation_status_timestamp_id', 'postgresql': 'ix_violation_status_timestamp_id'}),
+  ('type', ViolationFilters(type=1), {
+    'sqlite': 'ix_violation_type_timestamp_id', 'postgresql': 'ix_violation_type_timestamp_id'}),
+  ('drone', ViolationFilters(drone='drone-1'), {
+    'sqlite': 'ix_violation_drone_timestamp_id', 'postgresql': 'ix_violation_drone_timestamp_id'}),
+  ('status and time range', ViolationFilters(status=0, start=NOW - timedelta(days=1), end=NOW), {
+    'sqlite': 'ix_violation_status_timestamp_id', 'postgresql': 'ix_violation_status_timestamp_id'}),
+  ('plate prefix', ViolationFilters(plate_prefix='b 12'), {
+    'sqlite': 'ix_violation_plate_upper', 'postgresql': 'ix_violation_plate_upper'}),
+  ('plate substring', ViolationFilters(plate='234'), {
+    'sqlite': 'violation_plate_fts', 'postgresql': 'ix_violation_plate_trgm'}),
+  ('location text', ViolationFilters(location='jalan sudir'), {
+    'sqlite': 'violation_location_fts', 'postgresql': 'ix_violation_location_tsv'}),
+]
+
+def explain(connection, filters: ViolationFilters) -> list[str]:
+  rows = connection.execute(Explain(search_statement(filters).limit(10))).all()
+  # SQLite returns (id, parent, notused, detail); Postgres one text column
+  return [row[-1] for row in rows]
+
+def is_full_scan(line: str) -> bool:
+  # A plain table scan in SQLite, or a sequential scan in Postgres
+  return (line.startswith('SCAN violation') and 'INDEX' not in line and 'VIRTUAL TABLE' not in line) or 'Seq Scan on violation' in line
+
+def check(verbose: bool) -> int:
+  init_db()
+  failures = 0
+  with engine.connect() as connection:
+    dialect = connection.dialect.name
+    if dialect == 'postgresql':
+      # Small tables are cheaper to scan; the point is that the index is usable
+      connection.exec_driver_sql('SET enable_seqscan = off')
+    for name, filters, expected in CASES:
+      plan = explain(connection, filters)
+      index = expected[dialect]
+      if index == 'ix_violation_plate_trgm' and 'pg_trgm' not in postgres_extensions:
+        # Without the extension plate search falls back to the prefix index
+        index = 'ix_violation_plate_upper'
+      uses_index = any(index in line for line in plan)
+      full_scan = any(is_full_scan(line.strip()) for line in plan)
+      ok = uses_index and not full_scan
+      failures += not ok
+      print(f"{'ok  ' if ok else 'FAIL'} {name}: expects {index}")
+      if verbose or not ok:
+        for line in plan:
+          print(f"       {line}")
+  print(f"{len(CASES) - failures}/{len(CASES)} search plans use their index")
+  return failures
+
+def main():
+  parser = argparse.ArgumentParser(description='Check that violation search queries use their indexes')
+  parser.add_argument('--verbose', action='store_true', help='Print every plan, not just failing ones')
+  args = parser.parse_args()
+  try:
+    failures = check(args.verbose)
+  except Exception as e:
+    print(f"Error during query plan check: {str(e)}")
+    raise e
+  sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+  main()
@@ -44,6 +44,12 @@ def cleanup_images():
   os.makedirs(cropped_dir)
   print("Predicted images directory cleaned and recreated!")
 
+  print("Cleaning up resized images...")
+  derivatives_dir = os.path.join(project_root, settings.DERIVATIVES_DIR)
+  if os.path.exists(derivatives_dir):
+    shutil.rmtree(derivatives_dir)
+  print("Resized images directory removed!")
+
 def main():
   print("Starting cleanup process...")
   try:
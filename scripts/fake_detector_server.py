@@ -0,0 +1,91 @@
+# scripts/fake_detector_server.py
+import os
+import sys
+import asyncio
+import hashlib
+import random
+import argparse
+
+# Add project root to Python path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from fastapi import FastAPI, HTTPException, Request, status
+
+def make_predictions(content: bytes, drivers: int, helmets: int) -> list[dict]:
+  # Seeded by the upload so the same frame always gets the same boxes
+  rng = random.Random(hashlib.sha256(content).digest())
+  width, height = 640, 480
+
+  def box(class_name: str, size: float) -> dict:
+    return {
+      'x': rng.uniform(size, width - size),
+      'y': rng.uniform(size, height - size),
+      'width': size * rng.uniform(0.8, 1.2),
+      'height': size * rng.uniform(1.5, 2.0),
+      'confidence': rng.uniform(0.5, 1.0),
+      'class': class_name,
+    }
+  return [box('driver', 60) for _ in range(drivers)] + [box('helmet', 20) for _ in range(helmets)]
+
+def create_app(latency_ms: float, jitter_ms: float, drivers: int, helmets: int, error_rate: float) -> FastAPI:
+  # Answers like the hosted Roboflow model, after a tunable delay. PUT
+  # /control changes the behaviour of a running server, e.g. to fail the
+  # next few requests or to answer with Retry-After.
+  app = FastAPI()
+  app.state.requests = 0
+  app.state.in_flight = 0
+  app.state.config = {
+    'latency_ms': latency_ms,
+    'jitter_ms': jitter_ms,
+    'error_rate': error_rate,
+    'fail_next': 0,
+    'retry_after': None,
+  }
+
+  @app.put('/control')
+  async def control(request: Request) -> dict:
+    app.state.config.update(await request.json())
+    return app.state.config
+
+  @app.get('/health')
+  async def health() -> dict:
+    return {'requests': app.state.requests, 'in_flight': app.state.in_flight}
+
+  @app.post('/{model:path}')
+  async def predict(request: Request, model: str) -> dict:
+    app.state.requests += 1
+    app.state.in_flight += 1
+    try:
+      config = app.state.config
+      form = await request.form()
+      upload = form.get('file')
+      content = await upload.read() if hasattr(upload, 'read') else str(upload or '').encode()
+      await asyncio.sleep(max(0.0, config['latency_ms'] + random.uniform(-config['jitter_ms'], config['jitter_ms'])) / 1000)
+      if config['fail_next'] > 0 or random.random() < config['error_rate']:
+        config['fail_next'] = max(0, config['fail_next'] - 1)
+        headers = {'Retry-After': str(config['retry_after'])} if config['retry_after'] is not None else None
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail='Injected failure', headers=headers)
+      return {'predictions': make_predictions(content, drivers, helmets)}
+    finally:
+      app.state.in_flight -= 1
+
+  return app
+
+def main():
+  parser = argparse.ArgumentParser(description='Stand-in for the Roboflow detector with tunable latency')
+  parser.add_argument('--host', default='127.0.0.1')
+  parser.add_argument('--port', type=int, default=9100)
+  parser.add_argument('--latency-ms', type=float, default=50.0)
+  parser.add_argument('--jitter-ms', type=float, default=10.0)
+  parser.add_argument('--drivers', type=int, default=2)
+  parser.add_argument('--helmets', type=int, default=1)
+  parser.add_argument('--error-rate', type=float, default=0.0)
+  args = parser.parse_args()
+
+  import uvicorn
+  app = create_app(args.latency_ms, args.jitter_ms, args.drivers, args.helmets, args.error_rate)
+  uvicorn.run(app, host=args.host, port=args.port, log_level='warning')
+
+if __name__ == "__main__":
+  main()
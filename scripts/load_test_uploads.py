@@ -0,0 +1,114 @@
+# scripts/load_test_uploads.py
+import os
+import sys
+import io
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import subprocess
+
+# Add project root to Python path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+# Engine settings of the original hard-coded engine vs the tuned defaults
+PROFILES = {
+  'legacy': {
+    'DB_ECHO': 'true',
+    'SQLITE_WAL': 'false',
+    'SQLITE_SYNCHRONOUS': 'FULL',
+    'SQLITE_MMAP_SIZE': '0',
+  },
+  'tuned': {},
+}
+
+def make_image(index: int) -> bytes:
+  from PIL import Image
+  buffer = io.BytesIO()
+  # Distinct pixels per upload so deduplication doesn't skip the work
+  Image.new('RGB', (640, 480), (index % 256, (index // 256) % 256, 128)).save(buffer, 'JPEG')
+  return buffer.getvalue()
+
+async def run_load(uploads: int, concurrency: int) -> dict:
+  import httpx
+  from app.models.prediction import BoundingBox
+  from app.services import detector
+
+  class FakeDetector(detector.BaseDetector):
+    name = 'fake'
+
+    def predict(self, source):
+      return [
+        BoundingBox(x=100, y=100, width=50, height=80, confidence=0.9, class_name='driver'),
+        BoundingBox(x=400, y=300, width=50, height=80, confidence=0.8, class_name='driver'),
+      ]
+
+  detector.DETECTOR_BACKENDS['roboflow'] = FakeDetector
+
+  from app.main import app
+  from app.services.job_queue import get_job_queue
+
+  images = [make_image(i) for i in range(uploads)]
+  semaphore = asyncio.Semaphore(concurrency)
+  latencies = []
+
+  async with app.router.lifespan_context(app):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://test') as client:
+      async def upload(content: bytes) -> None:
+        async with semaphore:
+          started = time.perf_counter()
+          response = await client.post('/api/image/upload', files={'file': ('frame.jpg', content, 'image/jpeg')})
+          response.raise_for_status()
+          latencies.append(time.perf_counter() - started)
+
+      started = time.perf_counter()
+      await asyncio.gather(*(upload(content) for content in images))
+      accepted = time.perf_counter() - started
+      await get_job_queue().join()
+      finished = time.perf_counter() - started
+
+  latencies.sort()
+  return {
+    'uploads': uploads,
+    'concurrency': concurrency,
+    'upload_per_second': uploads / accepted,
+    'processed_per_second': uploads / finished,
+    'p50_ms': latencies[len(latencies) // 2] * 1000,
+    'p99_ms': latencies[int(len(latencies) * 0.99) - 1] * 1000,
+  }
+
+def run_profile(profile: str, uploads: int, concurrency: int) -> dict:
+  # Each profile runs in a fresh process and directory because the engine
+  # is configured once at import time
+  with tempfile.TemporaryDirectory() as workdir:
+    env = {**os.environ, **PROFILES[profile], 'SQLITE_DB_FILE': 'load_test.db'}
+    result = subprocess.run(
+      [sys.executable, os.path.abspath(__file__), '--child', '--uploads', str(uploads), '--concurrency', str(concurrency)],
+      cwd=workdir, env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+      raise RuntimeError(result.stderr)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def main():
+  parser = argparse.ArgumentParser(description='Concurrent upload throughput with legacy vs tuned database engine settings')
+  parser.add_argument('--uploads', type=int, default=200)
+  parser.add_argument('--concurrency', type=int, default=32)
+  parser.add_argument('--profiles', nargs='+', choices=PROFILES, default=list(PROFILES))
+  parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+  args = parser.parse_args()
+
+  if args.child:
+    print(json.dumps(asyncio.run(run_load(args.uploads, args.concurrency))))
+    return
+
+  print(f"{'profile':>8} {'uploads/s':>10} {'processed/s':>12} {'p50 ms':>8} {'p99 ms':>8}")
+  for profile in args.profiles:
+    stats = run_profile(profile, args.uploads, args.concurrency)
+    print(f"{profile:>8} {stats['upload_per_second']:>10.1f} {stats['processed_per_second']:>12.1f} {stats['p50_ms']:>8.1f} {stats['p99_ms']:>8.1f}")
+
+if __name__ == "__main__":
+  main()
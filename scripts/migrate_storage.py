@@ -0,0 +1,136 @@
+# scripts/migrate_storage.py
+import os
+import sys
+import argparse
+
+# Add project root to Python path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from sqlalchemy import delete, tuple_, update
+from sqlmodel import Session, select
+from app.core.config import settings
+from app.core.db import engine, init_db
+from app.core.storage import get_crop_storage, get_image_storage
+from app.models.image import Image, ImageBlob, ImageCrop
+from app.models.prediction import PredictionCacheEntry
+from app.models.violation import Violation
+from app.services.prediction_writer import violation_url
+
+def move_file(storage, legacy_path: str, key: str, dry_run: bool) -> bool:
+  # Legacy files sit flat in the upload and crop directories
+  if not os.path.isfile(legacy_path):
+    return False
+  if not dry_run:
+    storage.save(key, legacy_path)
+  return True
+
+def migrate_images(batch_size: int, dry_run: bool) -> None:
+  images = get_image_storage()
+  total = 0
+  moved = 0
+  last_key = None
+  while True:
+    with Session(engine) as session:
+      statement = select(Image).order_by(Image.created_at, Image.id)
+      if last_key is not None:
+        statement = statement.where(tuple_(Image.created_at, Image.id) > last_key)
+      rows = session.exec(statement.limit(batch_size)).all()
+      if not rows:
+        break
+      updates = []
+      for image in rows:
+        key = images.key_for(os.path.basename(image.filepath))
+        if image.filepath == key:
+          continue
+        if move_file(images, image.filepath, key, dry_run):
+          moved += 1
+        updates.append({'id': image.id, 'filepath': key})
+      if updates and not dry_run:
+        session.exec(update(Image), params=updates)
+        session.commit()
+      last_key = (rows[-1].created_at, rows[-1].id)
+      total += len(updates)
+      print(f"Migrated {total} image rows, {moved} files")
+
+  with Session(engine) as session:
+    blobs = session.exec(select(ImageBlob)).all()
+    updates = []
+    for blob in blobs:
+      key = images.key_for(os.path.basename(blob.filepath))
+      if blob.filepath != key:
+        # Usually moved with its first image above; this catches strays
+        move_file(images, blob.filepath, key, dry_run)
+        updates.append({'content_hash': blob.content_hash, 'filepath': key})
+    if updates and not dry_run:
+      session.exec(update(ImageBlob), params=updates)
+      session.commit()
+    print(f"Migrated {len(updates)} blob rows")
+
+def migrate_crops(batch_size: int, dry_run: bool) -> None:
+  crops = get_crop_storage()
+  crop_dir = settings.CROPPED_IMAGES_DIR
+  names = [name for name in os.listdir(crop_dir) if os.path.isfile(os.path.join(crop_dir, name))] if os.path.isdir(crop_dir) else []
+  for start in range(0, len(names), batch_size):
+    chunk = names[start:start + batch_size]
+    with Session(engine) as session:
+      keys = {crops.key_for(name): name for name in chunk}
+      known = set(session.exec(select(ImageCrop.key).where(ImageCrop.key.in_(list(keys)))).all())
+      for key, name in keys.items():
+        move_file(crops, os.path.join(crop_dir, name), key, dry_run)
+        if key not in known:
+          # Crops are named <frame stem>_violation_<driver index>.<ext>
+          owner = name.rsplit('_violation_', 1)[0]
+          session.add(ImageCrop(key=key, content_hash=owner))
+      if not dry_run:
+        session.commit()
+    print(f"Migrated {min(start + batch_size, len(names))}/{len(names)} crops")
+
+  total = 0
+  last_id = 0
+  while True:
+    with Session(engine) as session:
+      rows = session.exec(
+        select(Violation.id, Violation.image_url)
+        .where(Violation.id > last_id)
+        .order_by(Violation.id)
+        .limit(batch_size)
+      ).all()
+      if not rows:
+        break
+      updates = []
+      for violation_id, image_url in rows:
+        url = violation_url(crops.key_for(image_url.rsplit('/', 1)[-1]))
+        if url != image_url:
+          updates.append({'id': violation_id, 'image_url': url})
+      if updates and not dry_run:
+        session.exec(update(Violation), params=updates)
+        session.commit()
+      last_id = rows[-1][0]
+      total += len(updates)
+  print(f"Rewrote {total} violation URLs")
+
+def migrate(batch_size: int, dry_run: bool) -> None:
+  init_db()
+  migrate_images(batch_size, dry_run)
+  migrate_crops(batch_size, dry_run)
+  # Cached entries hold the old crop paths; they are rebuilt on the next prediction
+  if not dry_run:
+    with Session(engine) as session:
+      session.exec(delete(PredictionCacheEntry))
+      session.commit()
+  print(f"Storage migration {'checked' if dry_run else 'finished'} ({settings.STORAGE_BACKEND} backend)")
+
+def main():
+  parser = argparse.ArgumentParser(description='Move flat image and crop files into the sharded storage layout')
+  parser.add_argument('--batch-size', type=int, default=500)
+  parser.add_argument('--dry-run', action='store_true')
+  args = parser.parse_args()
+  try:
+    migrate(args.batch_size, args.dry_run)
+  except Exception as e:
+    print(f"Error during migration: {str(e)}")
+    raise e
+
+if __name__ == "__main__":
+  main()
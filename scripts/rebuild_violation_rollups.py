@@ -0,0 +1,57 @@
+# scripts/rebuild_violation_rollups.py
+import os
+import sys
+import argparse
+from collections import Counter
+
+# Add project root to Python path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from sqlalchemy import delete, insert
+from sqlmodel import Session, select
+from app.core.db import engine, init_db
+from app.models.violation import Violation, ViolationRollup
+from app.services.violation_rollup import ROLLUP_KEY, count_rollups
+
+def rebuild(batch_size: int, dry_run: bool) -> None:
+  # Recounts every rollup from the violation table. Run it with the workers
+  # stopped, since violations written meanwhile would be counted twice.
+  init_db()
+  totals: Counter = Counter()
+  total_violations = 0
+  last_id = 0
+  while True:
+    with Session(engine) as session:
+      violations = session.exec(
+        select(Violation).where(Violation.id > last_id).order_by(Violation.id).limit(batch_size)
+      ).all()
+    if not violations:
+      break
+    totals.update(count_rollups(violations))
+    last_id = violations[-1].id
+    total_violations += len(violations)
+    print(f"Counted {total_violations} violations")
+
+  rows = [dict(zip(ROLLUP_KEY, key), count=count) for key, count in sorted(totals.items())]
+  if not dry_run:
+    with Session(engine) as session:
+      session.exec(delete(ViolationRollup))
+      for start in range(0, len(rows), batch_size):
+        session.exec(insert(ViolationRollup), params=rows[start:start + batch_size])
+      session.commit()
+  print(f"{'Would write' if dry_run else 'Wrote'} {len(rows)} rollup rows for {total_violations} violations")
+
+def main():
+  parser = argparse.ArgumentParser(description='Rebuild the ViolationRollup table from the violation table')
+  parser.add_argument('--batch-size', type=int, default=1000)
+  parser.add_argument('--dry-run', action='store_true')
+  args = parser.parse_args()
+  try:
+    rebuild(args.batch_size, args.dry_run)
+  except Exception as e:
+    print(f"Error during rollup rebuild: {str(e)}")
+    raise e
+
+if __name__ == "__main__":
+  main()
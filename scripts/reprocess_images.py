@@ -0,0 +1,224 @@
+# scripts/reprocess_images.py
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import multiprocessing
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime, timedelta
+from uuid import UUID
+
+# Add project root to Python path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from sqlalchemy import func, tuple_
+from sqlmodel import Session, select
+from app.core.config import settings
+from app.core.db import engine, init_db
+from app.models.image import Image
+
+# Per-process state for pool workers; each keeps one event loop so the
+# detector, HTTP client and database pool are reused across chunks
+_worker_loop: asyncio.AbstractEventLoop | None = None
+_worker_service = None
+
+def init_worker(nice: int) -> None:
+  global _worker_loop
+  if nice:
+    # Lower priority so the live API keeps the CPU when it needs it
+    os.nice(nice)
+  _worker_loop = asyncio.new_event_loop()
+  asyncio.set_event_loop(_worker_loop)
+
+def reprocess_chunk(image_ids: list[str], concurrency: int) -> tuple[int, list[tuple[str, str]]]:
+  # Returns the number of images re-run and (id, error) for each failure
+  return _worker_loop.run_until_complete(_reprocess(image_ids, concurrency))
+
+async def _reprocess(image_ids: list[str], concurrency: int) -> tuple[int, list[tuple[str, str]]]:
+  global _worker_service
+  if _worker_service is None:
+    from app.services.prediction_service import PredictionService
+    from app.services.prediction_writer import PredictionWriter
+    # Concurrent predictions share detector batches and grouped commits
+    _worker_service = PredictionService(writer=PredictionWriter(max_batch_size=concurrency))
+  semaphore = asyncio.Semaphore(concurrency)
+  failed = []
+
+  async def run_one(image_id: str) -> None:
+    async with semaphore:
+      try:
+        # Skip the prediction cache so the current model actually runs
+        await _worker_service.predict_image(UUID(image_id), use_cache=False)
+      except Exception as e:
+        failed.append((image_id, str(getattr(e, 'detail', e))))
+
+  await asyncio.gather(*(run_one(image_id) for image_id in image_ids))
+  return len(image_ids) - len(failed), failed
+
+def build_query(since: datetime | None, until: datetime | None):
+  statement = select(Image.created_at, Image.id).order_by(Image.created_at, Image.id)
+  if since:
+    statement = statement.where(Image.created_at >= since)
+  if until:
+    statement = statement.where(Image.created_at < until)
+  return statement
+
+def count_remaining(since: datetime | None, until: datetime | None, after: tuple | None) -> int:
+  statement = select(func.count()).select_from(build_query(since, until).order_by(None).subquery())
+  if after is not None:
+    statement = select(func.count()).select_from(
+      build_query(since, until).order_by(None).where(tuple_(Image.created_at, Image.id) > after).subquery()
+    )
+  with Session(engine) as session:
+    return session.exec(statement).one()
+
+def iter_chunks(since: datetime | None, until: datetime | None, after: tuple | None, chunk_size: int):
+  # Keyset pagination on (created_at, id), one short session per chunk
+  while True:
+    statement = build_query(since, until)
+    if after is not None:
+      statement = statement.where(tuple_(Image.created_at, Image.id) > after)
+    with Session(engine) as session:
+      rows = session.exec(statement.limit(chunk_size)).all()
+    if not rows:
+      return
+    after = (rows[-1][0], rows[-1][1])
+    yield [str(image_id) for _, image_id in rows], after
+
+def load_checkpoint(path: str) -> dict | None:
+  if not os.path.exists(path):
+    return None
+  with open(path) as checkpoint_file:
+    return json.load(checkpoint_file)
+
+def save_checkpoint(path: str, checkpoint: dict) -> None:
+  # Written to a temporary file first so a crash never leaves half a checkpoint
+  partial_path = f'{path}.part'
+  with open(partial_path, 'w') as checkpoint_file:
+    json.dump(checkpoint, checkpoint_file, indent=2)
+  os.replace(partial_path, path)
+
+def format_eta(seconds: float) -> str:
+  return str(timedelta(seconds=int(seconds)))
+
+class Progress:
+  def __init__(self, total: int, interval: float):
+    self.total = total
+    self.interval = interval
+    self.processed = 0
+    self.failed = 0
+    self.started = time.monotonic()
+    self.last_report = self.started
+
+  def add(self, processed: int, failed: int) -> None:
+    self.processed += processed
+    self.failed += failed
+    if time.monotonic() - self.last_report >= self.interval:
+      self.report()
+
+  def report(self) -> None:
+    self.last_report = time.monotonic()
+    done = self.processed + self.failed
+    elapsed = self.last_report - self.started
+    rate = done / elapsed if elapsed > 0 else 0.0
+    percent = 100 * done / self.total if self.total else 100.0
+    eta = format_eta((self.total - done) / rate) if rate > 0 else '?'
+    print(f"Processed {done}/{self.total} ({percent:.1f}%) | {rate:.1f} img/s | ETA {eta} | failed {self.failed}", flush=True)
+
+def reprocess(args) -> None:
+  init_db()
+  checkpoint = None if args.restart else load_checkpoint(args.checkpoint)
+  after = None
+  if checkpoint and checkpoint.get('after'):
+    created_at, image_id = checkpoint['after']
+    after = (datetime.fromisoformat(created_at), UUID(image_id))
+    print(f"Resuming after {created_at} / {image_id} ({checkpoint['processed']} done before)")
+  checkpoint = checkpoint or {'after': None, 'processed': 0, 'failed': 0, 'started_at': datetime.utcnow().isoformat()}
+
+  total = count_remaining(args.since, args.until, after)
+  print(f"{total} images to re-run with {args.workers} processes x {args.concurrency} concurrent predictions")
+  if args.dry_run or not total:
+    return
+
+  progress = Progress(total, args.report_seconds)
+  failures_file = open(f'{args.checkpoint}.failed', 'a')
+  # Chunks finish out of order; the checkpoint only moves past a chunk once
+  # every chunk before it is done, so a resume never skips an image
+  finished: dict[int, tuple] = {}
+  next_to_save = 0
+  in_flight: dict = {}
+  dispatched = 0
+  started = time.monotonic()
+
+  def collect(futures) -> None:
+    nonlocal next_to_save
+    for future in futures:
+      sequence, last_key = in_flight.pop(future)
+      processed, failed = future.result()
+      for image_id, error in failed:
+        failures_file.write(f'{image_id}\t{error}\n')
+      failures_file.flush()
+      progress.add(processed, len(failed))
+      checkpoint['processed'] += processed
+      checkpoint['failed'] += len(failed)
+      finished[sequence] = last_key
+    while next_to_save in finished:
+      last_key = finished.pop(next_to_save)
+      checkpoint['after'] = [last_key[0].isoformat(), str(last_key[1])]
+      next_to_save += 1
+    save_checkpoint(args.checkpoint, checkpoint)
+
+  context = multiprocessing.get_context('spawn')
+  try:
+    with ProcessPoolExecutor(max_workers=args.workers, mp_context=context, initializer=init_worker, initargs=(args.nice,)) as pool:
+      for sequence, (image_ids, last_key) in enumerate(iter_chunks(args.since, args.until, after, args.chunk_size)):
+        if args.max_rate:
+          # Hold dispatch to the target rate rather than bursting
+          delay = started + dispatched / args.max_rate - time.monotonic()
+          if delay > 0:
+            time.sleep(delay)
+        # At most two chunks per process queued, which bounds memory and
+        # keeps the checkpoint close behind the work
+        while len(in_flight) >= args.workers * 2:
+          done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+          collect(done)
+        in_flight[pool.submit(reprocess_chunk, image_ids, args.concurrency)] = (sequence, last_key)
+        dispatched += len(image_ids)
+      while in_flight:
+        done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+        collect(done)
+  finally:
+    failures_file.close()
+  progress.report()
+  print(f"Re-ran {checkpoint['processed']} images, {checkpoint['failed']} failed (ids in {args.checkpoint}.failed)")
+
+def parse_time(value: str) -> datetime:
+  return datetime.fromisoformat(value)
+
+def main():
+  parser = argparse.ArgumentParser(description='Re-run detection over stored images, e.g. after a model or threshold change')
+  parser.add_argument('--workers', type=int, default=max(1, (os.cpu_count() or 2) // 2), help='Worker processes')
+  parser.add_argument('--concurrency', type=int, default=settings.JOB_WORKER_CONCURRENCY, help='Concurrent predictions per process')
+  parser.add_argument('--chunk-size', type=int, default=50, help='Images per chunk handed to a process')
+  parser.add_argument('--max-rate', type=float, default=None, help='Images per second across all processes')
+  parser.add_argument('--nice', type=int, default=10, help='Niceness added to worker processes (0 to keep the default)')
+  parser.add_argument('--since', type=parse_time, default=None, help='Only images uploaded at or after this time (UTC)')
+  parser.add_argument('--until', type=parse_time, default=None, help='Only images uploaded before this time (UTC)')
+  parser.add_argument('--checkpoint', default='reprocess_checkpoint.json', help='Progress file used to resume')
+  parser.add_argument('--restart', action='store_true', help='Ignore an existing checkpoint and start over')
+  parser.add_argument('--report-seconds', type=float, default=5.0, help='Seconds between progress lines')
+  parser.add_argument('--dry-run', action='store_true', help='Only count the images that would be re-run')
+  args = parser.parse_args()
+  try:
+    reprocess(args)
+  except KeyboardInterrupt:
+    print(f"Interrupted; run again to resume from {args.checkpoint}")
+  except Exception as e:
+    print(f"Error during reprocessing: {str(e)}")
+    raise e
+
+if __name__ == "__main__":
+  main()
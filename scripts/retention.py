@@ -0,0 +1,51 @@
+# scripts/retention.py
+import os
+import sys
+import json
+import asyncio
+import argparse
+
+# Add project root to Python path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from app.core.config import settings
+from app.core.db import async_engine, init_db
+from app.services.retention_service import RetentionService
+
+async def run_retention(dry_run: bool) -> dict:
+  try:
+    report = await RetentionService(dry_run=dry_run).run()
+  finally:
+    await async_engine.dispose()
+  return report.as_dict()
+
+def main():
+  parser = argparse.ArgumentParser(description='Apply the retention policies and remove orphaned files and rows')
+  parser.add_argument('--max-age-days', type=float, default=None, help='Overrides RETENTION_MAX_AGE_DAYS')
+  parser.add_argument('--max-bytes', type=int, default=None, help='Overrides RETENTION_MAX_BYTES')
+  parser.add_argument('--batch-size', type=int, default=None, help='Overrides RETENTION_BATCH_SIZE')
+  parser.add_argument('--ops-per-second', type=float, default=None, help='Overrides RETENTION_MAX_FILE_OPS_PER_SECOND')
+  parser.add_argument('--dry-run', action='store_true', help='Report what would be removed without removing it')
+  args = parser.parse_args()
+  overrides = {
+    'RETENTION_MAX_AGE_DAYS': args.max_age_days,
+    'RETENTION_MAX_BYTES': args.max_bytes,
+    'RETENTION_BATCH_SIZE': args.batch_size,
+    'RETENTION_MAX_FILE_OPS_PER_SECOND': args.ops_per_second,
+  }
+  for name, value in overrides.items():
+    if value is not None:
+      setattr(settings, name, value)
+  try:
+    init_db()
+    report = asyncio.run(run_retention(args.dry_run))
+    if not report['ran']:
+      print("Another worker holds the retention lease; try again later")
+    print(json.dumps(report, indent=2))
+  except Exception as e:
+    print(f"Error during retention: {str(e)}")
+    raise e
+
+if __name__ == "__main__":
+  main()